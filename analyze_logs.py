@@ -0,0 +1,218 @@
+import os
+import re
+import gzip
+import glob
+import time
+import argparse
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# Auswertung von study.log und probe.log (inkl. rotierter Backups) eines oder vieler Geräte:
+#
+#   python3 analyze_logs.py /var/log/probe
+#   python3 analyze_logs.py geraete/*/ --window 300 --csv auswertung.csv
+#
+# Jedes Verzeichnis mit einer study.log ist ein Gerät. Die Dateien werden in Blöcken von einigen
+# MB gelesen, die Treffer der Muster in NumPy-Spalten gesammelt und dann vektorisiert ausgewertet:
+# Zeiten in/außerhalb der Box, Erinnerungen und wie schnell das Handy danach zurück in die Box kam.
+
+# Muster laufen mit re.M über ganze Blöcke statt Zeile für Zeile (Fortsetzungszeilen mehrzeiliger
+# GPT-Antworten haben keinen Zeitstempel und passen auf keines)
+STAMP = r"^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d),\d{3} - "
+BOX = re.compile(STAMP + r"Phone (out|in) Box: ([\d.]+); Dauer: [\d.]+s; Ende: ([\d.]+)", re.M)
+# Alt: "Reminder (primary): ...", neu: "Reminder (<vorhaben>, primary, Stufe 1): ..."
+REMINDER = re.compile(STAMP + r"Reminder \((?:[^,()\n]+, )?(\w+)(?:, Stufe (\d+))?\): ", re.M)
+SESSION = re.compile(STAMP + r"Session beendet: (\d+) Vorhaben; (\d+) Erinnerungen", re.M)
+MESSAGE = re.compile(STAMP + r"(Transkription|GPT-4 \(Notfall\)|GPT-4):", re.M)
+# In probe.log ohne Zeitstempel-Anker: ältere Dateien haben keinen
+STAGE = re.compile(r"Stufe (\w+): (\d+) ms")
+DISTANCE = re.compile(r"Distance: ([\d.]+) cm")
+INVALID = "Distance: keine gültige Messung"
+BLOCK_BYTES = 4 << 20
+ERROR = re.compile(r"Traceback|fehlgeschlagen|Fehler")
+
+
+def log_files(directory, name):
+    # Älteste zuerst: name.10 ... name.1, name (auch .gz, falls logrotate komprimiert)
+    def number(path):
+        suffix = path[len(os.path.join(directory, name)) + 1:].split(".")[0]
+        return int(suffix) if suffix.isdigit() else 0
+    backups = [p for p in glob.glob(os.path.join(directory, name + ".*")) if number(p)]
+    current = [p for p in (os.path.join(directory, name),) if os.path.exists(p)]
+    return sorted(backups, key=number, reverse=True) + current
+
+
+def read_blocks(paths):
+    # Blöcke von etwa BLOCK_BYTES, die immer an einem Zeilenende aufhören
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8", errors="replace") as f:
+            rest = ""
+            while True:
+                block = f.read(BLOCK_BYTES)
+                if not block:
+                    break
+                cut = block.rfind("\n") + 1
+                if not cut:
+                    rest += block
+                    continue
+                yield rest + block[:cut]
+                rest = block[cut:]
+            if rest:
+                yield rest
+
+
+def local_epoch(stamps):
+    # asctime ist lokale Zeit; Umrechnung je Stunde gecacht, damit Sommerzeit stimmt
+    offsets = {}
+    result = np.empty(len(stamps))
+    for i, stamp in enumerate(stamps):
+        hour = stamp[:13]
+        if hour not in offsets:
+            offsets[hour] = time.mktime(time.strptime(hour, "%Y-%m-%d %H"))
+        result[i] = offsets[hour] + int(stamp[14:16]) * 60 + int(stamp[17:19])
+    return result
+
+
+class DeviceLog:
+    def __init__(self, directory):
+        self.name = os.path.basename(os.path.normpath(directory))
+        self.directory = directory
+        self.parse_study(log_files(directory, "study.log"))
+        self.parse_probe(log_files(directory, "probe.log"))
+
+    def parse_study(self, paths):
+        box, reminders, sessions = [], [], []
+        counts = {"Transkription": 0, "GPT-4": 0, "GPT-4 (Notfall)": 0}
+        for block in read_blocks(paths):
+            box += BOX.findall(block)
+            reminders += REMINDER.findall(block)
+            sessions += SESSION.findall(block)
+            for _, kind in MESSAGE.findall(block):
+                counts[kind] += 1
+        self.counts = {"transcriptions": counts["Transkription"], "responses": counts["GPT-4"],
+                       "fallbacks": counts["GPT-4 (Notfall)"]}
+        out = np.array([b[1] == "out" for b in box], dtype=bool)
+        times = np.array([(b[2], b[3]) for b in box], dtype=float).reshape(-1, 2)
+        # Intervalle, in denen das Handy draußen war, nach Beginn sortiert
+        order = np.argsort(times[out, 0])
+        self.out_start = times[out, 0][order]
+        self.out_end = times[out, 1][order]
+        self.in_duration = times[~out, 1] - times[~out, 0]
+        self.reminder_time = local_epoch([r[0] for r in reminders])
+        self.reminder_kind = np.array([r[1] for r in reminders], dtype=str)
+        self.reminder_level = np.array([r[2] or 0 for r in reminders], dtype=int)
+        self.sessions = np.array([s[1:] for s in sessions], dtype=int).reshape(-1, 2)
+
+    def parse_probe(self, paths):
+        stages, distances = {}, []
+        self.invalid_readings = 0
+        self.errors = 0
+        for block in read_blocks(paths):
+            distances.append(np.array(DISTANCE.findall(block), dtype=float))
+            self.invalid_readings += block.count(INVALID)
+            for name, ms in STAGE.findall(block):
+                stages.setdefault(name, []).append(ms)
+            self.errors += len(ERROR.findall(block))
+        self.stages = {name: np.array(values, dtype=float) for name, values in stages.items()}
+        self.distances = np.concatenate(distances) if distances else np.zeros(0)
+
+    def reminder_returns(self):
+        # Sekunden von der Erinnerung bis das Handy wieder in der Box lag; NaN, wenn die
+        # Erinnerung in keinem bekannten Draußen-Intervall lag
+        latency = np.full(len(self.reminder_time), np.nan)
+        if not len(self.out_start):
+            return latency
+        index = np.searchsorted(self.out_start, self.reminder_time, side="right") - 1
+        inside = index >= 0
+        inside[inside] = self.reminder_time[inside] < self.out_end[index[inside]]
+        latency[inside] = self.out_end[index[inside]] - self.reminder_time[inside]
+        return latency
+
+
+def local_days(epochs):
+    # Kalendertage in lokaler Zeit wie die asctime-Stempel, nicht UTC-Tage (epoch // 86400)
+    return {datetime.datetime.fromtimestamp(t).date() for t in epochs}
+
+
+def percentiles(values, q=(50, 90)):
+    if not len(values):
+        return [float("nan")] * len(q)
+    return list(np.percentile(values, q))
+
+
+def summarize(device, window):
+    out = device.out_end - device.out_start
+    days = local_days(device.out_start) | local_days(device.reminder_time)
+    latency = device.reminder_returns()
+    returned = latency <= window
+    summary = {
+        "device": device.name,
+        "days": len(days),
+        "phone_out": len(out),
+        "out_hours": out.sum() / 3600,
+        "out_hours_per_day": out.sum() / 3600 / max(len(days), 1),
+        "out_p50_min": percentiles(out)[0] / 60,
+        "out_p90_min": percentiles(out)[1] / 60,
+        "in_p50_min": percentiles(device.in_duration)[0] / 60,
+        "reminders": len(latency),
+        "returned_rate": returned.mean() if len(latency) else float("nan"),
+        "return_p50_s": percentiles(latency[~np.isnan(latency)])[0],
+        "sessions": len(device.sessions),
+        "intentions": int(device.sessions[:, 0].sum()),
+        "distance_p50_cm": percentiles(device.distances)[0],
+        "invalid_readings": device.invalid_readings,
+        "errors": device.errors,
+    }
+    summary.update(device.counts)
+    for level in np.unique(device.reminder_level):
+        mask = device.reminder_level == level
+        summary[f"returned_rate_stufe{level}"] = returned[mask].mean()
+    for name, values in sorted(device.stages.items()):
+        summary[f"{name}_p50_ms"], summary[f"{name}_p95_ms"] = percentiles(values, (50, 95))
+    return summary
+
+
+def analyze(directory, window):
+    return summarize(DeviceLog(directory), window)
+
+
+def device_dirs(paths):
+    found = []
+    for path in paths:
+        if os.path.exists(os.path.join(path, "study.log")):
+            found.append(path)
+        else:
+            found += sorted(os.path.dirname(p) for p in glob.glob(os.path.join(path, "*", "study.log")))
+    return found
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs="*", default=["/var/log/probe"])
+    parser.add_argument("--window", type=float, default=300,
+                        help="Sekunden, in denen das Handy nach einer Erinnerung zurück sein muss")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count())
+    parser.add_argument("--csv")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    directories = device_dirs(args.paths)
+    if not directories:
+        raise SystemExit("Keine study.log gefunden")
+    with ProcessPoolExecutor(args.jobs) as pool:
+        summaries = list(pool.map(analyze, directories, [args.window] * len(directories)))
+    for summary in summaries:
+        print(f"== {summary['device']}")
+        for key, value in summary.items():
+            if key != "device":
+                print(f"  {key:28s} {value:.2f}" if isinstance(value, float) else f"  {key:28s} {value}")
+    print(f"{len(summaries)} Geräte in {time.perf_counter() - started:.2f}s ausgewertet")
+    if args.csv:
+        import csv
+        keys = list(dict.fromkeys(k for s in summaries for k in s))
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, keys)
+            writer.writeheader()
+            writer.writerows(summaries)
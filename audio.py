@@ -0,0 +1,107 @@
+import io
+import wave
+import struct
+import numpy as np
+
+# -------------------- PCM/WAV im Speicher --------------------
+# Gemeinsame Helfer für alle Audiopfade: RIFF-Header, Umrechnung auf 16 kHz mono S16_LE und
+# Lautstärke/Fades/Pausen mit NumPy direkt auf dem Puffer. Ersetzt die sox-Aufrufe und
+# Zwischendateien (response_converted.wav, boosted_response.wav) der alten Boost-Variante.
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2   # S16_LE
+CHANNELS = 1
+RESAMPLE_TAPS = 255      # Anti-Aliasing-FIR vor dem Heruntertakten (~1 kHz Übergang bei 44,1 kHz)
+RESAMPLE_CUTOFF = 0.45   # Grenzfrequenz relativ zur Zielrate
+
+
+def wav_header(data_bytes, sample_rate=SAMPLE_RATE, channels=CHANNELS):
+    # 44-Byte-RIFF-Header für PCM; für Streams mit unbekannter Länge 0xFFFFFFFF übergeben
+    byte_rate = sample_rate * channels * SAMPLE_WIDTH
+    riff_size = min(0xFFFFFFFF, data_bytes + 36)
+    return struct.pack("<4sI4s4sIHHIIHH4sI", b"RIFF", riff_size, b"WAVE", b"fmt ", 16, 1, channels,
+                       sample_rate, byte_rate, channels * SAMPLE_WIDTH, SAMPLE_WIDTH * 8, b"data", data_bytes)
+
+
+def pcm_to_wav_bytes(pcm, sample_rate=SAMPLE_RATE, channels=CHANNELS):
+    return wav_header(len(pcm), sample_rate, channels) + bytes(pcm)
+
+
+def write_wav(filename, pcm, sample_rate=SAMPLE_RATE, channels=CHANNELS):
+    with open(filename, "wb") as f:
+        f.write(wav_header(len(pcm), sample_rate, channels))
+        f.write(pcm)
+
+
+def wav_to_pcm(data):
+    # WAV (beliebige Rate, mono/stereo, 16 bit) -> 16 kHz mono S16_LE
+    with wave.open(io.BytesIO(data)) as w:
+        channels, width, rate = w.getnchannels(), w.getsampwidth(), w.getframerate()
+        frames = w.readframes(w.getnframes())
+    if width != 2:
+        raise ValueError("nur 16-bit PCM wird unterstützt")
+    samples = np.frombuffer(frames, dtype="<i2").reshape(-1, channels).astype(np.float32)
+    mono = samples.mean(axis=1)
+    if rate > SAMPLE_RATE:
+        # Ohne Tiefpass falten sich die Anteile über 8 kHz in den hörbaren Bereich zurück
+        mono = lowpass(mono, RESAMPLE_CUTOFF * SAMPLE_RATE, rate)
+    if rate != SAMPLE_RATE:
+        positions = np.arange(0, len(mono), rate / SAMPLE_RATE)
+        mono = np.interp(positions, np.arange(len(mono)), mono)
+    return from_float(mono / 32768.0)
+
+
+def lowpass(samples, cutoff, rate, taps=RESAMPLE_TAPS):
+    # Gefensterter Sinc-FIR (Blackman), Verstärkung 1 im Durchlassbereich; cutoff in Hz
+    n = np.arange(taps) - (taps - 1) / 2
+    kernel = np.sinc(2 * cutoff / rate * n) * np.blackman(taps)
+    kernel /= kernel.sum()
+    return np.convolve(samples, kernel, mode="same")
+
+
+def load_pcm(path):
+    # Liefert 16 kHz mono S16_LE. Dateien ohne RIFF-Header (ElevenLabs pcm_16000) werden
+    # unverändert übernommen, echte WAVs (z. B. 44,1 kHz Stereo aus sounds/) umgerechnet.
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:4] != b"RIFF":
+        return data
+    try:
+        return wav_to_pcm(data)
+    except ValueError as e:
+        raise ValueError(f"{path}: {e}")
+
+# -------------------- Bearbeitung --------------------
+def to_float(pcm):
+    return np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768.0
+
+
+def from_float(samples):
+    return np.clip(np.round(samples * 32768.0), -32768, 32767).astype("<i2").tobytes()
+
+
+def gain(samples, db):
+    return samples * (10 ** (db / 20))
+
+
+def fade(samples, fade_in=0.0, fade_out=0.0, sample_rate=SAMPLE_RATE):
+    # Lineare Rampen wie "sox fade t"
+    samples = samples.copy()
+    n_in = min(len(samples), int(fade_in * sample_rate))
+    n_out = min(len(samples), int(fade_out * sample_rate))
+    if n_in:
+        samples[:n_in] *= np.linspace(0.0, 1.0, n_in, endpoint=False)
+    if n_out:
+        samples[len(samples) - n_out:] *= np.linspace(1.0, 0.0, n_out)
+    return samples
+
+
+def pad(samples, before=0.0, after=0.0, sample_rate=SAMPLE_RATE):
+    return np.concatenate([np.zeros(int(before * sample_rate), dtype=samples.dtype), samples,
+                           np.zeros(int(after * sample_rate), dtype=samples.dtype)])
+
+
+def boost(pcm, gain_db=6, fade_in=1.0, fade_out=0.2, pad_before=0.5, pad_after=0.5):
+    # Entspricht "sox ... gain +6 fade t 1 0 0.2 pad 0.5 0.5", aber ohne Dateien und Prozesse
+    samples = fade(gain(to_float(pcm), gain_db), fade_in, fade_out)
+    return from_float(pad(samples, pad_before, pad_after))
@@ -1,42 +1,30 @@
 import os
 import time
 import subprocess
+import audio
 
 RAW_PCM_FILE = "response.wav"               # Eigentlich kein echtes WAV!
-WAV_CONVERTED = "response_converted.wav"    # Enthält echten RIFF-Header
-BOOSTED_FILE = "boosted_response.wav"
 SPEAKER_DEVICE = "plughw:0"
 
-def convert_pcm_to_wav(input_file, output_file):
-    print("Konvertiere PCM → WAV...")
-    subprocess.run([
-        "sox", "-t", "raw",
-        "-r", "16000", "-e", "signed", "-b", "16", "-c", "1",
-        input_file, output_file
-    ])
-    print("Konvertierung abgeschlossen.")
-
-def boost_volume(input_file, output_file, gain_db="+6"):
+def boost_volume(pcm, gain_db=6):
     print("Booste Lautstärke mit stärkerem Fade...")
-    subprocess.run([
-        "sox", input_file, output_file,
-        "gain", gain_db,
-        "fade", "t", "1", "0", "0.2",  # fade in 1s, fade out 0.2s
-        "pad", "0.5", "0.5"           # 50ms silence before and after
-    ])
+    # fade in 1s, fade out 0.2s, 0.5s Stille davor und danach – im Speicher statt über sox
+    boosted = audio.boost(pcm, gain_db=gain_db, fade_in=1, fade_out=0.2, pad_before=0.5, pad_after=0.5)
     print("Boost + Fade abgeschlossen.")
+    return boosted
 
-def play_audio(file):
+def play_audio(pcm):
     print("Spiele Audio ab...")
-    os.system(f"aplay -D {SPEAKER_DEVICE} -f S16_LE -r 16000 -c 1 {file}")
+    subprocess.run(["aplay", "-D", SPEAKER_DEVICE, "-t", "raw", "-f", "S16_LE", "-r", "16000", "-c", "1", "-"],
+                   input=pcm)
 
 try:
+    boosted = None
     while True:
         if os.path.exists(RAW_PCM_FILE):
-            if not os.path.exists(BOOSTED_FILE):
-                convert_pcm_to_wav(RAW_PCM_FILE, WAV_CONVERTED)
-                boost_volume(WAV_CONVERTED, BOOSTED_FILE)
-            play_audio(BOOSTED_FILE)
+            if boosted is None:
+                boosted = boost_volume(audio.load_pcm(RAW_PCM_FILE))
+            play_audio(boosted)
         else:
             print(f"{RAW_PCM_FILE} nicht gefunden. Warte...")
         time.sleep(10)
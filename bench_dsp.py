@@ -0,0 +1,49 @@
+import time
+import platform
+import argparse
+import numpy as np
+import audio
+import dsp
+
+# Misst die CPU-Kosten der Streaming-DSP (Lautheit, Limiter, Fades) je TTS-Chunk.
+# Auf dem Pi ausführen, um die Zahlen für ARM zu bekommen:
+#
+#   python3 bench_dsp.py response.wav --chunk-bytes 4096 --repeat 20
+
+
+def run(pcm, chunk_bytes):
+    processor = dsp.StreamProcessor()
+    timings = []
+    output = bytearray()
+    for offset in range(0, len(pcm), chunk_bytes):
+        started = time.perf_counter()
+        output += processor.process(pcm[offset:offset + chunk_bytes])
+        timings.append(time.perf_counter() - started)
+    output += processor.finish()
+    return timings, bytes(output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("file", nargs="?", default="response.wav")
+    parser.add_argument("--chunk-bytes", type=int, nargs="+", default=[1024, 4096, 16384])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    pcm = audio.load_pcm(args.file)
+    seconds = len(pcm) / (audio.SAMPLE_RATE * audio.SAMPLE_WIDTH)
+    print(f"{platform.machine()}, {args.file}: {seconds:.1f}s Audio")
+    for chunk_bytes in args.chunk_bytes:
+        timings = []
+        cpu_started = time.process_time()
+        for _ in range(args.repeat):
+            chunk_timings, output = run(pcm, chunk_bytes)
+            timings.extend(chunk_timings)
+        cpu = (time.process_time() - cpu_started) / args.repeat
+        timings = np.array(timings) * 1e6
+        chunk_ms = chunk_bytes / (audio.SAMPLE_RATE * audio.SAMPLE_WIDTH) * 1000
+        level_in = dsp.StreamProcessor().measure_db(audio.to_float(pcm))
+        level_out = dsp.StreamProcessor().measure_db(audio.to_float(output))
+        print(f"  Chunk {chunk_bytes:6d} B ({chunk_ms:5.0f} ms): p50 {np.percentile(timings, 50):7.0f} µs  "
+              f"p99 {np.percentile(timings, 99):7.0f} µs  CPU {100 * cpu / seconds:.2f} % der Echtzeit  "
+              f"Lautheit {level_in:.1f} → {level_out:.1f} dBFS")
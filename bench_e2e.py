@@ -0,0 +1,227 @@
+import os
+import sys
+import time
+import json
+import asyncio
+import logging
+import argparse
+import tempfile
+import numpy as np
+import sim
+from stub_server import StubConfig, start_stub_server
+
+# End-to-end-Benchmark ohne Pi: probe.Probe läuft mit simulierter Hardware (sim.py)
+# gegen den lokalen Stub-Server. Szenarien spielen Entfernungs-Drehbücher und Tastendrücke ab
+# und messen den ganzen Weg Aufnahme → Transkription → Antwort → Erinnerung. Die Zeiten der
+# Box-Logik sind gestaucht (--delay statt 10 Minuten).
+#
+#   python3 bench_e2e.py --runs 5
+#   python3 bench_e2e.py --scenarios burst --stt-latency 2 --fail-rate 0.1 --json e2e.json
+
+IN, OUT = 5.0, 40.0          # cm: Handy in der Box / draußen
+SETTLE = 3.0                 # Sekunden, bis der Sensor-Zustand stabil erkannt ist
+
+
+# -------------------- Szenarien --------------------
+# Ein Szenario liefert (Drehbuch für den Sensor, Tastenaktionen als (Sekunde, Aktion, Clip),
+# Dauer, erwartete Anzahl verarbeiteter Aufnahmen)
+def scenario_basic(clip, delay, cancel):
+    press = SETTLE + 1
+    release = press + clip_seconds(clip) + 0.5
+    back = release + delay + 2
+    steps = [(0, IN), (1, OUT), (back, IN)]
+    return steps, [(press, "press", clip), (release, "release", None)], back + cancel + SETTLE, 1
+
+
+def scenario_burst(clip, delay, cancel):
+    # Drei Vorhaben kurz nacheinander, danach zwei eskalierende Erinnerungen
+    actions = []
+    at = SETTLE + 1
+    for _ in range(3):
+        actions += [(at, "press", clip), (at + clip_seconds(clip) + 0.5, "release", None)]
+        at += clip_seconds(clip) + 2
+    back = at + delay * 1.5 + 2
+    return [(0, IN), (1, OUT), (back, IN)], actions, back + cancel + SETTLE, 3
+
+
+def scenario_silence(clip, delay, cancel):
+    # Aufnahme ohne Sprache: wird verworfen, es darf keine Erinnerung kommen
+    silence = bytes(len(clip))
+    press = SETTLE + 1
+    release = press + clip_seconds(clip) + 0.5
+    back = release + delay + 2
+    return [(0, IN), (1, OUT), (back, IN)], [(press, "press", silence), (release, "release", None)], \
+        back + cancel + SETTLE, 0
+
+
+SCENARIOS = {"basic": scenario_basic, "burst": scenario_burst, "silence": scenario_silence}
+
+
+def clip_seconds(clip):
+    return len(clip) / (2 * 16000)
+
+
+class EventCollector(logging.Handler):
+    # Hängt direkt am EventLogger und sammelt (Zeit, Event, Felder) im Speicher
+    def __init__(self):
+        super().__init__()
+        self.events = []
+
+    def emit(self, record):
+        self.events.append((record.created, record.getMessage(), getattr(record, "fields", {})))
+
+
+async def run_scenario(app, trace, microphone, build, clip, args, collector):
+    steps, actions, duration, expected = build(clip, args.delay, args.cancel)
+    # Gesprochen wird schon kurz vor dem Drücken; das fängt nur der Vorlauf des offenen Mikrofons
+    actions = sorted(actions + [(at - args.lead, "speak", source) for at, action, source in actions
+                                if action == "press"], key=lambda a: a[0])
+    # Wie ein frisch gestartetes Gerät: ohne ältere Aufnahme, die sonst bei jedem Herausnehmen
+    # wieder eine Erinnerung scharf schaltet
+    app.box_machine.has_audio = False
+    app.sessions.last = None
+    # Ohne Cache, sonst misst ab dem zweiten Lauf nur noch die SD-Karte
+    app.pipeline.tts_cache.clear()
+    app.pipeline.chat_cache.clear()
+    first_event = len(collector.events)
+    button = app.button
+    started = time.time()
+    trace.begin(steps)
+    releases = []
+    for at, action, source in actions:
+        await asyncio.sleep(max(0.0, started + at - time.time()))
+        if action == "speak":
+            microphone.speak(source)
+        elif action == "press":
+            sim.SimRecorder.source = source
+            button.press()
+        else:
+            releases.append(time.time())
+            button.release()
+    await asyncio.sleep(max(0.0, started + duration - time.time()))
+
+    events = collector.events[first_event:]
+    recordings = [t for t, e, f in events if e == "recording" and f.get("intention")]
+    speech = [f["speech"] for t, e, f in events if e == "recording" and f.get("intention")]
+    discarded = [t for t, e, f in events if e == "recording" and not f.get("intention")]
+    responses = [t for t, e, f in events if e == "response"]
+    reminders = [t for t, e, f in events if e == "reminder"]
+    result = {"expected": expected, "recordings": len(recordings), "responses": len(responses), "discarded": len(discarded),
+              "reminders": len(reminders), "release_to_reminder": None, "reminder_lateness": None,
+              "speech": speech}
+    if recordings and reminders:
+        # Erste Erinnerung: gemessen ab Loslassen bzw. ab dem Scharfschalten des Timers
+        result["release_to_reminder"] = reminders[0] - releases[0]
+        result["reminder_lateness"] = reminders[0] - recordings[0] - args.delay
+    presses = sum(1 for _, action, _ in actions if action == "press")
+    result["ok"] = (len(responses) == expected and len(discarded) == presses - expected
+                    and (len(reminders) > 0) == (expected > 0))
+    return result
+
+
+def percentile_row(values):
+    values = np.array([v for v in values if v is not None])
+    if not len(values):
+        return "-"
+    return f"p50 {np.percentile(values, 50):6.2f}s  p95 {np.percentile(values, 95):6.2f}s  max {values.max():6.2f}s"
+
+
+async def bench(args):
+    import probe
+    import events
+    import metrics
+    import vad
+
+    sim.SimRecorder.skip_seconds = args.lead + args.arecord_open
+
+    # Konsole leiser; das vollständige probe.log liegt im Arbeitsverzeichnis
+    probe.setup_logging(logging.DEBUG if args.verbose else logging.WARNING)
+    collector = EventCollector()
+    events.event_logger.addHandler(collector)
+
+    # Gestauchte Box-Logik, simulierte Aufnahme und Sensor nach Drehbuch
+    trace = sim.DistanceTrace([(0, IN)])
+    microphone = sim.Microphone()
+    app = probe.Probe(sensor_backend=sim.TraceBackend(trace), button=sim.Button(probe.BUTTON_GPIO),
+                      notifier=sim.SystemdNotifier(), recorder_factory=sim.SimRecorder,
+                      capture_factory=microphone.open, recording_device="sim",
+                      filename=os.path.join(os.environ["PROBE_LOG_DIR"], "aufnahme.wav"),   # nicht die Datei im Repo
+                      reminder_schedule=[args.delay, args.delay / 2], cancel_seconds=args.cancel)
+
+    clip = probe.audio.load_pcm(args.clip)
+    main_task = asyncio.create_task(app.run())
+    await app.load_pipeline()
+
+    results = {name: [] for name in args.scenarios}
+    started = time.perf_counter()
+    for run in range(args.runs):
+        for name in args.scenarios:
+            result = await run_scenario(app, trace, microphone, SCENARIOS[name], clip, args, collector)
+            results[name].append(result)
+            print(f"{name} #{run + 1}: {'ok' if result['ok'] else 'FEHLER'}  "
+                  f"Antworten {result['responses']}/{result['expected']}  Erinnerungen {result['reminders']}")
+    wall = time.perf_counter() - started
+    main_task.cancel()
+    stages = metrics.registry.summary()
+    app.player.close()
+    await app.pipeline.close_clients()
+    return results, stages, wall, len(vad.trim(clip)) / (2 * 16000)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=["basic", "burst", "silence"])
+    parser.add_argument("--clip", default="aufnahme.wav")
+    parser.add_argument("--delay", type=float, default=8.0, help="Sekunden bis zur Erinnerung (statt 10 min)")
+    parser.add_argument("--cancel", type=float, default=3.0, help="Sekunden Unterbrechung (statt 3 min)")
+    parser.add_argument("--lead", type=float, default=0.3, help="Sekunden, die vor dem Drücken schon gesprochen wird")
+    parser.add_argument("--arecord-open", type=float, default=0.2,
+                        help="Sekunden, bis ein frisch gestartetes arecord aufnimmt (ohne PREARMED_CAPTURE)")
+    parser.add_argument("--stt-latency", type=float, default=0.5)
+    parser.add_argument("--chat-first-token", type=float, default=0.8)
+    parser.add_argument("--tts-latency", type=float, default=0.4)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--json")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    config = StubConfig(stt_latency=args.stt_latency, chat_first_token=args.chat_first_token,
+                        tts_latency=args.tts_latency, fail_rate=args.fail_rate, slow_rate=args.slow_rate, seed=1)
+    server = start_stub_server(config)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    workdir = tempfile.mkdtemp(prefix="probe-e2e-")
+    os.environ.update({
+        "OPENAI_BASE_URL": base_url + "/v1", "ELEVENLABS_BASE_URL": base_url,
+        "PROBE_AUDIO_SINK": "null", "PROBE_METRICS": "",
+        "PROBE_LOG_DIR": workdir, "PROBE_CACHE_DIR": os.path.join(workdir, "cache"),
+        "PROBE_SESSION_DIR": os.path.join(workdir, "sessions"),
+    })
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    os.environ.setdefault("ELEVENLABS_API_KEY", "stub")
+
+    results, stages, wall, clip_speech = asyncio.run(bench(args))
+
+    print(f"\n{sum(len(r) for r in results.values())} Szenarien in {wall:.1f}s, Logs: {workdir}")
+    for name, runs in results.items():
+        ok = sum(r["ok"] for r in runs)
+        processed = sum(r["responses"] for r in runs)
+        print(f"{name:8s} {ok}/{len(runs)} ok, {processed} Antworten")
+        if any(r["release_to_reminder"] is not None for r in runs):
+            print(f"  Loslassen → Erinnerung   {percentile_row(r['release_to_reminder'] for r in runs)}")
+            print(f"  Verspätung der Erinnerung {percentile_row(r['reminder_lateness'] for r in runs)}")
+        if any(r["speech"] for r in runs):
+            # Weniger als im Clip heißt: der Anfang fehlt
+            print(f"  Sprache in der Aufnahme  {percentile_row(s for r in runs for s in r['speech'])}"
+                  f"  (Clip {clip_speech:.2f}s)")
+    print("Stufen:")
+    for stage, n, p50, p95, peak in stages:
+        print(f"  {stage:20s} n={n:3d}  p50 {p50 * 1000:7.0f} ms  p95 {p95 * 1000:7.0f} ms  max {peak * 1000:7.0f} ms")
+    print(f"Stub: {config.injected}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"results": results, "wall_seconds": wall,
+                       "stages": {s: {"n": n, "p50": a, "p95": b, "max": c} for s, n, a, b, c in stages},
+                       "injected": config.injected}, f, indent=2)
+    sys.exit(0 if all(r["ok"] for runs in results.values() for r in runs) else 1)
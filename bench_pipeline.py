@@ -0,0 +1,73 @@
+import os
+import time
+import asyncio
+import tempfile
+import argparse
+import logging
+from stub_server import StubConfig, start_stub_server
+
+# Misst Zeit bis zum ersten Audio (blockierend vs. Streaming) gegen den lokalen Stub-Server.
+# Mit --fail-rate/--hang-rate/--slow-rate injiziert der Stub Fehler, um Retry, Zeitlimits,
+# Circuit Breaker und TTS-Hedging unter Last zu prüfen.
+
+async def run(mode, pipeline, transkription, output_file):
+    # Ohne Cache messen, sonst misst der zweite Lauf nur die SD-Karte
+    pipeline.tts_cache.clear()
+    pipeline.chat_cache.clear()
+    started = time.perf_counter()
+    first_audio = []
+    respond = pipeline.respond_streaming if mode == "streaming" else pipeline.respond_blocking
+    await respond(transkription, output_file,
+                  on_first_audio=lambda _: first_audio.append(time.perf_counter() - started))
+    return first_audio[0], time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--hang-seconds", type=float, default=30)
+    args = parser.parse_args()
+
+    config = StubConfig(fail_rate=args.fail_rate, hang_rate=args.hang_rate, slow_rate=args.slow_rate,
+                        hang_seconds=args.hang_seconds, seed=1)
+    server = start_stub_server(config)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ["OPENAI_BASE_URL"] = base_url + "/v1"
+    os.environ["ELEVENLABS_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    os.environ.setdefault("ELEVENLABS_API_KEY", "stub")
+    os.environ["PROBE_CACHE_DIR"] = tempfile.mkdtemp()
+    logging.getLogger("ProbeLogger").setLevel(logging.WARNING)
+
+    import pipeline
+
+    output_file = os.path.join(tempfile.mkdtemp(), "response.wav")
+
+    async def compare():
+        # Ein einziger Event-Loop, damit die Async-Clients ihre Verbindungen behalten
+        await pipeline.warm_up()
+        for mode in ("blocking", "streaming"):
+            results = []
+            failures = 0
+            for _ in range(args.runs):
+                try:
+                    results.append(await run(mode, pipeline, "water the plants", output_file))
+                except Exception as e:
+                    failures += 1
+                    print(f"{mode}: Lauf fehlgeschlagen: {e!r}")
+            if not results:
+                continue
+            first = sorted(r[0] for r in results)
+            total = sorted(r[1] for r in results)
+            p95 = lambda values: values[min(len(values) - 1, int(0.95 * len(values)))]
+            print(f"{mode:10s} erstes Audio: p50 {first[len(first) // 2]:.3f}s p95 {p95(first):.3f}s  "
+                  f"gesamt: p50 {total[len(total) // 2]:.3f}s p95 {p95(total):.3f}s  "
+                  f"fehlgeschlagen: {failures}/{args.runs}")
+        await pipeline.close_clients()
+
+    asyncio.run(compare())
+    print(f"TCP-Verbindungen zum Stub: {config.connections}, injizierte Fehler: {config.injected}")
+    server.shutdown()
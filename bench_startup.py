@@ -0,0 +1,87 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+
+# Kaltstart-Benchmark: startet probe.Probe N-mal in frischen Prozessen (wie nach Restart=always)
+# mit simulierter Hardware (sim.py) gegen den lokalen Stub-Server und misst
+#   import   – "import probe" samt Hardware-Simulation, ab dem ersten Projekt-Import
+#   ready    – Prozessstart bis READY=1 an systemd (erste Sensormessung)
+#   started  – Prozessstart bis Pipeline, Wiedergabe und Taster bereit sind
+#
+#   python3 bench_startup.py --runs 10
+
+
+async def child():
+    # Läuft im Kindprozess; Zeiten relativ zum Start des Interpreters gibt der Elternprozess mit
+    launched = float(os.environ["PROBE_BENCH_LAUNCHED"])
+    # Uhr vor dem ersten Projekt-Import starten: sim lädt sensor, capture und numpy, die sonst
+    # "import probe" laden würde, und gehört deshalb mit in die Messung
+    began = time.time()
+    import sim
+    sim.install()
+    import probe
+    imported = time.time()
+    probe.setup_logging(console_level=100)
+    app = probe.Probe(sensor_backend=sim.TraceBackend(sim.DistanceTrace([(0, 5.0)])),
+                      capture_factory=sim.Microphone().open)
+    task = asyncio.create_task(app.run())
+    while "started" not in app.startup_times:
+        await asyncio.sleep(0.01)
+    ready = next(t for t, message in app.notifier.messages if message == "READY=1")
+    result = {"interpreter": began - launched, "import": imported - began, "ready": ready - launched,
+              "started": time.time() - launched, "steps": app.startup_times}
+    task.cancel()
+    app.player.close()
+    await app.pipeline.close_clients()
+    print(json.dumps(result))
+
+
+def percentile_row(values):
+    values = np.array(values)
+    return f"p50 {np.percentile(values, 50) * 1000:7.0f} ms  p95 {np.percentile(values, 95) * 1000:7.0f} ms"
+
+
+if __name__ == "__main__":
+    if os.getenv("PROBE_BENCH_LAUNCHED"):
+        asyncio.run(child())
+        sys.exit(0)
+
+    from stub_server import StubConfig, start_stub_server
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json")
+    args = parser.parse_args()
+
+    server = start_stub_server(StubConfig(seed=1))
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    workdir = tempfile.mkdtemp(prefix="probe-startup-")
+    env = dict(os.environ, OPENAI_BASE_URL=base_url + "/v1", ELEVENLABS_BASE_URL=base_url,
+               PROBE_AUDIO_SINK="null", PROBE_METRICS="", PROBE_LOG_DIR=workdir,
+               PROBE_CACHE_DIR=os.path.join(workdir, "cache"), PROBE_SESSION_DIR=os.path.join(workdir, "sessions"))
+    env.setdefault("OPENAI_API_KEY", "stub")
+    env.setdefault("ELEVENLABS_API_KEY", "stub")
+
+    results = []
+    for run in range(args.runs):
+        env["PROBE_BENCH_LAUNCHED"] = repr(time.time())
+        output = subprocess.check_output([sys.executable, __file__], env=env, text=True)
+        results.append(json.loads(output.strip().splitlines()[-1]))
+        print(f"#{run + 1}: import {results[-1]['import'] * 1000:.0f} ms, READY {results[-1]['ready'] * 1000:.0f} ms, "
+              f"gestartet {results[-1]['started'] * 1000:.0f} ms")
+
+    print(f"\n{args.runs} Kaltstarts, Logs: {workdir}")
+    for key, label in (("interpreter", "Interpreter"), ("import", "import probe"),
+                       ("ready", "bis READY"), ("started", "vollständig")):
+        print(f"  {label:14s} {percentile_row([r[key] for r in results])}")
+    for step in results[0]["steps"]:
+        print(f"  Schritt {step:8s} {percentile_row([r['steps'][step] for r in results])}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
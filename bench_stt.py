@@ -0,0 +1,124 @@
+import os
+import time
+import asyncio
+import argparse
+import logging
+import codec
+
+# Vergleicht Spracherkennung in der Cloud (OpenAI Whisper) mit dem lokalen CPU-Backend
+# (faster-whisper) auf aufgenommenen WAVs: Latenz pro Datei und Wortfehlerrate (WER).
+# Referenz ist --reference bzw. <datei>.txt neben der Aufnahme, sonst das Cloud-Ergebnis.
+# --stub misst den Cloud-Pfad gegen stub_server.py statt gegen die echte API, mit
+# --upload-kbps bei begrenzter Upload-Bandbreite. --codecs vergleicht die Upload-Formate
+# (Bytes und Latenz je Aufnahme).
+
+
+def words(text):
+    return [w.strip(".,!?;:\"'«»“”").lower() for w in text.split() if w.strip(".,!?;:\"'«»“”")]
+
+
+def word_error_rate(reference, hypothesis):
+    ref, hyp = words(reference), words(hypothesis)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    # Levenshtein-Distanz auf Wortebene
+    previous = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        current = [i]
+        for j, h in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (r != h)))
+        previous = current
+    return previous[-1] / len(ref)
+
+
+def reference_for(path, default):
+    txt = os.path.splitext(path)[0] + ".txt"
+    if os.path.exists(txt):
+        with open(txt, encoding="utf-8") as f:
+            return f.read().strip()
+    return default
+
+
+async def measure(backend, wav_bytes, runs):
+    timings = []
+    text = ""
+    for _ in range(runs):
+        started = time.perf_counter()
+        text = await backend.transcribe(wav_bytes)
+        timings.append(time.perf_counter() - started)
+    return text, timings
+
+
+async def compare(args, pipeline, stt):
+    backends = []
+    for name in args.backends:
+        if name == "cloud":
+            for fmt in args.codecs:
+                encoder = codec.UploadEncoder(fmt, args.bitrate)
+                backend = stt.CloudWhisperBackend(pipeline.get_openai_client, pipeline.resilience,
+                                                  encoder=encoder)
+                backend.name = f"cloud/{encoder.fmt}"
+                backends.append(backend)
+        else:
+            backend = stt.LocalWhisperBackend(args.model, language=args.language, threads=args.threads)
+            started = time.perf_counter()
+            try:
+                await asyncio.to_thread(backend.load)
+            except Exception as e:
+                print(f"local: übersprungen: {e}")
+                continue
+            print(f"local: Modell {args.model} geladen in {time.perf_counter() - started:.1f}s")
+            backends.append(backend)
+    try:
+        for path in args.files:
+            with open(path, "rb") as f:
+                wav_bytes = f.read()
+            duration = len(stt.wav_to_float(wav_bytes)) / stt.SAMPLE_RATE
+            print(f"\n{path} ({duration:.1f}s Audio)")
+            results = {}
+            for backend in backends:
+                try:
+                    text, timings = await measure(backend, wav_bytes, args.runs)
+                    upload = None
+                    if isinstance(backend, stt.CloudWhisperBackend):
+                        upload = len(backend.encoder.encode(wav_bytes)[1])
+                    results[backend.name] = (text, timings, upload)
+                except Exception as e:
+                    print(f"  {backend.name:6s} fehlgeschlagen: {e!r}")
+            cloud_text = next((text for name, (text, _, _) in results.items() if name.startswith("cloud")), "")
+            reference = reference_for(path, args.reference or cloud_text)
+            for name, (text, timings, upload) in results.items():
+                timings.sort()
+                wer = f"{word_error_rate(reference, text):.0%}" if reference else "-"
+                size = f"{upload / 1024:6.1f} KiB" if upload is not None else "     lokal"
+                print(f"  {name:11s} {size}  p50 {timings[len(timings) // 2]:.2f}s  max {timings[-1]:.2f}s  "
+                      f"RTF {timings[len(timings) // 2] / duration:.2f}  WER {wer}  »{text}«")
+    finally:
+        await pipeline.close_clients()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("files", nargs="*", default=["aufnahme.wav"])
+    parser.add_argument("--backends", nargs="+", default=["cloud", "local"], choices=["cloud", "local"])
+    parser.add_argument("--model", default="base")
+    parser.add_argument("--language", default=None)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--reference", help="erwarteter Text (sonst <datei>.txt bzw. Cloud-Ergebnis)")
+    parser.add_argument("--stub", action="store_true", help="Cloud-Pfad gegen stub_server.py messen")
+    parser.add_argument("--upload-kbps", type=float, default=None, help="Upload-Bandbreite des Stubs")
+    parser.add_argument("--codecs", nargs="+", default=["wav", "opus"], choices=["wav", "opus", "flac", "mp3"])
+    parser.add_argument("--bitrate", type=int, default=24000)
+    args = parser.parse_args()
+
+    if args.stub:
+        from stub_server import StubConfig, start_stub_server
+        server = start_stub_server(StubConfig(upload_kbps=args.upload_kbps))
+        os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+        os.environ.setdefault("OPENAI_API_KEY", "stub")
+    logging.basicConfig(level=logging.WARNING)
+
+    import pipeline
+    import stt
+    asyncio.run(compare(args, pipeline, stt))
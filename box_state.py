@@ -0,0 +1,196 @@
+import time
+import heapq
+import asyncio
+import logging
+
+# -------------------- Zustandsautomat für die Box --------------------
+# Reine Logik ohne Threads und ohne eigene Uhr: Eingaben sind Sensor-Rohzustände ("in"/"out"),
+# "Audio bereit" und das Verstreichen von Fristen. next_deadline() sagt dem Scheduler,
+# wann er frühestens wieder geweckt werden muss.
+
+logger = logging.getLogger("ProbeLogger")
+
+
+class BoxListener:
+    # Reaktionen des Automaten; probe.py überschreibt, was es braucht
+    def on_state_changed(self, state, now, previous_since):
+        pass
+
+    def on_pickup_prompt(self, now):
+        pass
+
+    def on_reminder_armed(self, now, due):
+        pass
+
+    def on_reminder_due(self, now, level=0):
+        pass
+
+    def on_reminder_cancelled(self, now):
+        pass
+
+    def on_reflection_reset(self, now):
+        pass
+
+
+class BoxStateMachine:
+    def __init__(self, listener, delay_seconds, cancel_seconds, stability_seconds=1, initial_state="out"):
+        # delay_seconds: Zahl oder eskalierender Plan [erste, zweite, ...]; der letzte Wert wiederholt sich
+        self.listener = listener
+        self.delay_schedule = list(delay_seconds) if isinstance(delay_seconds, (list, tuple)) else [delay_seconds]
+        self.delay_seconds = self.delay_schedule[0]
+        self.cancel_seconds = cancel_seconds
+        self.stability_seconds = stability_seconds
+        self.box_state = initial_state
+        self.pending_state = None
+        self.pending_deadline = None
+        self.state_since = None            # Beginn des aktuellen stabilen Zustands
+        self.has_audio = False
+        self.reflection_prompt_played = False
+        self.reminder_deadline = None
+        self.reminder_level = 0            # Anzahl fälliger Erinnerungen seit dem letzten Abbruch
+        self.cancel_deadline = None
+
+    def start(self, now):
+        self._evaluate(now)
+
+    # ---- Eingaben ----
+    def reading(self, raw_state, now):
+        # Ein Wechsel gilt erst, wenn eine spätere Messung nach stability_seconds ihn bestätigt;
+        # ein einzelner Ausreißer verfällt mit der nächsten abweichenden Messung.
+        self.tick(now)
+        if raw_state == self.box_state:
+            self.pending_state = None
+            self.pending_deadline = None
+        elif raw_state != self.pending_state:
+            self.pending_state = raw_state
+            self.pending_deadline = now + self.stability_seconds
+        elif now >= self.pending_deadline:
+            self._commit(raw_state, now)
+
+    def audio_ready(self, now):
+        self.has_audio = True
+        self._evaluate(now)
+
+    def tick(self, now):
+        if self.cancel_deadline is not None and now >= self.cancel_deadline:
+            self.cancel_deadline = None
+            if self.reminder_deadline is not None:
+                self.reminder_deadline = None
+                self.listener.on_reminder_cancelled(now)
+            self.reminder_level = 0
+            self.reflection_prompt_played = False
+            self.listener.on_reflection_reset(now)
+        if self.box_state == "out" and self.reminder_deadline is not None and now >= self.reminder_deadline:
+            self.reminder_deadline = None
+            level = self.reminder_level
+            self.reminder_level += 1
+            self.listener.on_reminder_due(now, level)
+            self._evaluate(now)
+
+    def next_deadline(self):
+        deadlines = [self.cancel_deadline]
+        if self.box_state == "out":
+            # Solange das Handy in der Box liegt, wird der Reminder nur vorgemerkt
+            deadlines.append(self.reminder_deadline)
+        deadlines = [d for d in deadlines if d is not None]
+        return min(deadlines) if deadlines else None
+
+    # ---- Intern ----
+    def _commit(self, state, now):
+        previous_since = self.state_since
+        self.box_state = state
+        self.state_since = now
+        self.pending_state = None
+        self.pending_deadline = None
+        self.listener.on_state_changed(state, now, previous_since)
+        if state == "in":
+            self.cancel_deadline = now + self.cancel_seconds
+        else:
+            self.cancel_deadline = None
+        self._evaluate(now)
+
+    def _evaluate(self, now):
+        if self.box_state != "out":
+            return
+        if self.reminder_deadline is None:
+            if not self.reflection_prompt_played:
+                self.reflection_prompt_played = True
+                self.listener.on_pickup_prompt(now)
+            if self.has_audio:
+                delay = self.delay_schedule[min(self.reminder_level, len(self.delay_schedule) - 1)]
+                self.reminder_deadline = now + delay
+                self.listener.on_reminder_armed(now, self.reminder_deadline)
+        elif now >= self.reminder_deadline:
+            self.tick(now)
+
+# -------------------- Uhr --------------------
+class SystemClock:
+    def now(self):
+        return time.time()
+
+# -------------------- Scheduler --------------------
+class BoxScheduler:
+    # Asyncio-Task, die bis zur nächsten Frist des Automaten schläft oder bis ein Ereignis
+    # eintrifft. post_* darf aus beliebigen Threads aufgerufen werden.
+    def __init__(self, machine, clock=None):
+        self.machine = machine
+        self.clock = clock or SystemClock()
+        self.events = []
+        self.loop = None
+        self.wakeup = None
+
+    def post_reading(self, raw_state):
+        self._post(lambda now: self.machine.reading(raw_state, now))
+
+    def post_audio_ready(self):
+        self._post(self.machine.audio_ready)
+
+    def _post(self, event):
+        if self.loop is None:
+            self.events.append(event)
+        else:
+            self.loop.call_soon_threadsafe(self._enqueue, event)
+
+    def _enqueue(self, event):
+        self.events.append(event)
+        self.wakeup.set()
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        self.wakeup = asyncio.Event()
+        self.machine.start(self.clock.now())
+        while True:
+            while self.events:
+                self.events.pop(0)(self.clock.now())
+            self.machine.tick(self.clock.now())
+            deadline = self.machine.next_deadline()
+            timeout = None if deadline is None else max(0.0, deadline - self.clock.now())
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+
+def simulate(machine, readings, audio_ready_at=None, until=None):
+    # Spielt eine Spur aus (Zeit, Rohzustand) ab und feuert dazwischen alle fälligen Fristen
+    # exakt zu ihrem Zeitpunkt. Tage an Verhalten laufen so in Millisekunden durch.
+    events = [(t, 1, i, raw) for i, (t, raw) in enumerate(readings)]
+    if audio_ready_at is not None:
+        events.append((audio_ready_at, 0, -1, None))
+    heapq.heapify(events)
+    end = until if until is not None else (max(t for t, *_ in events) if events else 0)
+    machine.start(events[0][0] if events else 0)
+    while True:
+        deadline = machine.next_deadline()
+        next_event = events[0][0] if events else None
+        if deadline is not None and (next_event is None or deadline < next_event) and deadline <= end:
+            machine.tick(deadline)
+            continue
+        if next_event is None or next_event > end:
+            break
+        t, kind, _, raw = heapq.heappop(events)
+        if kind == 0:
+            machine.audio_ready(t)
+        else:
+            machine.reading(raw, t)
@@ -0,0 +1,105 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+import logging
+
+# Content-addressed Cache auf der SD-Karte: Schlüssel = SHA-256 über die Anfrageparameter,
+# Dateiname = Hash. LRU über die mtime (wird bei jedem Treffer aktualisiert),
+# Größenbegrenzung durch Löschen der am längsten nicht genutzten Einträge.
+
+logger = logging.getLogger("ProbeLogger")
+
+
+def cache_key(*parts):
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        cleanup_stale_tmp(directory)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)  # als zuletzt benutzt markieren
+        except OSError:
+            pass
+        return data
+
+    def put(self, key, data):
+        # Atomar schreiben: temporäre Datei im selben Verzeichnis, dann os.replace
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        self.evict()
+
+    def evict(self):
+        with self.lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.directory):
+                if entry.name.startswith(".tmp-") or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                    logger.debug("Cache-Eintrag verdrängt: %s", path)
+                except OSError:
+                    pass
+
+    def clear(self):
+        with self.lock:
+            for entry in os.scandir(self.directory):
+                if entry.is_file():
+                    os.remove(entry.path)
+
+    def get_text(self, key):
+        data = self.get(key)
+        return data.decode("utf-8") if data is not None else None
+
+    def put_text(self, key, text):
+        self.put(key, text.encode("utf-8"))
+
+
+def cleanup_stale_tmp(directory, max_age=3600):
+    # Überbleibsel abgebrochener Schreibvorgänge entfernen
+    now = time.time()
+    for entry in os.scandir(directory):
+        if entry.name.startswith(".tmp-") and now - entry.stat().st_mtime > max_age:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
@@ -0,0 +1,297 @@
+import math
+import time
+import queue
+import asyncio
+import threading
+import collections
+import subprocess
+import concurrent.futures
+import logging
+import vad
+import metrics
+from audio import pcm_to_wav_bytes, write_wav
+
+# -------------------- Konfiguration --------------------
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2   # S16_LE
+CHANNELS = 1
+CHUNK_BYTES = SAMPLE_RATE * SAMPLE_WIDTH // 10   # 100 ms pro Lesevorgang
+SEGMENT_SECONDS = 5                               # Länge eines Upload-Segments
+MIN_SEGMENT_BYTES = SAMPLE_RATE * SAMPLE_WIDTH // 5  # < 200 ms wird nicht hochgeladen
+
+logger = logging.getLogger("ProbeLogger")
+
+
+# -------------------- Inkrementelle Transkription --------------------
+class ChunkedTranscriber:
+    # Schneidet den laufenden PCM-Strom in Segmente und lädt jedes Segment im Hintergrund
+    # hoch, während noch aufgenommen wird. Beim Loslassen fehlt nur noch das letzte Segment.
+    # transcribe_func(wav_bytes, prompt) -> str
+    # Segmente ohne Sprache werden nicht hochgeladen (kostet sonst einen bezahlten Aufruf).
+    def __init__(self, transcribe_func, segment_seconds=SEGMENT_SECONDS):
+        self.transcribe_func = transcribe_func
+        self.skipped = 0
+        self.floor = vad.MAX_FLOOR_DB   # Grundrauschen über alle bisherigen Segmente
+        self.segment_bytes = int(segment_seconds * SAMPLE_RATE) * SAMPLE_WIDTH
+        self.pending = bytearray()
+        self.segments = queue.Queue()
+        self.texts = []
+        self.error = None
+        self.cancelled = False
+        self.result = concurrent.futures.Future()   # fertiger Text, sobald der Worker endet
+        self.worker = threading.Thread(target=self._upload_worker, daemon=True)
+        self.worker.start()
+
+    def feed(self, pcm):
+        self.pending.extend(pcm)
+        while len(self.pending) >= self.segment_bytes:
+            self.segments.put(bytes(self.pending[:self.segment_bytes]))
+            del self.pending[:self.segment_bytes]
+
+    def _upload_worker(self):
+        try:
+            self._upload_segments()
+        except Exception as e:
+            self.error = self.error or e
+        if self.error:
+            self.result.set_exception(self.error)
+        else:
+            self.result.set_result(" ".join(t for t in self.texts if t))
+
+    def _upload_segments(self):
+        while True:
+            segment = self.segments.get()
+            if segment is None:
+                break
+            if self.error or self.cancelled:
+                continue
+            self.floor = min(self.floor, vad.noise_floor(vad.frame_energy(segment)))
+            if not vad.has_speech(segment, self.floor):
+                self.skipped += 1
+                logger.debug("Segment ohne Sprache übersprungen")
+                continue
+            try:
+                # Bisheriger Text als Prompt, damit Whisper über Segmentgrenzen hinweg konsistent bleibt
+                text = self.transcribe_func(pcm_to_wav_bytes(segment), " ".join(self.texts))
+                self.texts.append(text.strip())
+                logger.debug("Segment %d transkribiert: %s", len(self.texts), text)
+            except Exception as e:
+                self.error = e
+
+    def close(self):
+        # Letztes Segment einreihen; das Ergebnis kommt über self.result
+        if len(self.pending) >= MIN_SEGMENT_BYTES:
+            # Stille nach dem letzten Wort muss nicht mehr hoch
+            tail = vad.trim(bytes(self.pending), self.floor)
+            if tail:
+                self.segments.put(tail)
+        self.pending.clear()
+        self.segments.put(None)
+
+    def finish(self):
+        self.close()
+        return self.result.result()
+
+    async def wait(self):
+        # Ergebnis im Event-Loop abwarten, ohne einen Pool-Thread mit join() zu blockieren
+        return await asyncio.wrap_future(self.result)
+
+    def cancel(self):
+        # Noch wartende Segmente werden nicht mehr hochgeladen
+        self.cancelled = True
+        self.pending.clear()
+        self.segments.put(None)
+
+# -------------------- Streaming-Aufnahme --------------------
+class StreamingRecorder:
+    # Liest PCM aus der stdout-Pipe von arecord und reicht jeden Chunk sofort weiter.
+    def __init__(self, device, max_seconds, on_chunk=None):
+        self.device = device
+        self.max_seconds = max_seconds
+        self.on_chunk = on_chunk
+        self.pcm = bytearray()
+        self.process = None
+        self.reader = None
+
+    def start(self):
+        self.process = subprocess.Popen([
+            "/usr/bin/arecord", "-D", self.device,
+            "-f", "S16_LE", "-c", str(CHANNELS), "-t", "raw",
+            "-r", str(SAMPLE_RATE), "-d", str(self.max_seconds)
+        ], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        self.reader = threading.Thread(target=self._read_loop, daemon=True)
+        self.reader.start()
+        return self.process
+
+    def _read_loop(self):
+        while True:
+            chunk = self.process.stdout.read(CHUNK_BYTES)
+            if not chunk:
+                break
+            self.pcm.extend(chunk)
+            if self.on_chunk:
+                try:
+                    self.on_chunk(chunk)
+                except Exception:
+                    logger.exception("Fehler beim Weiterreichen des Audio-Chunks")
+
+    def finish(self, filename=None):
+        # Nach terminate()/wait() des Prozesses: Restdaten lesen und optional als WAV sichern
+        if self.reader:
+            self.reader.join()
+        if filename:
+            write_wav(filename, bytes(self.pcm))
+        return bytes(self.pcm)
+
+# -------------------- Vorab geöffnetes Mikrofon --------------------
+def open_arecord(device):
+    # Läuft ohne -d bis terminate(); der Dienst startet ihn einmal, nicht bei jedem Tastendruck
+    return subprocess.Popen([
+        "/usr/bin/arecord", "-D", device,
+        "-f", "S16_LE", "-c", str(CHANNELS), "-t", "raw",
+        "-r", str(SAMPLE_RATE)
+    ], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+
+class CaptureService:
+    # Hält arecord dauerhaft offen und die letzten preroll_seconds in einem Ringpuffer. Beim
+    # Tastendruck übernimmt recorder() den Ringpuffer als Vorlauf und hängt sich an den laufenden
+    # Strom: kein Prozessstart und kein Öffnen des Geräts, die erste Silbe ist schon im Puffer.
+    # device_func() liefert das aktuelle Gerät (nach Hotplug oder Absturz von arecord neu gefragt).
+    def __init__(self, device_func, preroll_seconds=0.5, process_factory=open_arecord, max_restart_seconds=30):
+        self.device_func = device_func
+        self.process_factory = process_factory
+        self.max_restart_seconds = max_restart_seconds
+        chunk_seconds = CHUNK_BYTES / (SAMPLE_RATE * SAMPLE_WIDTH)
+        self.ring = collections.deque(maxlen=max(1, math.ceil(preroll_seconds / chunk_seconds)))
+        self.lock = threading.Lock()
+        self.active = None
+        self.process = None
+        self.device = None
+        self.running = False
+        self.live = threading.Event()        # Gerät liefert Chunks
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._capture_loop, name="capture", daemon=True)
+        self.thread.start()
+
+    def _capture_loop(self):
+        delay = 1
+        while self.running:
+            self.device = self.device_func()
+            try:
+                self.process = process = self.process_factory(self.device)
+            except OSError as e:
+                logger.warning("Mikrofon %s nicht startbar: %s", self.device, e)
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_restart_seconds)
+                continue
+            logger.info("Mikrofon offen: %s", self.device)
+            while True:
+                chunk = process.stdout.read(CHUNK_BYTES)
+                if not chunk:
+                    break
+                if not self.live.is_set():
+                    self.live.set()
+                    delay = 1
+                with self.lock:
+                    self.ring.append(chunk)
+                    active = self.active
+                if active:
+                    active.feed(chunk)
+            self.live.clear()
+            process.wait()
+            with self.lock:
+                self.ring.clear()
+            if self.running:
+                # Gerät abgezogen, arecord abgestürzt oder restart(): mit dem aktuellen Gerät neu öffnen
+                logger.warning("Aufnahmeprozess beendet (Code %s), öffne Mikrofon neu", process.returncode)
+                metrics.count("arecord_restart")
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_restart_seconds)
+
+    def ready(self):
+        # Nur dann übernimmt recorder(); sonst nimmt probe.py wie früher je Tastendruck auf
+        return self.live.is_set()
+
+    def refresh(self):
+        # Nach Hotplug: neu öffnen, falls jetzt ein anderes Gerät gemeint ist. Eine laufende
+        # Aufnahme behält, was sie bis dahin hat.
+        if self.device_func() != self.device:
+            self.restart()
+
+    def restart(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+
+    def recorder(self, max_seconds, on_chunk=None):
+        return PrerollRecorder(self, max_seconds, on_chunk)
+
+    def _attach(self, recorder):
+        with self.lock:
+            if self.active:
+                self.active.terminate()
+            preroll = list(self.ring)
+            self.active = recorder
+            # Unter dem Lock, damit der Vorlauf garantiert vor dem nächsten Live-Chunk ankommt
+            for chunk in preroll:
+                recorder.feed(chunk)
+
+    def _detach(self, recorder):
+        with self.lock:
+            if self.active is recorder:
+                self.active = None
+
+    def close(self):
+        self.running = False
+        self.restart()
+        if self.thread:
+            self.thread.join(timeout=2)
+
+
+class PrerollRecorder:
+    # Schnittstelle wie StreamingRecorder; start() liefert statt eines Prozesses sich selbst
+    # mit poll()/terminate()/wait(), damit probe.py beide gleich behandeln kann.
+    def __init__(self, service, max_seconds, on_chunk=None):
+        self.service = service
+        self.max_bytes = int(max_seconds * SAMPLE_RATE) * SAMPLE_WIDTH
+        self.on_chunk = on_chunk
+        self.pcm = bytearray()
+        self.returncode = None
+        self.preroll_bytes = 0
+
+    def start(self):
+        self.service._attach(self)
+        self.preroll_bytes = len(self.pcm)
+        return self
+
+    def feed(self, chunk):
+        if self.returncode is not None:
+            return
+        self.pcm.extend(chunk)
+        if self.on_chunk:
+            try:
+                self.on_chunk(chunk)
+            except Exception:
+                logger.exception("Fehler beim Weiterreichen des Audio-Chunks")
+        if len(self.pcm) - self.preroll_bytes >= self.max_bytes:
+            self.returncode = 0          # wie arecord -d: Höchstdauer erreicht
+
+    def poll(self):
+        return self.returncode
+
+    def terminate(self):
+        if self.returncode is None:
+            self.returncode = -15
+
+    def wait(self, timeout=None):
+        self.service._detach(self)
+        return self.returncode
+
+    def finish(self, filename=None):
+        self.service._detach(self)
+        if filename:
+            write_wav(filename, bytes(self.pcm))
+        return bytes(self.pcm)
@@ -0,0 +1,79 @@
+import io
+import time
+import logging
+import numpy as np
+from audio import wav_to_pcm
+
+# -------------------- Upload-Kodierung --------------------
+# Komprimiert Aufnahmen vor dem Upload zu Whisper im Prozess über PyAV (libopus, FLAC,
+# LAME). Sprache bei 16 kHz mono braucht mit Opus ~24 kbit/s statt 256 kbit/s als WAV.
+# Ohne PyAV oder bei Fehlern wird unverändert als WAV hochgeladen.
+
+SAMPLE_RATE = 16000
+
+try:
+    import av
+    AV_AVAILABLE = True
+except ImportError:
+    AV_AVAILABLE = False
+
+# name: (Container, Codec, Dateiendung, MIME-Typ)
+FORMATS = {
+    "opus": ("ogg", "libopus", "ogg", "audio/ogg"),
+    "flac": ("flac", "flac", "flac", "audio/flac"),
+    "mp3": ("mp3", "libmp3lame", "mp3", "audio/mpeg"),
+}
+
+logger = logging.getLogger("ProbeLogger")
+
+
+def encode_pcm(pcm, fmt, bitrate=None):
+    # PCM 16 kHz mono S16_LE -> komprimierte Datei als bytes
+    container, codec, _, _ = FORMATS[fmt]
+    buffer = io.BytesIO()
+    with av.open(buffer, "w", format=container) as output:
+        stream = output.add_stream(codec, rate=SAMPLE_RATE)
+        stream.layout = "mono"
+        if bitrate and fmt != "flac":
+            stream.bit_rate = bitrate
+        frame = av.AudioFrame.from_ndarray(np.frombuffer(pcm, dtype="<i2").reshape(1, -1),
+                                           format="s16", layout="mono")
+        frame.sample_rate = SAMPLE_RATE
+        for packet in stream.encode(frame):
+            output.mux(packet)
+        for packet in stream.encode(None):
+            output.mux(packet)
+    return buffer.getvalue()
+
+
+class UploadEncoder:
+    # fmt: "wav" (keine Kodierung), "opus", "flac" oder "mp3"; bitrate in bit/s (nicht für FLAC)
+    def __init__(self, fmt="opus", bitrate=24000):
+        if fmt != "wav" and fmt not in FORMATS:
+            raise ValueError(f"Unbekanntes Upload-Format: {fmt}")
+        if fmt != "wav" and not AV_AVAILABLE:
+            logger.warning("PyAV fehlt (pip install av), lade Aufnahmen als WAV hoch")
+            fmt = "wav"
+        self.fmt = fmt
+        self.bitrate = bitrate
+        self.stats = {"count": 0, "raw_bytes": 0, "encoded_bytes": 0, "encode_seconds": 0.0}
+
+    def encode(self, wav_bytes, name="aufnahme"):
+        # Liefert (Dateiname, Daten, MIME-Typ) für den multipart-Upload
+        if self.fmt == "wav":
+            return f"{name}.wav", wav_bytes, "audio/wav"
+        started = time.perf_counter()
+        try:
+            data = encode_pcm(wav_to_pcm(wav_bytes), self.fmt, self.bitrate)
+        except Exception as e:
+            logger.warning("Kodierung als %s fehlgeschlagen, lade WAV hoch: %s", self.fmt, e)
+            return f"{name}.wav", wav_bytes, "audio/wav"
+        seconds = time.perf_counter() - started
+        self.stats["count"] += 1
+        self.stats["raw_bytes"] += len(wav_bytes)
+        self.stats["encoded_bytes"] += len(data)
+        self.stats["encode_seconds"] += seconds
+        logger.info("Upload %s: %d → %d Bytes (%.0f %%) in %.0f ms", self.fmt, len(wav_bytes), len(data),
+                    100 * len(data) / max(1, len(wav_bytes)), seconds * 1000)
+        _, _, extension, mime = FORMATS[self.fmt]
+        return f"{name}.{extension}", data, mime
@@ -0,0 +1,135 @@
+import os
+import re
+import socket
+import asyncio
+import threading
+import logging
+import metrics
+
+# -------------------- Audiogeräte --------------------
+# Aufnahme- und Wiedergabegeräte werden einmal aus /proc/asound gelesen und zwischengespeichert,
+# statt bei jeder Aufnahme "arecord -l" zu starten. watch() lauscht auf Hotplug-Ereignisse des
+# Kernels (Netlink, Subsystem "sound", ohne pyudev) und liest die Liste danach neu ein; ohne
+# Netlink wird regelmäßig nachgelesen. Aufnahme und Wiedergabe fragen beide find().
+
+ASOUND_DIR = "/proc/asound"
+SETTLE_SECONDS = 0.5       # nach einem Hotplug-Ereignis, bis ALSA alle PCMs angelegt hat
+POLL_SECONDS = 30          # Ersatz, falls kein Netlink-Socket geöffnet werden kann
+NETLINK_KOBJECT_UEVENT = 15
+
+logger = logging.getLogger("ProbeLogger")
+
+# " 1 [Device         ]: USB-Audio - USB PnP Sound Device"
+CARD = re.compile(r"^\s*(\d+) \[(\S+)\s*\]: (.*?) - (.*)$", re.M)
+# "01-00: USB Audio : USB Audio : capture 1"
+PCM = re.compile(r"^(\d+)-(\d+): ([^:]*?) : [^:]*? :(.*)$", re.M)
+
+
+class AudioDevice:
+    def __init__(self, card, device, card_id, card_name, name, capture, playback):
+        self.card = card
+        self.device = device
+        self.card_id = card_id
+        self.card_name = card_name
+        self.name = name
+        self.capture = capture
+        self.playback = playback
+
+    @property
+    def alsa_name(self):
+        # Über die Karten-ID statt den Index: bleibt gleich, wenn USB-Geräte neu nummeriert werden
+        return f"plughw:{self.card_id},{self.device}"
+
+    def matches(self, hint):
+        return hint in self.card_name or hint in (self.card_id, self.name)
+
+    def __eq__(self, other):
+        return isinstance(other, AudioDevice) and vars(self) == vars(other)
+
+    def __repr__(self):
+        kinds = "/".join(k for k in ("capture", "playback") if getattr(self, k))
+        return f"{self.alsa_name} ({self.card_name}, {kinds})"
+
+
+def read_text(path):
+    try:
+        with open(path) as f:
+            return f.read()
+    except OSError:
+        return ""
+
+
+def scan(root=ASOUND_DIR):
+    cards = {int(index): (card_id, name)
+             for index, card_id, _, name in CARD.findall(read_text(os.path.join(root, "cards")))}
+    found = []
+    for card, device, name, streams in PCM.findall(read_text(os.path.join(root, "pcm"))):
+        card = int(card)
+        if card not in cards:
+            continue
+        card_id, card_name = cards[card]
+        found.append(AudioDevice(card, int(device), card_id, card_name.strip(), name.strip(),
+                                 "capture" in streams, "playback" in streams))
+    return found
+
+
+class DeviceRegistry:
+    def __init__(self, root=ASOUND_DIR):
+        self.root = root
+        self.devices = []
+        self.listeners = []
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        # /proc/asound liegt im Speicher; Einlesen dauert Bruchteile einer Millisekunde
+        devices = scan(self.root)
+        with self.lock:
+            changed, self.devices = devices != self.devices, devices
+        if changed:
+            logger.info("Audiogeräte: %s", ", ".join(map(repr, devices)) or "keine")
+            metrics.count("audio_devices_changed")
+            for listener in self.listeners:
+                try:
+                    listener(devices)
+                except Exception:
+                    logger.exception("Fehler beim Melden geänderter Audiogeräte")
+        return devices
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def find(self, hint, kind="capture", fallback=None):
+        with self.lock:
+            devices = self.devices
+        for device in devices:
+            if getattr(device, kind) and device.matches(hint):
+                return device.alsa_name
+        logger.warning("Kein Audiogerät für %s (%s) gefunden, nutze %s", hint, kind, fallback)
+        return fallback
+
+    async def watch(self):
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+            sock.bind((0, 1))       # Multicast-Gruppe 1: Ereignisse direkt vom Kernel
+        except (OSError, AttributeError) as e:
+            logger.warning("Keine Hotplug-Ereignisse (%s), lese Audiogeräte alle %ss neu", e, POLL_SECONDS)
+            while True:
+                await asyncio.sleep(POLL_SECONDS)
+                self.refresh()
+        sock.setblocking(False)
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                message = await loop.sock_recv(sock, 16384)
+                if b"\0SUBSYSTEM=sound\0" not in message:
+                    continue
+                # Eine Karte meldet sich mit mehreren Ereignissen; gesammelt einmal neu einlesen
+                await asyncio.sleep(SETTLE_SECONDS)
+                while True:
+                    try:
+                        sock.recv(16384)
+                    except BlockingIOError:
+                        break
+                self.refresh()
+        finally:
+            sock.close()
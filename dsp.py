@@ -0,0 +1,114 @@
+import numpy as np
+from audio import SAMPLE_RATE, to_float, from_float
+
+# -------------------- Streaming-DSP --------------------
+# Lautheitsangleichung, Limiter und Fades für PCM-Chunks, während sie von der TTS ankommen.
+# Die Lautheit wird als gleitender RMS über Sprach-Frames geschätzt (Stille zählt nicht mit,
+# ähnlich dem Gating bei LUFS). Die Verstärkung folgt langsam und wird innerhalb eines Chunks
+# linear interpoliert, damit keine Sprünge hörbar sind. Gepuffert wird nur der Fade-out.
+
+FRAME_SAMPLES = SAMPLE_RATE // 100     # 10 ms
+LIMITER_BLOCK = SAMPLE_RATE // 200     # 5 ms
+
+
+class StreamProcessor:
+    def __init__(self, target_db=-20.0, max_gain_db=12.0, min_gain_db=-12.0, limit_db=-1.0,
+                 gate_db=-50.0, time_constant=1.5, release=0.8, fade_in=0.01, fade_out=0.05,
+                 sample_rate=SAMPLE_RATE):
+        self.target_db = target_db
+        self.max_gain_db = max_gain_db
+        self.min_gain_db = min_gain_db
+        self.limit = 10 ** (limit_db / 20)
+        self.gate_db = gate_db
+        self.time_constant = time_constant   # Sekunden, über die sich die Lautheitsschätzung anpasst
+        self.sample_rate = sample_rate
+        self.release = release           # Erholung des Limiters je 5-ms-Block
+        self.fade_in_samples = int(fade_in * sample_rate)
+        self.fade_out_samples = int(fade_out * sample_rate)
+        self.power = None
+        self.loudness_db = None
+        self.gain = None                 # aktuelle lineare Verstärkung
+        self.limiter_gain = 1.0
+        self.position = 0                # bisher ausgegebene Samples (für den Fade-in)
+        self.odd_byte = b""              # Chunks können mitten in einem Sample enden
+        self.held = np.zeros(0, dtype=np.float32)
+
+    def _measure(self, samples):
+        # (mittlere Leistung der Sprach-Frames, Anzahl Sprach-Frames); Gate absolut und
+        # relativ 10 dB unter der bisherigen Schätzung wie bei LUFS
+        count = len(samples) // FRAME_SAMPLES
+        if not count:
+            return None, 0
+        frames = samples[:count * FRAME_SAMPLES].reshape(count, FRAME_SAMPLES)
+        energy = np.mean(frames * frames, axis=1)
+        gate = self.gate_db if self.loudness_db is None else max(self.gate_db, self.loudness_db - 10)
+        speech = energy > 10 ** (gate / 10)
+        if not speech.any():
+            return None, 0
+        return float(np.mean(energy[speech])), int(speech.sum())
+
+    def measure_db(self, samples):
+        power, _ = self._measure(samples)
+        return None if power is None else 10 * np.log10(power)
+
+    def _target_gain(self, samples):
+        power, frames = self._measure(samples)
+        if power is not None:
+            if self.power is None:
+                self.power = power
+            else:
+                # Gewicht nach Dauer der Sprache im Chunk, unabhängig von der Chunk-Größe
+                keep = np.exp(-frames * FRAME_SAMPLES / (self.sample_rate * self.time_constant))
+                self.power = keep * self.power + (1 - keep) * power
+            self.loudness_db = 10 * np.log10(self.power)
+        if self.loudness_db is None:
+            return self.gain if self.gain is not None else 1.0
+        gain_db = np.clip(self.target_db - self.loudness_db, self.min_gain_db, self.max_gain_db)
+        return 10 ** (gain_db / 20)
+
+    def _limit(self, samples):
+        # Blockweiser Spitzenbegrenzer: sofortiger Eingriff, exponentielle Erholung
+        count = -(-len(samples) // LIMITER_BLOCK)
+        padded = np.zeros(count * LIMITER_BLOCK, dtype=np.float32)
+        padded[:len(samples)] = np.abs(samples)
+        peaks = padded.reshape(count, LIMITER_BLOCK).max(axis=1)
+        needed = np.minimum(1.0, self.limit / np.maximum(peaks, 1e-9))
+        gains = np.empty(count, dtype=np.float32)
+        current = self.limiter_gain
+        for i, value in enumerate(needed):
+            current = value if value < current else min(value, current / self.release)
+            gains[i] = current
+        self.limiter_gain = current
+        samples = samples * np.repeat(gains, LIMITER_BLOCK)[:len(samples)]
+        return np.clip(samples, -self.limit, self.limit)
+
+    def process(self, chunk):
+        data = self.odd_byte + bytes(chunk)
+        usable = len(data) - len(data) % 2
+        self.odd_byte = data[usable:]
+        samples = to_float(data[:usable])
+        if not len(samples):
+            return b""
+        target = self._target_gain(samples)
+        start = self.gain if self.gain is not None else target
+        # Verstärkung über den Chunk hinweg vom alten zum neuen Wert überblenden
+        samples = samples * np.linspace(start, target, len(samples), dtype=np.float32)
+        self.gain = target
+        samples = self._limit(samples)
+        if self.position < self.fade_in_samples:
+            n = min(len(samples), self.fade_in_samples - self.position)
+            ramp = np.arange(self.position, self.position + n, dtype=np.float32) / self.fade_in_samples
+            samples[:n] *= ramp
+        self.position += len(samples)
+        # Das Ende zurückhalten, bis klar ist, ob es das Ende der Antwort ist
+        samples = np.concatenate([self.held, samples])
+        cut = max(0, len(samples) - self.fade_out_samples)
+        self.held = samples[cut:]
+        return from_float(samples[:cut])
+
+    def finish(self):
+        tail = self.held
+        self.held = np.zeros(0, dtype=np.float32)
+        if len(tail):
+            tail = tail * np.linspace(1.0, 0.0, len(tail), dtype=np.float32)
+        return from_float(tail)
@@ -1,28 +1,27 @@
-import os
-from elevenlabs.client import ElevenLabs
-from dotenv import load_dotenv
+import asyncio
+import argparse
+import pipeline
 
-# Load your ElevenLabs API key from .env
-load_dotenv()
-api_key = os.getenv("ELEVENLABS_API_KEY")
+# Erzeugt feste Ansagen (start.wav, stop.wav, pickup.wav, ...) als PCM 16 kHz.
+# Läuft über den TTS-Cache der Pipeline, wiederholte Aufrufe kosten also keine API-Anfrage.
+#
+#   python elevenlabs_text_generate.py "The device is shutting down." -o stop.wav
 
-# Initialize ElevenLabs client
-client = ElevenLabs(api_key=api_key)
+parser = argparse.ArgumentParser(description="Text mit ElevenLabs vertonen")
+parser.add_argument("text", nargs="?", default="The device is shutting down.")
+parser.add_argument("-o", "--output", default="stop.wav")
+parser.add_argument("--voice", default=pipeline.VOICE_ID)  # Adjust if you want another voice
+parser.add_argument("--model", default=pipeline.TTS_MODEL)
+parser.add_argument("--format", default=pipeline.TTS_FORMAT)
+args = parser.parse_args()
 
-# Your custom startup message
-text = "The device is shutting down."
+async def generate():
+    audio = pipeline.synthesize(args.text, voice_id=args.voice, model_id=args.model,
+                                output_format=args.format, budget=None)
+    with open(args.output, "wb") as f:
+        async for chunk in audio:
+            f.write(chunk)
 
-# Generate speech
-audio = client.text_to_speech.convert(
-    text=text,
-    voice_id="FTNCalFNG5bRnkkaP5Ug",  # Adjust if you want another voice
-    model_id="eleven_multilingual_v2",
-    output_format="pcm_16000"
-)
+asyncio.run(generate())
 
-# Save to pickup.wav
-with open("stop.wav", "wb") as f:
-    for chunk in audio:
-        f.write(chunk)
-
-print("stop.wav created successfully.")
+print(f"{args.output} created successfully.")
@@ -0,0 +1,101 @@
+import json
+import queue
+import atexit
+import logging
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+
+# -------------------- Strukturierte Study-Events --------------------
+# Zusätzlich zum lesbaren study.log wird jedes Studienereignis als typisiertes Event
+# geschrieben: eine kompakte JSON-Zeile je Event in einer Tagesdatei, die nur angehängt
+# und nie gelöscht wird. Geschrieben wird über eine Queue in einem eigenen Thread, damit
+# Dateizugriffe die Event-Schleife nicht blockieren. export_events.py macht daraus
+# SQLite-Tabellen oder Parquet-Dateien für die Auswertung.
+
+# Event-Typ → Feld → Typ (für Prüfung beim Schreiben und Spaltentypen beim Export)
+EVENTS = {
+    "box": {"state": str, "since": float, "duration": float},
+    "recording": {"intention": str, "duration": float, "speech": float},
+    "transcription": {"intention": str, "text": str},
+    "response": {"intention": str, "kind": str, "text": str},
+    "reminder": {"intention": str, "kind": str, "level": int, "text": str},
+    "session": {"intentions": int, "reminders": int, "started": float},
+}
+# Felder, die fehlen dürfen: verworfene Aufnahmen gehören zu keinem Vorhaben
+OPTIONAL = {"recording": {"intention"}}
+
+logger = logging.getLogger("ProbeLogger")
+
+event_logger = logging.getLogger("EventLogger")
+event_logger.setLevel(logging.INFO)
+event_logger.propagate = False
+
+
+def record(event, **fields):
+    # Läuft in Wiedergabe- und Aufnahmepfaden: Abweichungen vom Schema nur melden, das Event
+    # wird trotzdem geschrieben
+    problems = validate(event, fields)
+    if problems:
+        logger.warning("Event %s weicht vom Schema ab: %s", event, "; ".join(problems))
+    event_logger.info(event, extra={"fields": fields})
+
+
+def validate(event, fields):
+    schema = EVENTS.get(event)
+    if schema is None:
+        return [f"unbekannter Event-Typ {event!r}"]
+    problems = []
+    for name, value in fields.items():
+        expected = schema.get(name)
+        if expected is None:
+            problems.append(f"unbekanntes Feld {name}")
+        elif not matches(value, expected):
+            problems.append(f"{name}: {type(value).__name__} statt {expected.__name__}")
+    missing = set(schema) - set(fields) - OPTIONAL.get(event, set())
+    if missing:
+        problems.append(f"fehlende Felder {sorted(missing)}")
+    return problems
+
+
+def matches(value, expected):
+    # bool ist in Python ein int, zählt hier aber nicht als Zahl; ganze Zahlen gelten als float
+    if isinstance(value, bool):
+        return expected is bool
+    if expected is float:
+        return isinstance(value, (int, float))
+    return isinstance(value, expected)
+
+
+class EventFormatter(logging.Formatter):
+    # Kurze Schlüssel und keine Leerzeichen: t = Zeitstempel, e = Event-Typ
+    def format(self, record):
+        data = {"t": round(record.created, 3), "e": record.getMessage()}
+        data.update(getattr(record, "fields", {}))
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def queued(logger, *handlers):
+    # Hängt die Handler hinter eine Queue; geschrieben wird im Thread des QueueListener
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(QueueHandler(log_queue))
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+def file_handler(path):
+    # Eine Datei pro Tag (events.jsonl.JJJJ-MM-TT), alte Tage bleiben erhalten
+    handler = TimedRotatingFileHandler(path, when="midnight", backupCount=0, encoding="utf-8")
+    handler.setFormatter(EventFormatter())
+    return handler
+
+
+def read(paths):
+    # Liest Event-Dateien; abgeschnittene letzte Zeilen (Stromausfall) werden übersprungen
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
@@ -0,0 +1,92 @@
+import os
+import glob
+import json
+import sqlite3
+import argparse
+import events
+
+# Exportiert die Event-Dateien (events.jsonl + Tagesdateien) in eine Tabelle je Event-Typ:
+#
+#   python3 export_events.py /var/log/probe --sqlite study.db
+#   python3 export_events.py /var/log/probe --parquet study_parquet/   # braucht pyarrow
+#
+# Der Export wird jedes Mal vollständig neu geschrieben und ist damit wiederholbar.
+
+SQL_TYPES = {str: "TEXT", float: "REAL", int: "INTEGER"}
+
+
+def event_files(source):
+    if os.path.isfile(source):
+        return [source]
+    # Tagesdateien zuerst (nach Datum), die laufende Datei zuletzt
+    return sorted(glob.glob(os.path.join(source, "events.jsonl.*"))) + \
+        glob.glob(os.path.join(source, "events.jsonl"))
+
+
+def group(rows):
+    tables = {name: [] for name in events.EVENTS}
+    for row in rows:
+        tables.setdefault(row.get("e"), []).append(row)
+    return tables
+
+
+def columns(name, rows):
+    schema = events.EVENTS.get(name)
+    if schema is None:
+        # Event-Typ aus einer älteren oder neueren Version: Spalten aus den Daten
+        keys = sorted({k for row in rows for k in row} - {"t", "e"})
+        schema = {k: str for k in keys}
+    return [("t", float)] + list(schema.items())
+
+
+def to_sqlite(tables, path):
+    db = sqlite3.connect(path)
+    with db:
+        for name, rows in tables.items():
+            cols = columns(name, rows)
+            db.execute(f'DROP TABLE IF EXISTS "{name}"')
+            db.execute(f'CREATE TABLE "{name}" ({", ".join(f"{c} {SQL_TYPES[t]}" for c, t in cols)})')
+            db.execute(f'CREATE INDEX "{name}_t" ON "{name}" (t)')
+            placeholders = ", ".join("?" for _ in cols)
+            db.executemany(f'INSERT INTO "{name}" VALUES ({placeholders})',
+                           ([value(row.get(c)) for c, _ in cols] for row in rows))
+    db.close()
+
+
+def value(v):
+    return json.dumps(v, ensure_ascii=False) if isinstance(v, (dict, list)) else v
+
+
+def to_parquet(tables, directory):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    arrow_types = {str: pa.string(), float: pa.float64(), int: pa.int64()}
+    os.makedirs(directory, exist_ok=True)
+    for name, rows in tables.items():
+        cols = columns(name, rows)
+        schema = pa.schema([(c, arrow_types[t]) for c, t in cols])
+        data = {c: [value(row.get(c)) for row in rows] for c, _ in cols}
+        pq.write_table(pa.Table.from_pydict(data, schema=schema), os.path.join(directory, f"{name}.parquet"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("source", nargs="?", default="/var/log/probe")
+    parser.add_argument("--sqlite")
+    parser.add_argument("--parquet")
+    args = parser.parse_args()
+    if not args.sqlite and not args.parquet:
+        parser.error("--sqlite oder --parquet angeben")
+
+    files = event_files(args.source)
+    tables = group(events.read(files))
+    print(f"{len(files)} Dateien: " + ", ".join(f"{name} {len(rows)}" for name, rows in tables.items()))
+    if args.sqlite:
+        to_sqlite(tables, args.sqlite)
+        print(f"SQLite: {args.sqlite}")
+    if args.parquet:
+        try:
+            to_parquet(tables, args.parquet)
+        except ImportError:
+            raise SystemExit("Parquet-Export braucht pyarrow (pip install pyarrow)")
+        print(f"Parquet: {args.parquet}")
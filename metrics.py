@@ -0,0 +1,143 @@
+import os
+import time
+import asyncio
+import threading
+import contextlib
+import collections
+import logging
+
+# -------------------- Metriken --------------------
+# Histogramme je Stufe (Whisper, GPT, TTS, Schreiben, Wiedergabe, Sensor ...) und Zähler,
+# abrufbar im Prometheus-Textformat über einen kleinen lokalen Endpunkt (TCP oder
+# Unix-Socket). Zusätzlich schreibt summary_loop regelmäßig p50/p95/max des letzten
+# Intervalls ins probe.log. observe() ist thread-sicher und kostet wenige Mikrosekunden.
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+WINDOW_SIZE = 1000           # höchstens so viele Werte je Stufe pro Zusammenfassung
+
+logger = logging.getLogger("ProbeLogger")
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # letzter Eintrag: +Inf
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.window = collections.deque(maxlen=WINDOW_SIZE)
+
+    def observe(self, seconds):
+        index = 0
+        while index < len(self.buckets) and seconds > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.window.append(seconds)
+
+
+class Registry:
+    def __init__(self):
+        self.histograms = {}
+        self.counters = collections.Counter()
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram()
+            histogram.observe(seconds)
+
+    @contextlib.contextmanager
+    def timer(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def render(self):
+        # Prometheus-Textformat (Version 0.0.4)
+        lines = ["# TYPE probe_stage_seconds histogram"]
+        with self.lock:
+            for stage, h in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(h.buckets + (float("inf"),), h.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'probe_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'probe_stage_seconds_sum{{stage="{stage}"}} {h.total:.6f}')
+                lines.append(f'probe_stage_seconds_count{{stage="{stage}"}} {h.count}')
+            lines.append("# TYPE probe_events_total counter")
+            for name, value in sorted(self.counters.items()):
+                lines.append(f'probe_events_total{{event="{name}"}} {value}')
+        lines.append("# TYPE probe_uptime_seconds gauge")
+        lines.append(f"probe_uptime_seconds {time.time() - self.started:.0f}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        # (Stufe, Anzahl, p50, p95, max) seit der letzten Zusammenfassung; leert die Fenster
+        rows = []
+        with self.lock:
+            for stage, h in sorted(self.histograms.items()):
+                if not h.window:
+                    continue
+                ordered = sorted(h.window)
+                h.window.clear()
+                pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+                rows.append((stage, len(ordered), pick(0.5), pick(0.95), ordered[-1]))
+        return rows
+
+
+registry = Registry()
+observe = registry.observe
+timer = registry.timer
+count = registry.count
+
+
+async def summary_loop(interval):
+    while True:
+        await asyncio.sleep(interval)
+        rows = registry.summary()
+        if rows:
+            logger.info("Metriken (%d s): %s", interval, "; ".join(
+                f"{stage} n={n} p50={p50 * 1000:.0f}ms p95={p95 * 1000:.0f}ms max={peak * 1000:.0f}ms"
+                for stage, n, p50, p95, peak in rows))
+
+
+async def _handle(reader, writer):
+    try:
+        # Anfrage bis zur Leerzeile lesen; jeder Pfad liefert die Metriken
+        while (await asyncio.wait_for(reader.readline(), 5)).strip():
+            pass
+        body = registry.render().encode()
+        writer.write(b"HTTP/1.0 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                     b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body)
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(address):
+    # address: "127.0.0.1:9101" oder "unix:/run/probe/metrics.sock"
+    if address.startswith("unix:"):
+        path = address[len("unix:"):]
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)          # Socket vom letzten Lauf
+        server = await asyncio.start_unix_server(_handle, path=path)
+    else:
+        host, _, port = address.rpartition(":")
+        server = await asyncio.start_server(_handle, host or "127.0.0.1", int(port))
+    logger.info("Metriken unter %s", address)
+    async with server:
+        await server.serve_forever()
@@ -0,0 +1,495 @@
+import os
+import re
+import time
+import asyncio
+import contextlib
+import logging
+import httpx
+from dotenv import load_dotenv
+from cache import ResponseCache, cache_key
+from resilience import Resilience, Policy
+import stt
+import tts
+import codec
+import dsp
+import metrics
+
+# -------------------- Konfiguration --------------------
+load_dotenv()
+
+CHAT_MODEL = "gpt-4"
+VOICE_ID = "FTNCalFNG5bRnkkaP5Ug"
+TTS_MODEL = "eleven_multilingual_v2"
+TTS_FORMAT = "pcm_16000"
+
+CACHE_DIR = os.getenv("PROBE_CACHE_DIR", "cache")
+TTS_CACHE_BYTES = 200 * 1024 * 1024
+CHAT_CACHE_BYTES = 5 * 1024 * 1024
+STT_BACKEND = os.getenv("PROBE_STT_BACKEND", "cloud")   # "cloud", "local" oder "auto"
+STT_MODEL = os.getenv("PROBE_STT_MODEL", "base")         # faster-whisper Modell für "local"/"auto"
+STT_LANGUAGE = os.getenv("PROBE_STT_LANGUAGE") or None  # None = automatisch erkennen
+UPLOAD_FORMAT = os.getenv("PROBE_UPLOAD_FORMAT", "opus")        # "opus", "flac", "mp3" oder "wav"
+UPLOAD_BITRATE = int(os.getenv("PROBE_UPLOAD_BITRATE", "24000"))  # bit/s für opus/mp3
+HEDGE_TTS = True           # TTS-Anfrage doppeln, wenn der erste Chunk länger als p95 braucht
+TTS_BUDGET = 8             # Sekunden bis zum ersten ElevenLabs-Chunk, danach lokale Sprachausgabe
+LOCAL_TTS_VOICE = os.getenv("PROBE_LOCAL_TTS_VOICE", "en-us")
+FRAGMENT_DIR = os.path.join(CACHE_DIR, "fragments")
+# Check-in-Einstiege aus dem Systemprompt; als fertige Fragmente ohne API-Aufruf abspielbar
+CHECK_IN_FRAGMENTS = [
+    "Hey, I noticed you haven’t put your phone back yet.",
+    "Hi there, just checking in—remember what you told me before?",
+]
+FALLBACK_REMINDER = "Remember what you planned: {}"
+VARIANT_TEMPERATURE = 1.0  # Alternativen sollen anders formuliert sein als die Hauptantwort
+OUTPUT_LOUDNESS_DB = -20   # Ziel-Lautheit der Sprachausgabe (RMS über Sprache, dBFS)
+OUTPUT_LIMIT_DB = -1       # Spitzen darüber begrenzt der Limiter
+
+SYSTEM_PROMPT = "You are a supportive and encouraging assistant helping someone follow through on an offline activity they intended to do after using their phone. Your response should always be two sentences: Start with a warm, friendly check-in that gently reminds the user their phone is still out of the box (this doesn't mean they're using it). Example: Hey, I noticed you haven’t put your phone back yet. Hi there, just checking in—remember what you told me before? Restate their planned activity vividly, using sensory or emotional language. Highlight a possible reward or positive feeling, and end with an open-ended, reflective question (not a command). Examples: Can you picture how nice it will feel to have the dishes done—what would you have to do first to start? Imagine the fresh air on your face during your walk—where would you like to go? Keep the tone friendly, non-judgmental, gently encouraging, and reflective. Avoid direct instructions or pressure. The planned activity is:"
+
+logger = logging.getLogger("ProbeLogger")
+study_logger = logging.getLogger("StudyLogger")
+
+
+# -------------------- HTTP-Verbindungen --------------------
+# Je API ein eigener httpx-Pool mit Keep-alive. Zwischen zwei Erinnerungen liegen oft Minuten;
+# keep_warm() hält die Verbindungen in dieser Zeit offen, damit nach dem Loslassen des Knopfes
+# kein DNS-Lookup, TCP- und TLS-Handshake mehr anfällt.
+try:
+    import h2  # noqa: F401  (optional, aktiviert HTTP/2)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+KEEPALIVE_SECONDS = 120
+WARMUP_INTERVAL = 45       # Sekunden zwischen zwei Warmhalte-Anfragen
+
+openai_http = None
+elevenlabs_http = None
+openai_client = None
+elevenlabs = None
+
+
+def create_http_client():
+    return httpx.AsyncClient(
+        http2=HTTP2_AVAILABLE,
+        limits=httpx.Limits(max_connections=8, max_keepalive_connections=4,
+                            keepalive_expiry=KEEPALIVE_SECONDS),
+        timeout=httpx.Timeout(60, connect=10),
+    )
+
+
+def elevenlabs_base_url():
+    return (os.getenv("ELEVENLABS_BASE_URL") or "https://api.elevenlabs.io").rstrip("/")
+
+
+def openai_base_url():
+    return str(get_openai_client().base_url).rstrip("/")
+
+
+def create_elevenlabs_client(http_client=None):
+    # ELEVENLABS_BASE_URL erlaubt einen lokalen Stand-in-Server (z. B. stub_server.py).
+    # Der base_url-Parameter des SDK verwirft Schema und Port, daher eigenes Environment.
+    # Die SDKs werden erst hier importiert: allein ihr Import dauert auf dem Pi Sekunden.
+    from elevenlabs.client import AsyncElevenLabs
+    from elevenlabs.environment import ElevenLabsEnvironment
+    base_url = elevenlabs_base_url()
+    environment = ElevenLabsEnvironment(base=base_url, wss=re.sub(r"^http", "ws", base_url))
+    return AsyncElevenLabs(api_key=os.getenv("ELEVENLABS_API_KEY"), environment=environment,
+                           httpx_client=http_client)
+
+
+def get_openai_client():
+    # Erst bei Bedarf anlegen: Skripte, die nur TTS brauchen, kommen ohne OpenAI-Key aus.
+    # OPENAI_BASE_URL wird vom SDK selbst ausgewertet.
+    global openai_client, openai_http
+    if openai_client is None:
+        from openai import AsyncOpenAI
+        openai_http = create_http_client()
+        openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=openai_http,
+                                    max_retries=0)
+    return openai_client
+
+
+def get_elevenlabs_client():
+    global elevenlabs, elevenlabs_http
+    if elevenlabs is None:
+        elevenlabs_http = create_http_client()
+        elevenlabs = create_elevenlabs_client(elevenlabs_http)
+    return elevenlabs
+
+
+def create_clients():
+    # Beim Start im Thread-Pool aufrufen, damit der SDK-Import nicht im Event-Loop passiert
+    get_openai_client()
+    get_elevenlabs_client()
+
+
+async def warm_up():
+    # Billige Anfrage auf jede API: baut Verbindungen auf bzw. hält sie offen.
+    # Der Statuscode ist egal, es geht nur um die Verbindung.
+    get_openai_client()
+    get_elevenlabs_client()
+    for name, client, url in (("openai", openai_http, openai_base_url()),
+                              ("elevenlabs", elevenlabs_http, elevenlabs_base_url())):
+        started = time.perf_counter()
+        try:
+            await client.head(url, timeout=10)
+            logger.debug("Warmhalten %s: %.0f ms", name, (time.perf_counter() - started) * 1000)
+        except httpx.HTTPError as e:
+            logger.debug("Warmhalten %s fehlgeschlagen: %s", name, e)
+
+
+async def keep_warm(interval=WARMUP_INTERVAL):
+    while True:
+        await warm_up()
+        await asyncio.sleep(interval)
+
+
+async def close_clients():
+    for client in (openai_http, elevenlabs_http):
+        if client is not None:
+            await client.aclose()
+
+# -------------------- Latenz je Stufe --------------------
+@contextlib.contextmanager
+def stage_timer(stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+
+def record_stage(stage, seconds):
+    metrics.observe(stage, seconds)
+    logger.info("Stufe %s: %.0f ms", stage, seconds * 1000)
+
+
+class TimedFile:
+    # Antwortdatei, deren Schreibzeit (write + flush) als Stufe "file_write" gemessen wird
+    def __init__(self, path):
+        self.file = open(path, "wb")
+        self.seconds = 0.0
+
+    def write(self, data):
+        started = time.perf_counter()
+        self.file.write(data)
+        self.seconds += time.perf_counter() - started
+
+    def flush(self):
+        started = time.perf_counter()
+        self.file.flush()
+        self.seconds += time.perf_counter() - started
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.file.close()
+        metrics.observe("file_write", self.seconds)
+
+
+tts_cache = ResponseCache(os.path.join(CACHE_DIR, "tts"), TTS_CACHE_BYTES)
+chat_cache = ResponseCache(os.path.join(CACHE_DIR, "chat"), CHAT_CACHE_BYTES)
+
+# -------------------- Resilienz --------------------
+# Die SDK-eigenen Wiederholungen sind abgeschaltet (max_retries=0), damit Zeitlimits,
+# Backoff und Circuit Breaker nur an einer Stelle greifen.
+resilience = Resilience({
+    "whisper": Policy(attempt_timeout=15, deadline=30),
+    "gpt": Policy(attempt_timeout=30, deadline=60),
+    # Streaming: attempt_timeout gilt bis zum ersten Token/Chunk, danach idle_timeout je Chunk
+    "gpt_stream": Policy(attempt_timeout=15, deadline=40, idle_timeout=15),
+    "tts": Policy(attempt_timeout=10, deadline=30, idle_timeout=10, hedge=HEDGE_TTS),
+})
+
+tts_backend = tts.ElevenLabsBackend(get_elevenlabs_client, resilience, VOICE_ID, TTS_MODEL, TTS_FORMAT)
+local_tts = tts.EspeakBackend(LOCAL_TTS_VOICE)
+fragments = tts.FragmentLibrary(FRAGMENT_DIR, CHECK_IN_FRAGMENTS)
+upload_encoder = codec.UploadEncoder(UPLOAD_FORMAT, UPLOAD_BITRATE)
+stt_backend = stt.create_backend(STT_BACKEND, get_openai_client, resilience, STT_MODEL, STT_LANGUAGE,
+                                 encoder=upload_encoder)
+
+
+async def cached_stream(cache, key, produce):
+    # Liefert Chunks aus dem Cache oder reicht die Chunks von produce() durch und speichert
+    # sie erst, wenn der Strom vollständig war. Dateizugriffe laufen im Executor.
+    data = await asyncio.to_thread(cache.get, key)
+    if data is not None:
+        yield data
+        return
+    parts = []
+    async for chunk in produce():
+        parts.append(chunk)
+        yield chunk
+    await asyncio.to_thread(cache.put, key, b"".join(parts))
+
+# -------------------- Einzelne Stufen --------------------
+def chat_messages(transkription):
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": transkription}
+    ]
+
+
+async def transcribe(filename):
+    logger.info("Transkribiere (%s)...", stt_backend.name)
+    with open(filename, "rb") as audio_file:
+        wav_bytes = audio_file.read()
+    with stage_timer("whisper"):
+        transkription = await stt_backend.transcribe(wav_bytes)
+    log_transcription(transkription)
+    return transkription
+
+
+async def transcribe_segment(wav_bytes, prompt=None):
+    # Ein Segment der laufenden Aufnahme (siehe capture.ChunkedTranscriber)
+    with stage_timer("whisper_segment"):
+        return await stt_backend.transcribe(wav_bytes, prompt)
+
+
+def log_transcription(transkription):
+    logger.info("Transkription: %s", transkription)
+    study_logger.info("Transkription: %s", transkription)
+
+
+def synthesize(text, previous_text=None, voice_id=VOICE_ID, model_id=TTS_MODEL, output_format=TTS_FORMAT,
+               budget=TTS_BUDGET):
+    # Async-Iterator über PCM-Chunks. budget=None: nur ElevenLabs, ohne lokalen Ersatz
+    if (voice_id, model_id, output_format) == tts_backend.key():
+        backend = tts_backend
+        fragment = fragments.get(text)
+        if fragment is not None:
+            logger.info("Satz als fertiges Fragment: %s", text)
+            return single_chunk(fragment)
+    else:
+        backend = tts.ElevenLabsBackend(get_elevenlabs_client, resilience, voice_id, model_id, output_format)
+    # previous_text verändert die Betonung und gehört deshalb mit in den Schlüssel
+    key = cache_key("tts", text, voice_id, model_id, output_format, previous_text or "")
+    primary = lambda: cached_stream(tts_cache, key, lambda: backend.synthesize(text, previous_text))
+    # Die lokale Engine liefert nur PCM 16 kHz
+    if budget is None or output_format != TTS_FORMAT or not local_tts.available():
+        return primary()
+    return tts.with_fallback(primary, lambda: local_tts.synthesize(text), budget)
+
+
+async def single_chunk(data):
+    yield data
+
+
+async def prepare_fragments():
+    # Vorhandene Fragmente laden, fehlende einmalig in der Hauptstimme erzeugen
+    loaded = await asyncio.to_thread(fragments.load, tts_backend.key())
+    if loaded < len(fragments.texts):
+        await fragments.prepare(tts_backend.synthesize, tts_backend.key())
+
+
+def output_processor():
+    # Lautheitsangleichung, Limiter und Fades direkt auf den ankommenden TTS-Chunks
+    return dsp.StreamProcessor(target_db=OUTPUT_LOUDNESS_DB, limit_db=OUTPUT_LIMIT_DB)
+
+
+def chat_key(transkription):
+    return cache_key("chat", CHAT_MODEL, chat_messages(transkription))
+
+# -------------------- Blockierender Modus --------------------
+async def respond_blocking(transkription, output_file, on_first_audio=None):
+    logger.info("Sende an GPT-4...")
+    async def do_chat():
+        return await get_openai_client().chat.completions.create(
+            model=CHAT_MODEL,
+            messages=chat_messages(transkription)
+        )
+    key = chat_key(transkription)
+    antwort = await asyncio.to_thread(chat_cache.get_text, key)
+    if antwort is None:
+        with stage_timer("gpt"):
+            chat_resp = await resilience.call("gpt", do_chat)
+        antwort = chat_resp.choices[0].message.content
+        await asyncio.to_thread(chat_cache.put_text, key, antwort)
+    else:
+        logger.info("GPT-4-Antwort aus dem Cache.")
+    logger.info("GPT-4: %s", antwort)
+    study_logger.info("GPT-4: %s", antwort)
+
+    logger.info("Erzeuge Sprachausgabe...")
+    processor = output_processor()
+    with stage_timer("tts"), TimedFile(output_file) as f:
+        async for chunk in synthesize(antwort):
+            f.write(processor.process(chunk))
+        f.write(processor.finish())
+    if on_first_audio:
+        on_first_audio(output_file)
+    return antwort
+
+# -------------------- Streaming-Modus --------------------
+# Satzende: Satzzeichen, optional schließende Anführungszeichen/Klammern, dann Leerraum
+SENTENCE_END = re.compile(r"([.!?…]+)[\"'»«“”’)\]]*\s+")
+# Nach diesen Kürzeln (und nach Zahlen wie in "3. Mai") endet mit einem Punkt kein Satz
+ABBREVIATIONS = {
+    "bzw", "ca", "d.h", "dr", "evtl", "ggf", "inkl", "mio", "nr", "prof", "str", "u.a", "vgl", "z.b",
+    "approx", "e.g", "i.e", "jr", "mr", "mrs", "ms", "sr", "st", "vs",
+}
+
+
+def sentence_end(text):
+    # Ende des ersten vollständigen Satzes in text oder None
+    for match in SENTENCE_END.finditer(text):
+        if match.group(1) == "." and is_abbreviation(text[:match.start()]):
+            continue
+        return match.end()
+    return None
+
+
+def is_abbreviation(before):
+    words = before.rsplit(None, 1)
+    if not words:
+        return False
+    word = words[-1].lstrip("\"'»«“”‘’([").lower()
+    # Einzelbuchstaben ("z. B.", Initialen) und Ordnungszahlen
+    return word.isdigit() or (len(word) == 1 and word.isalpha()) or word in ABBREVIATIONS
+
+
+async def stream_chat(transkription):
+    async def chat_tokens():
+        stream = await get_openai_client().chat.completions.create(
+            model=CHAT_MODEL,
+            messages=chat_messages(transkription),
+            stream=True
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    key = chat_key(transkription)
+    cached = await asyncio.to_thread(chat_cache.get_text, key)
+    if cached is not None:
+        logger.info("GPT-4-Antwort aus dem Cache.")
+        yield cached
+        return
+    started = time.perf_counter()
+    parts = []
+    async for token in resilience.stream("gpt_stream", chat_tokens):
+        if not parts:
+            record_stage("gpt_first_token", time.perf_counter() - started)
+        parts.append(token)
+        yield token
+    record_stage("gpt", time.perf_counter() - started)
+    await asyncio.to_thread(chat_cache.put_text, key, "".join(parts))
+
+
+async def split_sentences(tokens):
+    buffer = ""
+    async for token in tokens:
+        buffer += token
+        while True:
+            end = sentence_end(buffer)
+            if end is None:
+                break
+            sentence = buffer[:end].strip()
+            buffer = buffer[end:]
+            if sentence:
+                yield sentence
+    if buffer.strip():
+        yield buffer.strip()
+
+
+async def respond_streaming(transkription, output_file, on_first_audio=None):
+    # GPT-Tokens werden zu Sätzen gesammelt; jeder fertige Satz geht sofort an die TTS,
+    # während GPT bereits den nächsten Satz schreibt. PCM wird fortlaufend angehängt.
+    logger.info("Sende an GPT-4 (Streaming)...")
+    sentences = asyncio.Queue()
+    started = time.perf_counter()
+
+    async def tts_worker():
+        spoken = []
+        # Ein Prozessor für die ganze Antwort: gleiche Lautheit über alle Sätze
+        processor = output_processor()
+        with TimedFile(output_file) as f:
+            while True:
+                sentence = await sentences.get()
+                if sentence is None:
+                    f.write(processor.finish())
+                    break
+                logger.info("Erzeuge Sprachausgabe für Satz %d...", len(spoken) + 1)
+                async for chunk in synthesize(sentence, previous_text=" ".join(spoken)):
+                    f.write(processor.process(chunk))
+                f.flush()
+                if not spoken:
+                    record_stage("first_audio", time.perf_counter() - started)
+                    if on_first_audio:
+                        on_first_audio(output_file)
+                spoken.append(sentence)
+
+    worker = asyncio.create_task(tts_worker())
+    parts = []
+    try:
+        async for sentence in split_sentences(stream_chat(transkription)):
+            if worker.done():
+                break  # TTS ist ausgestiegen, Fehler kommt beim await unten
+            parts.append(sentence)
+            sentences.put_nowait(sentence)
+        sentences.put_nowait(None)
+        await worker
+    finally:
+        worker.cancel()
+
+    antwort = " ".join(parts)
+    logger.info("GPT-4: %s", antwort)
+    study_logger.info("GPT-4: %s", antwort)
+    return antwort
+
+
+# -------------------- Vorab erzeugte Varianten --------------------
+async def generate_variant(transkription, index):
+    # Alternative Formulierung derselben Erinnerung, vollständig im Speicher. Eigener
+    # Cache-Schlüssel je Index, damit jede Variante anders klingt als die Hauptantwort.
+    async def do_chat():
+        return await get_openai_client().chat.completions.create(
+            model=CHAT_MODEL,
+            messages=chat_messages(transkription),
+            temperature=VARIANT_TEMPERATURE
+        )
+    key = cache_key("chat_variant", CHAT_MODEL, chat_messages(transkription), index)
+    antwort = await asyncio.to_thread(chat_cache.get_text, key)
+    if antwort is None:
+        with stage_timer("gpt_variant"):
+            antwort = (await resilience.call("gpt", do_chat)).choices[0].message.content
+        await asyncio.to_thread(chat_cache.put_text, key, antwort)
+    logger.info("Variante %d: %s", index, antwort)
+
+    processor = output_processor()
+    pcm = []
+    spoken = []
+    async for sentence in split_sentences(single_chunk(antwort)):
+        async for chunk in synthesize(sentence, previous_text=" ".join(spoken)):
+            pcm.append(processor.process(chunk))
+        spoken.append(sentence)
+    pcm.append(processor.finish())
+    return antwort, b"".join(pcm)
+
+# -------------------- Notfall-Erinnerung --------------------
+async def respond_fallback(transkription, output_file, on_first_audio=None):
+    # Ohne GPT: fertiger Check-in-Einstieg plus lokal gesprochene Aktivität, damit zum
+    # Ablauf von DELAY_SECONDS in jedem Fall eine Erinnerung bereitliegt
+    opener, pcm = fragments.any()
+    antwort = FALLBACK_REMINDER.format(transkription)
+    processor = output_processor()
+    with stage_timer("fallback_tts"), TimedFile(output_file) as f:
+        if pcm is not None:
+            f.write(processor.process(pcm))
+        try:
+            async for chunk in local_tts.synthesize(antwort):
+                f.write(processor.process(chunk))
+        except Exception as e:
+            if pcm is None:
+                raise
+            logger.warning("Lokale Sprachausgabe fehlgeschlagen, nur Einstieg: %s", e)
+            antwort = ""
+        f.write(processor.finish())
+    antwort = " ".join(part for part in (opener, antwort) if part)
+    if on_first_audio:
+        on_first_audio(output_file)
+    logger.info("Notfall-Erinnerung: %s", antwort)
+    study_logger.info("GPT-4 (Notfall): %s", antwort)
+    return antwort
@@ -0,0 +1,263 @@
+import time
+import wave
+import fcntl
+import asyncio
+import threading
+import subprocess
+import collections
+import logging
+from audio import load_pcm
+import metrics
+
+# -------------------- Wiedergabe-Dienst --------------------
+# Ein dauerhaft laufender aplay-Prozess hält das Ausgabegerät offen und bekommt rohes PCM
+# (16 kHz, mono, S16_LE) über stdin. Ein Writer-Thread speist die Warteschlange in kleinen
+# Blöcken ein, damit stop() und Vorrang-Wiedergabe nach wenigen Millisekunden greifen.
+
+SAMPLE_RATE = 16000
+BLOCK_BYTES = SAMPLE_RATE * 2 // 50       # 20 ms
+PIPE_BYTES = 4096                         # ~128 ms in der Pipe statt 64 KiB (~2 s)
+ALSA_BUFFER_US = 100000                   # 100 ms Puffer in aplay
+F_SETPIPE_SZ = 1031
+
+logger = logging.getLogger("ProbeLogger")
+
+
+# -------------------- Ausgabeziele --------------------
+class AplaySink:
+    def __init__(self, device):
+        self.device = device
+        self.process = None
+        self.reopen = False
+
+    def set_device(self, device):
+        # Nach Hotplug: der Writer-Thread startet aplay beim nächsten Block auf dem neuen Gerät
+        if device != self.device:
+            self.device = device
+            self.reopen = True
+
+    def _ensure_open(self):
+        if self.reopen:
+            self.reopen = False
+            self.close()
+        if self.process and self.process.poll() is None:
+            return
+        self.process = subprocess.Popen([
+            "/usr/bin/aplay", "-q", "-D", self.device, "-t", "raw",
+            "-f", "S16_LE", "-r", str(SAMPLE_RATE), "-c", "1",
+            f"--buffer-time={ALSA_BUFFER_US}", "-"
+        ], stdin=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        try:
+            fcntl.fcntl(self.process.stdin.fileno(), F_SETPIPE_SZ, PIPE_BYTES)
+        except OSError:
+            pass
+
+    def open(self):
+        self._ensure_open()
+
+    def write(self, block):
+        self._ensure_open()
+        try:
+            self.process.stdin.write(block)
+            self.process.stdin.flush()
+        except BrokenPipeError:
+            logger.warning("aplay beendet, starte neu")
+            metrics.count("aplay_restart")
+            self.close()
+
+    def latency(self):
+        return (PIPE_BYTES / (SAMPLE_RATE * 2)) + ALSA_BUFFER_US / 1e6
+
+    def close(self):
+        # Auch nach einem Broken Pipe: Prozess abräumen, damit kein Zombie zurückbleibt
+        if self.process:
+            try:
+                self.process.stdin.close()
+            except OSError:
+                pass
+            if self.process.poll() is None:
+                self.process.terminate()
+            self.process.wait()
+            self.process = None
+
+
+class NullSink:
+    # Verwirft das Audio, hält aber das Echtzeit-Tempo eines Geräts ein
+    def __init__(self, path=None, realtime=True):
+        self.path = path
+        self.realtime = realtime
+        self.file = None
+
+    def open(self):
+        if self.path:
+            self.file = open(self.path, "ab")
+
+    def set_device(self, device):
+        pass
+
+    def write(self, block):
+        if self.file:
+            self.file.write(block)
+            self.file.flush()
+        if self.realtime:
+            time.sleep(len(block) / (SAMPLE_RATE * 2))
+
+    def latency(self):
+        return 0.0
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
+def create_sink(spec, device):
+    # PROBE_AUDIO_SINK: "aplay" (Standard), "null" oder "file:/pfad/ausgabe.pcm"
+    if spec == "null":
+        return NullSink()
+    if spec and spec.startswith("file:"):
+        return NullSink(path=spec[len("file:"):])
+    return AplaySink(device)
+
+# -------------------- Dienst --------------------
+class PlayHandle:
+    def __init__(self, name, pcm):
+        self.name = name
+        self.pcm = pcm
+        self.done = threading.Event()
+        self.stopped = False
+        self.callbacks = []
+        self.lock = threading.Lock()
+        self.queued_at = time.perf_counter()
+
+    def add_done_callback(self, callback):
+        with self.lock:
+            if not self.done.is_set():
+                self.callbacks.append(callback)
+                return
+        callback()
+
+    def finish(self, stopped=False):
+        with self.lock:
+            if self.done.is_set():
+                return
+            self.stopped = stopped
+            self.done.set()
+            callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def wait(self, timeout=None):
+        return self.done.wait(timeout)
+
+
+class PlaybackService:
+    def __init__(self, sink):
+        self.sink = sink
+        self.cues = {}
+        self.queue = collections.deque()
+        self.current = None
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+
+    def preload(self, paths):
+        for path in paths:
+            try:
+                self.cues[path] = load_pcm(path)
+            except (OSError, ValueError, wave.Error) as e:
+                logger.warning("Konnte %s nicht vorladen: %s", path, e)
+
+    def start(self):
+        self.sink.open()
+        self.running = True
+        self.thread = threading.Thread(target=self._writer, name="playback", daemon=True)
+        self.thread.start()
+
+    def play(self, source, preempt=False):
+        # source: Dateipfad (vorgeladen oder von Platte) oder rohes PCM als bytes
+        if isinstance(source, (bytes, bytearray)):
+            handle = PlayHandle("<pcm>", bytes(source))
+        else:
+            pcm = self.cues.get(source)
+            handle = PlayHandle(source, pcm if pcm is not None else load_pcm(source))
+        with self.condition:
+            if preempt:
+                self._stop_locked()
+            self.queue.append(handle)
+            self.condition.notify()
+        return handle
+
+    def stop(self, handle=None):
+        # Ohne handle: alles anhalten und die Warteschlange leeren
+        with self.condition:
+            if handle is None:
+                self._stop_locked()
+            elif handle is self.current:
+                self.current.stopped = True
+            elif handle in self.queue:
+                self.queue.remove(handle)
+                handle.finish(stopped=True)
+
+    def _stop_locked(self):
+        while self.queue:
+            self.queue.popleft().finish(stopped=True)
+        if self.current:
+            self.current.stopped = True
+
+    def _writer(self):
+        while self.running:
+            with self.condition:
+                while self.running and not self.queue:
+                    self.condition.wait()
+                if not self.running:
+                    break
+                self.current = handle = self.queue.popleft()
+            try:
+                self._play(handle)
+            except Exception:
+                # z. B. aplay lässt sich nach einem Gerätewechsel nicht starten: diese Wiedergabe
+                # gilt als abgebrochen, der Thread bleibt für die nächsten am Leben
+                logger.exception("Wiedergabe von %s fehlgeschlagen", handle.name)
+                metrics.count("playback_failed")
+                with self.condition:
+                    self.current = None
+                handle.finish(stopped=True)
+                time.sleep(0.5)
+
+    def _play(self, handle):
+        logger.info("Spiele %s ab", handle.name)
+        started = time.perf_counter()
+        for offset in range(0, len(handle.pcm), BLOCK_BYTES):
+            if handle.stopped or not self.running:
+                break
+            self.sink.write(handle.pcm[offset:offset + BLOCK_BYTES])
+            if not offset:
+                # Von play() bis der erste Block im Ausgabegerät liegt (Warteschlange + aplay)
+                metrics.observe("playback_start", time.perf_counter() - handle.queued_at)
+        metrics.observe("playback", time.perf_counter() - started)
+        stopped = handle.stopped
+        with self.condition:
+            self.current = None
+        if not stopped:
+            # Der Rest liegt noch in Pipe und ALSA-Puffer
+            time.sleep(self.sink.latency())
+        handle.finish(stopped=stopped)
+
+    def close(self):
+        with self.condition:
+            self.running = False
+            self._stop_locked()
+            self.condition.notify()
+        if self.thread:
+            self.thread.join(timeout=2)
+        self.sink.close()
+
+
+async def wait_played(handle):
+    # Wartet im Event-Loop auf das Ende einer Wiedergabe, ohne einen Executor-Thread zu belegen
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    handle.add_done_callback(lambda: loop.call_soon_threadsafe(
+        lambda: future.done() or future.set_result(handle.stopped)))
+    return await future
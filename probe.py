@@ -1,354 +1,584 @@
 import os
-import re
+import glob
 import subprocess
-import signal
 import time
-import threading
-import RPi.GPIO as GPIO
-from gpiozero import Button
-from signal import pause
-import openai
-from dotenv import load_dotenv
-from elevenlabs.client import ElevenLabs
+import asyncio
+import importlib
 import logging
 from logging.handlers import RotatingFileHandler
-from sdnotify import SystemdNotifier
+import capture
+import sensor
+import box_state
+import runtime
+import playback
+import audio
+import vad
+import reminders
+import session
+import events
+import metrics
+import devices
 
 # -------------------- Konfiguration --------------------
-load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
-elevenlabs = ElevenLabs(api_key=os.getenv("ELEVENLABS_API_KEY"))
-
 TRIG = 4
 ECHO = 17
 BUTTON_GPIO = 22
 DISTANCE_THRESHOLD = 10
+SENSOR_BACKEND = os.getenv("PROBE_SENSOR_BACKEND", "gpio")  # "gpio" oder "pigpio"
+SENSOR_BURST = 5           # Pings pro Messung (Median + Kalman-Filter)
 DELAY_SECONDS = 10 * 60  # Zeit bis Erinnerung
 CANCEL_SECONDS = 180       # Unterbrechung erlaubt
+STABILITY_SECONDS = 1      # Schwelle für stabile Änderung (Ausreißer filtert schon der Sampler)
+SENSOR_INTERVAL = 1        # Sekunden zwischen zwei Messungen
 RECORD_SECONDS = 20
-FILENAME = "aufnahme.wav"
-AUDIO_OUTPUT = "response.wav"
+STOP_CUE_TIMEOUT = 5       # Sekunden, die close() höchstens auf stop.wav wartet
+FILENAME = "aufnahme.wav"   # Rohaufnahme; angenommene Aufnahmen landen je Vorhaben in SESSION_DIR
+SESSION_DIR = os.getenv("PROBE_SESSION_DIR", "sessions")
+MAX_PENDING_REMINDERS = 3  # offene Vorhaben je Sitzung, das älteste fällt heraus
+REMINDER_SCHEDULE = [DELAY_SECONDS, 5 * 60, 3 * 60]  # Abstände der 1., 2., 3. ... Erinnerung
+RECORDING_DEVICE = "USB PnP Sound Device"      # Kartenname oder -ID aus /proc/asound
+RECORDING_FALLBACK = "plughw:0,0"
+PLAYBACK_DEVICE = "sndrpihifiberry"
+PLAYBACK_FALLBACK = "plughw:sndrpihifiberry"
+AUDIO_SINK = os.getenv("PROBE_AUDIO_SINK", "aplay")  # "aplay", "null" oder "file:/pfad"
+CUE_FILES = ["start.wav", "stop.wav", "pickup.wav"] + sorted(glob.glob("sounds/*.wav"))
+STREAMING_PIPELINE = True  # GPT-Antwort satzweise an TTS streamen
+STREAMING_CAPTURE = True   # Aufnahme schon während des Drückens transkribieren
+PREARMED_CAPTURE = True    # Mikrofon dauerhaft offen, Aufnahme beginnt mit dem Vorlauf aus dem Ringpuffer
+PREROLL_SECONDS = 0.5      # so viel Audio vor dem Tastendruck kommt mit in die Aufnahme
+VAD_SILENCE_SECONDS = 2.5  # Aufnahme endet nach so viel Stille im Anschluss an Sprache
+REMINDER_VARIANTS = 2      # Alternativen, die während DELAY_SECONDS vorab erzeugt werden
+REMINDER_WAIT_SECONDS = 60 # so lange wartet eine fällige Erinnerung auf die erste fertige Variante
+STT_TIMEOUT = 30           # Sekunden für Whisper
+RESPONSE_TIMEOUT = 90      # Sekunden für GPT + Sprachausgabe
+LOG_DIR = os.getenv("PROBE_LOG_DIR", "/var/log/probe")
+EVENT_LOG = os.getenv("PROBE_EVENT_LOG", os.path.join(LOG_DIR, "events.jsonl"))
+METRICS_ADDRESS = os.getenv("PROBE_METRICS", "127.0.0.1:9101")  # "" = aus, "unix:/pfad" = Unix-Socket
+METRICS_SUMMARY_SECONDS = 15 * 60   # so oft stehen p50/p95 je Stufe im probe.log
 
 # -------------------- Logging --------------------
 logger = logging.getLogger("ProbeLogger")
-logger.setLevel(logging.DEBUG)
-
-# Datei-Log
-file_handler = RotatingFileHandler("/var/log/probe/probe.log", maxBytes=1000000, backupCount=3)
-logger.addHandler(file_handler)
-
-
-# Zusätzlicher Logger für Study-Einträge
 study_logger = logging.getLogger("StudyLogger")
-study_logger.setLevel(logging.INFO)
-
-study_handler = RotatingFileHandler("/var/log/probe/study.log", maxBytes=1000000, backupCount=10)
-formatter = logging.Formatter('%(asctime)s - %(message)s')
-
-study_handler.setFormatter(formatter)
-study_logger.addHandler(study_handler)
-
-# → Neu: stdout-Log
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.DEBUG)
-logger.addHandler(console_handler)
-
-# -------------------- Setup --------------------
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(TRIG, GPIO.OUT)
-GPIO.setup(ECHO, GPIO.IN)
-button = Button(BUTTON_GPIO, pull_up=True, bounce_time=0.1)
-notifier = SystemdNotifier()
-
-# -------------------- Globale Zustände --------------------
-recording_process = None
-is_recording = False
-recording_start_time = None
-latest_audio_file = None
-latest_text_prompt = None
-reflection_prompt_played = False
-last_activity_time = time.time()
-processing_lock = threading.Lock()
-
-# -------------------- Helferfunktion für sichere Threads --------------------
-def safe_thread(target, *args):
-    def wrapper():
-        try:
-            target(*args)
-        except Exception as e:
-            logger.exception(f"Thread {target.__name__} crashed")
-    t = threading.Thread(target=wrapper)
-    t.daemon = True
-    t.start()
-
-# -------------------- Retry-Helferfunktion --------------------
-def retry(func, max_retries=2, delay=2, exceptions=(Exception,)):
-    for attempt in range(max_retries):
-        try:
-            return func()
-        except exceptions as e:
-            if attempt < max_retries - 1:
-                logger.warning(f"Fehler bei {func.__name__} (Versuch {attempt+1}): {e}")
-                time.sleep(delay)
-            else:
-                logger.error(f"Fehlgeschlagen nach {max_retries} Versuchen: {e}")
-                raise
-
-# -------------------- Funktionen --------------------
-
-def find_recording_device(name_hint="USB PnP Sound Device"):
-    try:
-        output = subprocess.check_output(["/usr/bin/arecord", "-l"], text=True)
-        # Suche Zeile mit passendem Gerätenamen
-        for line in output.splitlines():
-            if name_hint in line:
-                match = re.search(r"card (\d+):.*device (\d+):", line)
-                if match:
-                    card_index = match.group(1)
-                    device_index = match.group(2)
-                    return f"plughw:{card_index},{device_index}"
-    except Exception as e:
-        logger.warning("Konnte Aufnahmegerät nicht finden: %s", e)
-    return "plughw:0,0"  # fallback
-
-def measure_distance():
-    global last_activity_time
-    try:
-        GPIO.output(TRIG, False)
-        time.sleep(0.02)
-        GPIO.output(TRIG, True)
-        time.sleep(0.00001)
-        GPIO.output(TRIG, False)
-
-        start = time.time()
-        timeout = start + 0.05
-        while GPIO.input(ECHO) == 0:
-            if time.time() > timeout:
-                raise TimeoutError("Timeout beim Warten auf Echo (start)")
-        start = time.time()
-
-        timeout = start + 0.05
-        while GPIO.input(ECHO) == 1:
-            if time.time() > timeout:
-                raise TimeoutError("Timeout beim Warten auf Echo (stop)")
-        stop = time.time()
-
-        elapsed = stop - start
-        last_activity_time = time.time()
-        return (elapsed * 34300) / 2
-
-    except Exception as e:
-        logger.warning("Fehler bei der Distanzmessung: %s", e)
-        return 0
-
-def start_recording():
-    global recording_process, is_recording, recording_start_time, last_activity_time
-    if is_recording:
-        return
-    logger.info("Start recording...")
-    recording_start_time = time.time()
-    last_activity_time = recording_start_time
-    try:
-        recording_process = subprocess.Popen([
-            "/usr/bin/arecord", "-D", find_recording_device(),
-            "-f", "cd", "-t", "wav",
-            "-r", "16000", "-d", str(RECORD_SECONDS), FILENAME
-        ])
-        is_recording = True
-        safe_thread(wait_and_stop_recording)
-    except Exception as e:
-        logger.exception("Fehler beim Starten der Aufnahme")
-        is_recording = False
-
-def wait_and_stop_recording():
-    global recording_process
-    recording_process.wait()
-    if is_recording:
-        logger.info("Recording automatically stopped after 20 seconds!")
-        stop_recording()
-
-
-def stop_recording():
-    global recording_process, is_recording, latest_audio_file, last_activity_time
-    if not is_recording or not recording_process:
-        return  # Avoid stopping if nothing is recording
-
-    logger.info("Stop recording.")
-    try:
-        recording_process.terminate()
-        recording_process.wait()
-    except Exception as e:
-        logger.warning("Problem beim Beenden des Aufnahmeprozesses: %s", e)
 
-    duration = time.time() - recording_start_time
-    is_recording = False
-    last_activity_time = time.time()
 
-    if duration < 1:
-        logger.info("Aufnahme zu kurz. Verwerfe Datei.")
+def setup_logging(console_level=logging.DEBUG):
+    logger.setLevel(logging.DEBUG)
+
+    # Datei-Log
+    file_handler = RotatingFileHandler(os.path.join(LOG_DIR, "probe.log"), maxBytes=1000000, backupCount=3)
+    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))  # Zeitstempel für analyze_logs.py
+
+    # Zusätzlicher Logger für Study-Einträge
+    study_logger.setLevel(logging.INFO)
+
+    study_handler = RotatingFileHandler(os.path.join(LOG_DIR, "study.log"), maxBytes=1000000, backupCount=10)
+    formatter = logging.Formatter('%(asctime)s - %(message)s')
+
+    study_handler.setFormatter(formatter)
+
+    # → Neu: stdout-Log
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(console_level)
+
+    # Geschrieben wird in Hintergrund-Threads; die Event-Schleife legt nur in Queues ab
+    events.queued(logger, file_handler, console_handler)
+    events.queued(study_logger, study_handler)
+    events.queued(events.event_logger, events.file_handler(EVENT_LOG))
+
+# -------------------- Hardware --------------------
+# Die Importe stehen in den Funktionen: "import probe" soll nichts anfassen und schnell sein.
+
+def create_notifier():
+    from sdnotify import SystemdNotifier
+    return SystemdNotifier()
+
+
+def create_button():
+    from gpiozero import Button
+    return Button(BUTTON_GPIO, pull_up=True, bounce_time=0.1)
+
+
+# -------------------- Anwendung --------------------
+class Probe:
+    # Hält Hardware, Zustand und Tasks. Der Start läuft in start(): Sensor, Wiedergabe, Taster
+    # und die Pipeline (OpenAI/ElevenLabs) werden parallel im Thread-Pool eingerichtet, READY
+    # geht an systemd, sobald die erste Messung da ist. Alles andere kommt danach dazu.
+    # Für bench_e2e.py lassen sich Sensor, Taster, Notifier und Aufnahme austauschen.
+    def __init__(self, sensor_backend=None, button=None, notifier=None, recorder_factory=None,
+                 capture_factory=None, recording_device=None, filename=FILENAME, reminder_schedule=REMINDER_SCHEDULE,
+                 cancel_seconds=CANCEL_SECONDS):
+        self.runtime = runtime.Runtime()
+        self.sensor_backend = sensor_backend
+        self.button = button
+        self.notifier = notifier
+        self.recorder_factory = recorder_factory or capture.StreamingRecorder
+        self.capture_factory = capture_factory or capture.open_arecord
+        self.capture = None
+        self.recording_device = recording_device
+        self.devices = devices.DeviceRegistry()
+        self.devices.subscribe(self.on_devices_changed)
+        self.filename = filename
+        self.ranger = None
+        self.sampler = None
+        self.player = None
+        self.pipeline = None
+        self.pipeline_task = None
+        self.player_task = None
+        self.sensing = asyncio.Event()          # erste Messung da
+        self.startup_times = {}                 # Schritt → Sekunden seit Beginn von start()
+
+        # Globale Zustände
+        self.recording_process = None
+        self.recorder = None
+        self.transcriber = None
+        self.is_recording = False
+        self.recording_start_time = None
+        self.sessions = session.SessionStore(SESSION_DIR, MAX_PENDING_REMINDERS)
+        self.last_activity_time = time.time()
+
+        self.box_machine = box_state.BoxStateMachine(ProbeBoxListener(self), reminder_schedule, cancel_seconds,
+                                                     stability_seconds=STABILITY_SECONDS)
+        self.box_scheduler = box_state.BoxScheduler(self.box_machine)
+
+    # ---- Start ----
+    def init_sensor(self):
+        backend = self.sensor_backend or sensor.create_backend(SENSOR_BACKEND, TRIG, ECHO)
+        self.ranger = sensor.UltrasonicRanger(backend)
+        self.sampler = sensor.BurstSampler(self.ranger, burst=SENSOR_BURST)
+
+    def init_player(self):
+        device = self.devices.find(PLAYBACK_DEVICE, "playback", PLAYBACK_FALLBACK)
+        player = playback.PlaybackService(playback.create_sink(AUDIO_SINK, device))
+        player.preload(CUE_FILES)
+        player.start()
+        self.player = player
+
+    def init_capture(self):
+        self.capture = capture.CaptureService(self.find_recording_device, PREROLL_SECONDS,
+                                              process_factory=self.capture_factory)
+        self.capture.start()
+
+    def init_button(self):
+        if self.button is None:
+            self.button = create_button()
+        # gpiozero ruft aus eigenen Threads auf; die Arbeit wird an den Event-Loop übergeben
+        self.button.when_pressed = lambda: self.runtime.call_threadsafe(self.start_recording)
+        self.button.when_released = lambda: self.runtime.spawn_threadsafe(self.stop_recording, name="stop_recording")
+
+    def init_pipeline(self):
+        # Import und Clients kosten auf dem Pi mehrere Sekunden, daher im Thread-Pool
+        module = importlib.import_module("pipeline")
+        module.create_clients()
+        self.pipeline = module
+
+    async def load_pipeline(self):
+        if self.pipeline is None:
+            if self.pipeline_task is None:
+                self.pipeline_task = asyncio.ensure_future(self.runtime.run_blocking(self.init_pipeline))
+            await asyncio.shield(self.pipeline_task)
+        return self.pipeline
+
+    async def start(self):
+        started = time.perf_counter()
+        self.runtime.attach(asyncio.get_running_loop())
+        if self.notifier is None:
+            self.notifier = create_notifier()
+        self.devices.refresh()
+
+        async def step(name, func, run=self.runtime.run_blocking):
+            await run(func)
+            self.startup_times[name] = time.perf_counter() - started
+
+        sensor_ready = asyncio.ensure_future(step("sensor", self.init_sensor, self.runtime.run_sensor))
+        self.player_task = asyncio.ensure_future(step("player", self.init_player))
+        button_ready = asyncio.ensure_future(step("button", self.init_button))
+        if PREARMED_CAPTURE:
+            # Kein Warten nötig: bis das Mikrofon läuft, nimmt start_recording den Einzelprozess
+            self.runtime.spawn(step("capture", self.init_capture), name="capture_init")
+        self.pipeline_task = asyncio.ensure_future(step("pipeline", self.init_pipeline))
+
+        await sensor_ready
+        self.runtime.spawn(self.sensor_loop(), name="sensor")
+        await self.sensing.wait()
+        self.notifier.notify("READY=1")
+        self.notifier.notify("WATCHDOG=1")
+        self.startup_times["ready"] = time.perf_counter() - started
+        metrics.observe("startup_ready", self.startup_times["ready"])
+
+        await self.player_task
+        self.runtime.spawn(self.play_audio("start.wav"), name="playback")
+        self.runtime.spawn(metrics.summary_loop(METRICS_SUMMARY_SECONDS), name="metrics_summary")
+        if METRICS_ADDRESS:
+            self.runtime.spawn(metrics.serve(METRICS_ADDRESS), name="metrics")
+        self.runtime.spawn(self.devices.watch(), name="devices")
+        await button_ready
+
+        pipeline = await self.load_pipeline()
+        self.runtime.spawn(pipeline.keep_warm(), name="keep_warm")
+        self.runtime.spawn(pipeline.prepare_fragments(), name="fragments")
+        # Lokales STT-Modell einmal laden und resident halten (no-op für "cloud")
+        self.runtime.spawn(self.runtime.run_blocking(pipeline.stt_backend.load), name="stt_load")
+        self.startup_times["started"] = time.perf_counter() - started
+        logger.info("Start: %s", ", ".join(f"{name} {seconds * 1000:.0f} ms"
+                                           for name, seconds in self.startup_times.items()))
+
+    async def run(self):
+        # Der Scheduler läuft ab sofort; Messwerte vor dem Start landen in seiner Warteschlange
+        scheduler = asyncio.ensure_future(self.box_scheduler.run())
         try:
-            os.remove(FILENAME)
-        except OSError:
+            await self.start()
+            await scheduler
+        finally:
+            scheduler.cancel()
+            await self.runtime.shutdown()
+
+    def close(self):
+        if self.capture:
+            self.capture.close()
+        if self.player:
+            self.player.play("stop.wav", preempt=True).wait(timeout=STOP_CUE_TIMEOUT)
+            self.player.close()
+        if self.ranger:
+            self.ranger.cleanup()
+        try:
+            import RPi.GPIO as GPIO
+            GPIO.cleanup()
+        except ImportError:
             pass
-        return
-
-    logger.info(f"Gespeichert: {FILENAME} ({duration:.2f}s)")
-    play_audio("sounds/feedback_fast.wav")
-    safe_thread(process_recording, FILENAME)
+        if self.recording_process:
+            self.recording_process.terminate()
+            self.recording_process.wait()
+
+    def on_devices_changed(self, found):
+        # Hotplug: Wiedergabe zieht auf das (neue) Gerät um, die nächste Aufnahme fragt ohnehin neu
+        if self.player:
+            self.player.sink.set_device(self.devices.find(PLAYBACK_DEVICE, "playback", PLAYBACK_FALLBACK))
+        if self.capture:
+            self.capture.refresh()
+
+    # ---- Sensor ----
+    def measure_distance_filtered(self):
+        # Gefilterte Entfernung aus einer Ping-Salve; None, solange es noch keine gültige Messung gab
+        try:
+            with metrics.timer("sensor"):
+                distance = self.sampler.sample()
+            self.last_activity_time = time.time()
+            return distance
+        except Exception as e:
+            logger.warning("Fehler bei der Distanzmessung: %s", e)
+            metrics.count("sensor_error")
+            return self.sampler.estimate
+
+    async def sensor_loop(self):
+        # Liefert nur Messwerte an den Scheduler; Timer und Zustandslogik laufen dort
+        while True:
+            try:
+                self.notifier.notify("WATCHDOG=1")
+                dist = await self.runtime.run_sensor(self.measure_distance_filtered)
+                self.sensing.set()
+                if dist is None:
+                    # Noch keine gültige Messung: Zustand beibehalten statt auf "in" zu kippen
+                    logger.info("Distance: keine gültige Messung")
+                else:
+                    logger.info(f"Distance: {dist:.1f} cm")
+                    self.box_scheduler.post_reading("out" if dist > DISTANCE_THRESHOLD else "in")
+                await asyncio.sleep(SENSOR_INTERVAL)
+
+            except Exception:
+                logger.exception("Fehler in sensor_loop")
+                await asyncio.sleep(2)
+
+    # ---- Aufnahme ----
+    def find_recording_device(self):
+        # Aus der zwischengespeicherten Geräteliste, ohne "arecord -l" auf dem Weg zur Aufnahme
+        return self.recording_device or self.devices.find(RECORDING_DEVICE, "capture", RECORDING_FALLBACK)
+
+    def transcribe_segment_blocking(self, wav_bytes, prompt):
+        # Wird vom Upload-Thread des ChunkedTranscriber aufgerufen, der Request läuft im Event-Loop
+        return self.runtime.run_coroutine(self.transcribe_segment(wav_bytes, prompt), timeout=STT_TIMEOUT)
+
+    async def transcribe_segment(self, wav_bytes, prompt):
+        pipeline = await self.load_pipeline()
+        return await pipeline.transcribe_segment(wav_bytes, prompt)
+
+    async def warm_up(self):
+        pipeline = await self.load_pipeline()
+        await pipeline.warm_up()
+
+    def start_recording(self):
+        if self.is_recording:
+            return
+        logger.info("Start recording...")
+        self.recording_start_time = time.time()
+        self.last_activity_time = self.recording_start_time
+        try:
+            if STREAMING_CAPTURE:
+                active_transcriber = capture.ChunkedTranscriber(self.transcribe_segment_blocking)
+                # Die Aufnahme wird über ihren Transcriber erkannt; der existiert schon vor dem Start
+                silence = vad.SilenceDetector(VAD_SILENCE_SECONDS, lambda: self.runtime.spawn_threadsafe(
+                    self.stop_after_silence, active_transcriber, name="recording_silence"))
 
+                def on_chunk(chunk):
+                    active_transcriber.feed(chunk)
+                    silence.feed(chunk)
 
-def process_recording(filename):
-    global latest_audio_file, latest_text_prompt
-    with processing_lock:
+                self.transcriber = active_transcriber
+            else:
+                on_chunk = None
+            with metrics.timer("recording_start"):
+                if self.capture and self.capture.ready():
+                    # Mikrofon ist schon offen: Vorlauf aus dem Ringpuffer, kein Prozessstart
+                    self.recorder = self.capture.recorder(RECORD_SECONDS, on_chunk=on_chunk)
+                    self.recording_process = self.recorder.start()
+                elif STREAMING_CAPTURE:
+                    self.recorder = self.recorder_factory(self.find_recording_device(), RECORD_SECONDS,
+                                                          on_chunk=on_chunk)
+                    self.recording_process = self.recorder.start()
+                else:
+                    self.recording_process = subprocess.Popen([
+                        "/usr/bin/arecord", "-D", self.find_recording_device(),
+                        "-f", "cd", "-t", "wav",
+                        "-r", "16000", "-d", str(RECORD_SECONDS), self.filename
+                    ])
+            self.is_recording = True
+            self.runtime.spawn(self.wait_and_stop_recording(self.recording_process), name="recording_watch")
+            # Verbindungen aufwärmen, solange noch gesprochen wird
+            if not self.runtime.running("warmup"):
+                self.runtime.spawn(self.warm_up(), name="warmup", timeout=10)
+        except Exception:
+            logger.exception("Fehler beim Starten der Aufnahme")
+            self.is_recording = False
+            if self.transcriber:
+                self.transcriber.cancel()
+                self.transcriber = None
+
+    async def wait_and_stop_recording(self, process):
+        while process.poll() is None:
+            await asyncio.sleep(0.1)
+        if self.is_recording and process is self.recording_process:
+            logger.info("Recording automatically stopped after 20 seconds!")
+            await self.stop_recording()
+
+    async def stop_after_silence(self, transcriber):
+        if self.is_recording and transcriber is self.transcriber:
+            logger.info("Recording automatically stopped after %.1fs of silence.", VAD_SILENCE_SECONDS)
+            await self.stop_recording()
+
+    async def stop_recording(self):
+        if not self.is_recording or not self.recording_process:
+            return  # Avoid stopping if nothing is recording
+
+        logger.info("Stop recording.")
+        self.is_recording = False
+        process, active_recorder, active_transcriber = self.recording_process, self.recorder, self.transcriber
+        self.recorder = None
+        self.transcriber = None
         try:
-            logger.info("Transkribiere über Whisper...")
-            def do_transcribe():
-                with open(filename, "rb") as audio_file:
-                    return openai.audio.transcriptions.create(
-                        model="whisper-1", file=audio_file
-                    )
-            whisper_resp = retry(do_transcribe)
-            transkription = whisper_resp.text
-            logger.info("Transkription: %s", transkription)
-            study_logger.info("Transkription: %s", transkription)
-
-            logger.info("Sende an GPT-4...")
-            def do_chat():
-                return openai.chat.completions.create(
-                    model="gpt-4",
-                    messages=[
-                        {"role": "system", "content": "You are a supportive and encouraging assistant helping someone follow through on an offline activity they intended to do after using their phone. Your response should always be two sentences: Start with a warm, friendly check-in that gently reminds the user their phone is still out of the box (this doesn't mean they're using it). Example: Hey, I noticed you haven’t put your phone back yet. Hi there, just checking in—remember what you told me before? Restate their planned activity vividly, using sensory or emotional language. Highlight a possible reward or positive feeling, and end with an open-ended, reflective question (not a command). Examples: Can you picture how nice it will feel to have the dishes done—what would you have to do first to start? Imagine the fresh air on your face during your walk—where would you like to go? Keep the tone friendly, non-judgmental, gently encouraging, and reflective. Avoid direct instructions or pressure. The planned activity is:"},
-                        {"role": "user", "content": transkription}
-                    ]
-                )
-            chat_resp = retry(do_chat)
-            antwort = chat_resp.choices[0].message.content
-            latest_text_prompt = antwort
-            logger.info("GPT-4: %s", antwort)
-            study_logger.info("GPT-4: %s", antwort)
-
-            logger.info("Erzeuge Sprachausgabe...")
-            def do_tts():
-                return elevenlabs.text_to_speech.convert(
-                    text=antwort,
-                    voice_id="FTNCalFNG5bRnkkaP5Ug",
-                    model_id="eleven_multilingual_v2",
-                    output_format="pcm_16000"
-                )
-            audio = retry(do_tts)
-
-            with open(AUDIO_OUTPUT, "wb") as f:
-                for chunk in audio:
-                    f.write(chunk)
-
-            latest_audio_file = AUDIO_OUTPUT
-            logger.info("Audio gespeichert: %s", AUDIO_OUTPUT)
+            process.terminate()
+            await self.runtime.run_blocking(process.wait)
         except Exception as e:
+            logger.warning("Problem beim Beenden des Aufnahmeprozesses: %s", e)
+
+        duration = time.time() - self.recording_start_time
+        self.last_activity_time = time.time()
+
+        trimmed = None
+        if duration >= 1:
+            try:
+                pcm = await self.runtime.run_blocking(self.read_recording, active_recorder)
+                try:
+                    with metrics.timer("vad"):
+                        trimmed = await self.runtime.run_blocking(vad.trim, pcm)
+                except Exception as e:
+                    logger.warning("VAD fehlgeschlagen, nutze ungekürzte Aufnahme: %s", e)
+                    trimmed = pcm
+            except Exception:
+                logger.exception("Aufnahme konnte nicht gelesen werden")
+        elif active_recorder:
+            await self.runtime.run_blocking(active_recorder.finish)
+
+        if not trimmed:
+            logger.info("Aufnahme zu kurz oder ohne Sprache. Verwerfe Datei.")
+            events.record("recording", duration=duration, speech=0.0)
+            metrics.count("recording_discarded")
+            if active_transcriber:
+                active_transcriber.cancel()
+            if not active_recorder:
+                # Nur arecord je Knopfdruck schreibt die Datei; sonst ist es die versionierte Beispielaufnahme
+                try:
+                    os.remove(self.filename)
+                except OSError:
+                    pass
+            return
+
+        # Jede Aufnahme wird ein eigenes Vorhaben; laufende Verarbeitungen früherer bleiben erhalten
+        intention, dropped = self.sessions.new_intention()
+        for old in dropped:
+            for name in old.task_names():
+                self.runtime.cancel(name)
+        with metrics.timer("recording_write"):
+            await self.runtime.run_blocking(audio.write_wav, intention.recording_file, trimmed)
+        metrics.count("recording")
+        speech = len(trimmed) / (capture.SAMPLE_RATE * capture.SAMPLE_WIDTH)
+        logger.info(f"Gespeichert: {intention.recording_file} ({duration:.2f}s, davon {speech:.2f}s mit Sprache)")
+        events.record("recording", intention=intention.id, duration=duration, speech=speech)
+        released_at = time.perf_counter()
+        self.runtime.spawn(self.play_audio("sounds/feedback_fast.wav", preempt=True), name="feedback")
+        self.runtime.spawn(self.process_recording(intention, active_transcriber, released_at),
+                           name=f"processing-{intention.id}")
+        # Der Timer startet sofort; die Erinnerung entsteht währenddessen innerhalb von DELAY_SECONDS
+        self.box_scheduler.post_audio_ready()
+
+    def read_recording(self, active_recorder):
+        if active_recorder:
+            return active_recorder.finish()
+        return audio.load_pcm(self.filename)
+
+    # ---- Verarbeitung ----
+    async def process_recording(self, intention, active_transcriber=None, released_at=None):
+        transkription = None
+        try:
+            pipeline = await self.load_pipeline()
+            if active_transcriber:
+                # Segmente wurden schon während der Aufnahme hochgeladen
+                try:
+                    await self.runtime.run_blocking(active_transcriber.close)
+                    transkription = await active_transcriber.wait()
+                    pipeline.log_transcription(transkription)
+                except Exception as e:
+                    logger.warning("Streaming-Transkription fehlgeschlagen, lade ganze Datei hoch: %s", e)
+        finally:
+            if active_transcriber:
+                # Auch bei Abbruch (Vorhaben verdrängt, Shutdown) den Upload-Thread beenden
+                active_transcriber.cancel()
+        audio_ready_called = False
+        # Antwort erst unter .part schreiben und am Ende atomar ersetzen
+        partial_file = intention.response_file + ".part"
+
+        def audio_ready(output_file):
+            nonlocal audio_ready_called
+            audio_ready_called = True
+            logger.info("Audio bereit: %s", output_file)
+            if released_at is not None:
+                pipeline.record_stage("release_to_audio", time.perf_counter() - released_at)
+
+        kind = "primary"
+        try:
+            if transkription is None:
+                transkription = await asyncio.wait_for(pipeline.transcribe(intention.recording_file), STT_TIMEOUT)
+            intention.transkription = intention.variants.transkription = transkription
+            events.record("transcription", intention=intention.id, text=transkription)
+            respond = pipeline.respond_streaming if STREAMING_PIPELINE else pipeline.respond_blocking
+            intention.text = await asyncio.wait_for(
+                respond(transkription, partial_file, on_first_audio=audio_ready), RESPONSE_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            logger.error("Verarbeitung abgebrochen: Zeitlimit überschritten")
+            kind = "fallback"
+        except Exception:
             logger.exception("Fehler bei der Verarbeitung")
-
-def play_audio(file):
-    logger.info("Reminder wird abgespielt.")
-    os.system(f"/usr/bin/aplay -D 'plughw:sndrpihifiberry' -f S16_LE -r 16000 -c 1 {file}")
-
-def distance_loop():
-    global last_activity_time, reflection_prompt_played
-    reminder_timer_started = False
-    reminder_start_time = None
-    inbox_start_time = None
-    outbox_start_time = None
-        
-    # Neue Variablen für Stabilitätslogik
-    box_state = "out"               # Aktueller stabiler Zustand: "in" oder "out"
-    pending_state = "out"           # Neuer potenzieller Zustand
-    pending_state_start = time.time()     # Zeit, seit der dieser potenzielle Zustand anhält
-    STABILITY_SECONDS = 2          # Schwelle für stabile Änderung
-
-    while True:
+            kind = "fallback"
+        if kind == "fallback":
+            metrics.count("processing_failed")
+        if kind == "fallback" and transkription and not audio_ready_called:
+            # GPT oder TTS sind ausgefallen: Erinnerung aus Fragment + lokaler Sprachausgabe
+            try:
+                intention.text = await pipeline.respond_fallback(transkription, partial_file,
+                                                                 on_first_audio=audio_ready)
+            except Exception:
+                logger.exception("Auch die Notfall-Erinnerung ist fehlgeschlagen")
+        if not transkription:
+            return
+        if intention.text:
+            events.record("response", intention=intention.id, kind=kind, text=intention.text)
+        if audio_ready_called:
+            os.replace(partial_file, intention.response_file)
+            logger.info("Audio gespeichert: %s", intention.response_file)
+            # Abgebrochene Antworten zählen nur als Notlösung; fertige Varianten gehen vor
+            with metrics.timer("response_load"):
+                pcm = await self.runtime.run_blocking(audio.load_pcm, intention.response_file)
+            intention.variants.add(kind, intention.text, pcm)
+        # Während DELAY_SECONDS Alternativen im Hintergrund vorbereiten
+        self.runtime.spawn(reminders.pregenerate(intention.variants, pipeline.generate_variant, REMINDER_VARIANTS),
+                           name=f"variants-{intention.id}")
+
+    # ---- Wiedergabe ----
+    async def play_reminder(self, level):
+        intention, reminder = self.sessions.pick()
+        if reminder is None:
+            newest = self.sessions.newest()
+            if newest is not None and await newest.variants.wait_best(REMINDER_WAIT_SECONDS):
+                intention, reminder = self.sessions.pick()
+        if reminder is None:
+            logger.warning("Keine Erinnerung bereit.")
+            metrics.count("reminder_missing")
+            return
+        intention.played.append((time.time(), reminder.kind, level))
+        metrics.count(f"reminder_{reminder.kind}")
+        study_logger.info(f"Reminder ({intention.id}, {reminder.kind}, Stufe {level}): {reminder.text}")
+        events.record("reminder", intention=intention.id, kind=reminder.kind, level=level, text=reminder.text)
+        await self.play_audio(reminder.pcm)
+
+    async def play_audio(self, file, preempt=False):
+        logger.info("Reminder wird abgespielt.")
+        if self.player is None:
+            # Der Sensor läuft schon vor der Wiedergabe; frühe Hinweise warten auf sie
+            await asyncio.shield(self.player_task)
+        handle = self.player.play(file, preempt=preempt)
         try:
-            notifier.notify("WATCHDOG=1")
-            dist = measure_distance()
-            logger.info(f"Distance: {dist:.1f} cm")
-
-            current_raw_state = "out" if dist > DISTANCE_THRESHOLD else "in"
-            now = time.time()
-
-            # Wenn Zustand wechselt, aber noch nicht lange genug
-            if current_raw_state != box_state:
-                if pending_state != current_raw_state:
-                    pending_state = current_raw_state
-                    pending_state_start = now
-                elif now - pending_state_start >= STABILITY_SECONDS:
-                    # Zustand ist jetzt stabil → übernehmen
-                    box_state = pending_state
-                    if box_state == "in":
-                        logger.info("Handy ist in Box.")
-                        inbox_start_time = now
-                        if outbox_start_time:
-                            study_logger.info(f"Phone out Box: {outbox_start_time}; Dauer: {inbox_start_time - outbox_start_time:.2f}s; Ende: {inbox_start_time}")
-                            outbox_start_time = None
-                    else:
-                        logger.info("Kein Handy in Box.")
-                        outbox_start_time = now
-                        if inbox_start_time:
-                            study_logger.info(f"Phone in Box: {inbox_start_time}; Dauer: {outbox_start_time - inbox_start_time:.2f}s; Ende: {outbox_start_time}")
-                            inbox_start_time = None
-            else:
-                pending_state = None
-                pending_state_start = None
-
-            # Reminder-Logik wie gehabt
-            if box_state == "out":
-                if not reminder_timer_started:
-                    if not reflection_prompt_played:
-                        play_audio("pickup.wav")
-                        logger.info("Bitte Aufnahme starten")
-                        reflection_prompt_played = True
-
-                    if latest_audio_file:
-                        reminder_start_time = now
-                        reminder_timer_started = True
-                        logger.info("Reminder-Timer gestartet.")
-                elif reminder_timer_started:
-                    elapsed = now - reminder_start_time
-                    logger.info(f"Reminder läuft seit {int(elapsed)} Sekunden")
-                    if elapsed >= DELAY_SECONDS:
-                        safe_thread(play_audio, latest_audio_file)
-                        reminder_timer_started = False 
-                        reminder_start_time = None
-                        logger.info("Reminder wird abgespielt und zurückgesetzt.")
-            elif box_state == "in":
-                if inbox_start_time:
-                    inbox_duration = now - inbox_start_time
-                    logger.info(f"Handy liegt seit {int(inbox_duration)}s im Kasten")
-                    if inbox_duration >= CANCEL_SECONDS:
-                        if reminder_timer_started:
-                            logger.info("Reminder abgebrochen.")
-                            reminder_timer_started = False
-                            reminder_start_time = None
-                        logger.info("reflextion notification active.")  
-                        reflection_prompt_played = False
-
-            time.sleep(1)
-
-        except Exception as e:
-            logger.exception("Fehler in distance_loop")
-            time.sleep(2)
-
-# -------------------- Button --------------------
-button.when_pressed = start_recording
-button.when_released = stop_recording
+            await playback.wait_played(handle)
+        except asyncio.CancelledError:
+            self.player.stop(handle)
+            raise
+
+# -------------------- Box-Zustand --------------------
+class ProbeBoxListener(box_state.BoxListener):
+    def __init__(self, app):
+        self.app = app
+
+    def on_state_changed(self, state, now, previous_since):
+        if state == "in":
+            logger.info("Handy ist in Box.")
+            if previous_since:
+                study_logger.info(f"Phone out Box: {previous_since}; Dauer: {now - previous_since:.2f}s; Ende: {now}")
+                events.record("box", state="out", since=previous_since, duration=now - previous_since)
+        else:
+            logger.info("Kein Handy in Box.")
+            if previous_since:
+                study_logger.info(f"Phone in Box: {previous_since}; Dauer: {now - previous_since:.2f}s; Ende: {now}")
+                events.record("box", state="in", since=previous_since, duration=now - previous_since)
+
+    def on_pickup_prompt(self, now):
+        self.app.runtime.spawn(self.app.play_audio("pickup.wav"), name="playback")
+        logger.info("Bitte Aufnahme starten")
+
+    def on_reminder_armed(self, now, due):
+        logger.info("Reminder-Timer gestartet.")
+
+    def on_reminder_due(self, now, level=0):
+        self.app.runtime.spawn(self.app.play_reminder(level), name="playback")
+        logger.info("Reminder wird abgespielt und zurückgesetzt.")
+
+    def on_reminder_cancelled(self, now):
+        logger.info("Reminder abgebrochen.")
+
+    def on_reflection_reset(self, now):
+        logger.info("reflextion notification active.")
+        sessions = self.app.sessions
+        started = sessions.session_started
+        closed = sessions.close_session()
+        if closed:
+            played = sum(len(i.played) for i in closed)
+            study_logger.info(f"Session beendet: {len(closed)} Vorhaben; {played} Erinnerungen")
+            events.record("session", intentions=len(closed), reminders=played, started=started)
 
 # -------------------- Main --------------------
-try:
-    notifier.notify("READY=1")
-    notifier.notify("WATCHDOG=1")
-    play_audio("start.wav")
-    distance_loop()
-except KeyboardInterrupt:
-    logger.info("Beende...")
-    play_audio("stop.wav")
-    GPIO.cleanup()
-    if recording_process:
-        recording_process.terminate()
-        recording_process.wait()
-    logger.info("Programm erfolgreich beendet.")
+if __name__ == "__main__":
+    setup_logging()
+    app = Probe()
+    try:
+        asyncio.run(app.run())
+    except KeyboardInterrupt:
+        logger.info("Beende...")
+        app.close()
+        logger.info("Programm erfolgreich beendet.")
@@ -9,6 +9,7 @@ from signal import pause
 import openai
 from dotenv import load_dotenv
 from elevenlabs.client import ElevenLabs
+import audio
 
 # -------------------- Konfiguration --------------------
 load_dotenv()
@@ -23,8 +24,6 @@ DELAY_SECONDS = 1 * 60
 CANCEL_SECONDS = 60
 FILENAME = "aufnahme.wav"
 RAW_PCM_FILE = "response.wav"               # Output from ElevenLabs
-WAV_CONVERTED = "response_converted.wav"    # After RIFF header fix
-BOOSTED_FILE = "boosted_response.wav"       # Final playback file
 WATCHDOG_TIMEOUT = 30 * 60
 
 SPEAKER_DEVICE = "plughw:0"
@@ -40,32 +39,22 @@ recording_process = None
 is_recording = False
 recording_start_time = None
 latest_text_prompt = None
+boosted_audio = None       # Reminder nach Boost, PCM 16 kHz mono im Speicher
 last_activity_time = time.time()
 processing_lock = threading.Lock()
 
 # -------------------- Audio Utility --------------------
-def convert_pcm_to_wav(input_file, output_file):
-    print("Konvertiere PCM → WAV...")
-    subprocess.run([
-        "sox", "-t", "raw",
-        "-r", "16000", "-e", "signed", "-b", "16", "-c", "1",
-        input_file, output_file
-    ])
-    print("Konvertierung abgeschlossen.")
-
-def boost_volume(input_file, output_file, gain_db="+6"):
+def boost_volume(pcm, gain_db=6):
     print("Booste Lautstärke mit Fade + Padding...")
-    subprocess.run([
-        "sox", input_file, output_file,
-        "gain", gain_db,
-        "fade", "t", "1", "0", "0.2",  # fade in 1s, fade out 0.2s
-        "pad", "0.5", "0.5"           # 0.5s silence before/after
-    ])
+    # fade in 1s, fade out 0.2s, 0.5s Stille davor/danach – im Speicher statt über sox
+    boosted = audio.boost(pcm, gain_db=gain_db, fade_in=1, fade_out=0.2, pad_before=0.5, pad_after=0.5)
     print("Boost abgeschlossen.")
+    return boosted
 
-def play_audio(file):
+def play_audio(pcm):
     print("Reminder wird abgespielt.")
-    os.system(f"aplay -D {SPEAKER_DEVICE} -f S16_LE -r 16000 -c 1 {file}")
+    subprocess.run(["aplay", "-D", SPEAKER_DEVICE, "-t", "raw", "-f", "S16_LE", "-r", "16000", "-c", "1", "-"],
+                   input=pcm)
 
 # -------------------- Logik --------------------
 def measure_distance():
@@ -121,7 +110,7 @@ def stop_recording():
     threading.Thread(target=process_recording, args=(FILENAME,)).start()
 
 def process_recording(filename):
-    global latest_text_prompt
+    global latest_text_prompt, boosted_audio
     with processing_lock:
         try:
             print("Transkribiere über Whisper...")
@@ -145,21 +134,19 @@ def process_recording(filename):
             print("GPT-4:", antwort)
 
             print("Erzeuge Sprachausgabe über ElevenLabs...")
-            audio = elevenlabs.text_to_speech.convert(
+            tts_audio = elevenlabs.text_to_speech.convert(
                 text=antwort,
                 voice_id="JBFqnCBsd6RMkjVDRZzb",
                 model_id="eleven_multilingual_v2",
                 output_format="pcm_16000"
             )
 
+            pcm = b"".join(tts_audio)
             with open(RAW_PCM_FILE, "wb") as f:
-                for chunk in audio:
-                    f.write(chunk)
+                f.write(pcm)
             print("Audio gespeichert:", RAW_PCM_FILE)
 
-            # Konvertieren und boosten
-            convert_pcm_to_wav(RAW_PCM_FILE, WAV_CONVERTED)
-            boost_volume(WAV_CONVERTED, BOOSTED_FILE)
+            boosted_audio = boost_volume(pcm)
 
         except Exception as e:
             print("Fehler bei der Verarbeitung:", e)
@@ -178,7 +165,7 @@ def distance_loop():
             if dist > DISTANCE_THRESHOLD:
                 if not reminder_timer_started:
                     print("Bitte Aufnahme starten")
-                    if os.path.exists(BOOSTED_FILE):
+                    if boosted_audio is not None:
                         reminder_start_time = time.time()
                         reminder_timer_started = True
                         print("Reminder-Timer gestartet.")
@@ -186,7 +173,7 @@ def distance_loop():
                     elapsed = time.time() - reminder_start_time
                     print(f"Reminder läuft seit {int(elapsed)} Sekunden")
                     if elapsed >= DELAY_SECONDS:
-                        threading.Thread(target=play_audio, args=(BOOSTED_FILE,)).start()
+                        threading.Thread(target=play_audio, args=(boosted_audio,)).start()
                         reminder_timer_started = False
                         reminder_start_time = None
                         print("Reminder-Timer zurückgesetzt.")
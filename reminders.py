@@ -0,0 +1,74 @@
+import time
+import asyncio
+import logging
+
+# -------------------- Reminder-Varianten --------------------
+# Zu jeder Aufnahme liegen die fertigen Erinnerungen als PCM im Speicher: die Hauptantwort,
+# im Hintergrund während DELAY_SECONDS vorab erzeugte Alternativen und notfalls die
+# Notfall-Erinnerung. Zur Erinnerungszeit wird die beste fertige Variante ohne Plattenzugriff
+# abgespielt; ist die Hauptantwort ausgefallen, springt eine Alternative ein.
+
+PRIORITY = {"primary": 0, "variant": 1, "fallback": 2}
+
+logger = logging.getLogger("ProbeLogger")
+
+
+class Reminder:
+    def __init__(self, kind, text, pcm):
+        self.kind = kind
+        self.text = text
+        self.pcm = pcm
+        self.created = time.time()
+
+
+class ReminderVariants:
+    def __init__(self, transkription=None):
+        self.transkription = transkription   # wird nach der Transkription gesetzt
+        self.reminders = []
+        self.ready = asyncio.Event()
+        self.released = False
+
+    def add(self, kind, text, pcm):
+        if not pcm:
+            return
+        # Nach release_audio() (archiviert) nur noch den Text behalten
+        self.reminders.append(Reminder(kind, text, None if self.released else pcm))
+        self.reminders.sort(key=lambda r: PRIORITY[r.kind])
+        logger.info("Reminder-Variante bereit (%s, %d insgesamt)", kind, len(self.reminders))
+        self.ready.set()
+
+    def release_audio(self):
+        # Für das Archiv: Texte bleiben für Auswertung und Ereignisse, das PCM wird freigegeben
+        self.released = True
+        for reminder in self.reminders:
+            reminder.pcm = None
+
+    def count(self, kind=None):
+        return sum(1 for r in self.reminders if kind is None or r.kind == kind)
+
+    def best(self):
+        return self.reminders[0] if self.reminders else None
+
+    async def wait_best(self, timeout):
+        # Wartet höchstens timeout Sekunden auf die erste fertige Variante
+        if not self.ready.is_set():
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self.best()
+
+
+async def pregenerate(variants, generate, count, spacing=2.0):
+    # generate(transkription, index) -> (text, pcm). Nacheinander und mit Pause, damit die
+    # Vorab-Erzeugung der Hauptantwort oder einer neuen Aufnahme keine Bandbreite wegnimmt.
+    for index in range(1, count + 1):
+        await asyncio.sleep(spacing)
+        try:
+            text, pcm = await generate(variants.transkription, index)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Reminder-Variante %d fehlgeschlagen: %s", index, e)
+            continue
+        variants.add("variant", text, pcm)
@@ -0,0 +1,253 @@
+import time
+import random
+import asyncio
+import collections
+import logging
+
+# -------------------- Resilienz für API-Aufrufe --------------------
+# Pro Stufe (whisper, gpt, tts, ...) eine Policy mit Zeitlimit je Versuch, Gesamtfrist,
+# exponentiellem Backoff mit Jitter und einem Circuit Breaker. Für die TTS optional
+# Hedging: kommt der erste Chunk nicht innerhalb der bisherigen p95-Latenz, wird dieselbe
+# Anfrage ein zweites Mal gestellt und die schnellere gewinnt.
+
+logger = logging.getLogger("ProbeLogger")
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class Policy:
+    def __init__(self, attempt_timeout, deadline, attempts=3, backoff_base=0.5, backoff_cap=4.0,
+                 failure_threshold=3, reset_timeout=60, idle_timeout=None, hedge=False):
+        self.attempt_timeout = attempt_timeout
+        self.deadline = deadline
+        self.attempts = attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.idle_timeout = idle_timeout      # max. Pause zwischen zwei Chunks eines Stroms
+        self.hedge = hedge
+
+
+class CircuitBreaker:
+    # closed → open nach failure_threshold fehlgeschlagenen Aufrufen in Folge (ein Aufruf mit
+    # allen Wiederholungen zählt einmal); nach reset_timeout half-open,
+    # ein Probeaufruf entscheidet über closed oder erneut open.
+    def __init__(self, name, failure_threshold, reset_timeout, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        # True, wenn dieser Aufruf der Probeaufruf ist
+        state = self.state
+        if state == "open" or (state == "half-open" and self.probing):
+            raise CircuitOpenError(f"{self.name}: Circuit offen nach {self.failures} Fehlern")
+        if state == "half-open":
+            self.probing = True
+            return True
+        return False
+
+    def release_probe(self):
+        # Abgebrochener Probeaufruf: weder Erfolg noch Fehler, der nächste Aufruf darf proben
+        self.probing = False
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info("%s: Circuit wieder geschlossen", self.name)
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.probing = False
+        if self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning("%s: Circuit geöffnet nach %d Fehlern in Folge", self.name, self.failures)
+            self.opened_at = self.clock()
+
+
+class LatencyTracker:
+    def __init__(self, size=50, default=1.5):
+        self.samples = collections.deque(maxlen=size)
+        self.default = default
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, q):
+        if len(self.samples) < 5:
+            return self.default
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def backoff_delay(policy, attempt):
+    # "Full jitter": gleichverteilt zwischen 0 und der exponentiellen Obergrenze
+    return random.uniform(0, min(policy.backoff_cap, policy.backoff_base * 2 ** attempt))
+
+
+class Resilience:
+    def __init__(self, policies):
+        self.policies = policies
+        self.breakers = {name: CircuitBreaker(name, p.failure_threshold, p.reset_timeout)
+                         for name, p in policies.items()}
+        self.latency = collections.defaultdict(LatencyTracker)
+
+    async def call(self, stage, func):
+        # func: Coroutine-Funktion ohne Argumente, pro Versuch neu aufgerufen. Der Breaker wird
+        # einmal vor den Versuchen gefragt und zählt den ganzen Aufruf als einen Fehler.
+        policy = self.policies[stage]
+        breaker = self.breakers[stage]
+        deadline = time.monotonic() + policy.deadline
+        probe = breaker.before_call()
+        try:
+            for attempt in range(policy.attempts):
+                remaining = deadline - time.monotonic()
+                started = time.monotonic()
+                try:
+                    result = await asyncio.wait_for(func(), min(policy.attempt_timeout, remaining))
+                except Exception as e:
+                    delay = backoff_delay(policy, attempt)
+                    last = attempt == policy.attempts - 1 or time.monotonic() + delay >= deadline
+                    if last:
+                        breaker.record_failure()
+                        logger.error(f"{stage}: fehlgeschlagen nach {attempt+1} Versuchen: {e!r}")
+                        raise
+                    logger.warning(f"{stage}: Fehler (Versuch {attempt+1}): {e!r}, neuer Versuch in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                    continue
+                breaker.record_success()
+                self.latency[stage].add(time.monotonic() - started)
+                return result
+        except asyncio.CancelledError:
+            # Abgebrochener Aufruf zählt weder als Erfolg noch als Fehler
+            if probe:
+                breaker.release_probe()
+            raise
+
+    async def stream(self, stage, func):
+        # func: liefert bei jedem Aufruf einen neuen Async-Iterator. Wiederholt wird nur,
+        # solange noch kein Chunk weitergereicht wurde; danach gilt nur noch idle_timeout.
+        policy = self.policies[stage]
+        breaker = self.breakers[stage]
+        deadline = time.monotonic() + policy.deadline
+        probe = breaker.before_call()
+        try:
+            for attempt in range(policy.attempts):
+                remaining = deadline - time.monotonic()
+                started = time.monotonic()
+                agen = None
+                try:
+                    if policy.hedge:
+                        hedge_after = self.latency[stage].percentile(0.95)
+                        agen, first = await asyncio.wait_for(
+                            hedged_first_chunk(func, hedge_after, stage), min(policy.attempt_timeout, remaining))
+                    else:
+                        agen = func().__aiter__()
+                        first = await asyncio.wait_for(
+                            next_chunk(agen), min(policy.attempt_timeout, remaining))
+                except asyncio.CancelledError:
+                    if agen is not None:
+                        await close_quietly(agen)
+                    raise
+                except Exception as e:
+                    if agen is not None:
+                        await close_quietly(agen)
+                    delay = backoff_delay(policy, attempt)
+                    if attempt == policy.attempts - 1 or time.monotonic() + delay >= deadline:
+                        breaker.record_failure()
+                        logger.error(f"{stage}: fehlgeschlagen nach {attempt+1} Versuchen: {e!r}")
+                        raise
+                    logger.warning(f"{stage}: Fehler (Versuch {attempt+1}): {e!r}, neuer Versuch in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                    continue
+                breaker.record_success()
+                self.latency[stage].add(time.monotonic() - started)
+                break
+        except asyncio.CancelledError:
+            if probe:
+                breaker.release_probe()
+            raise
+        if first is None:
+            return
+        yield first
+        try:
+            while True:
+                if policy.idle_timeout:
+                    chunk = await asyncio.wait_for(next_chunk(agen), policy.idle_timeout)
+                else:
+                    chunk = await next_chunk(agen)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            await close_quietly(agen)
+
+
+async def next_chunk(agen):
+    # None statt StopAsyncIteration, damit sich der Aufruf in Tasks und wait_for verpacken lässt
+    try:
+        return await agen.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+async def close_quietly(agen):
+    try:
+        await agen.aclose()
+    except Exception:
+        pass
+
+
+async def hedged_first_chunk(func, hedge_after, stage):
+    async def first(agen):
+        return agen, await next_chunk(agen)
+
+    tasks = {asyncio.ensure_future(first(func().__aiter__()))}
+    done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+    if not done:
+        logger.info("%s: kein Chunk nach %.2fs, starte Hedge-Anfrage", stage, hedge_after)
+        tasks.add(asyncio.ensure_future(first(func().__aiter__())))
+    winner = None
+    error = None
+    pending = set(tasks)
+    try:
+        while pending and winner is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    winner = winner or task.result()
+                else:
+                    error = error or task.exception()
+    finally:
+        for task in pending:
+            task.cancel()
+        for task in pending:
+            try:
+                await task
+            except BaseException:
+                pass
+        # Verlierer, die schon einen Chunk hatten, sauber schließen
+        for task in tasks:
+            if task.done() and not task.cancelled() and task.exception() is None:
+                if winner is None or task.result() is not winner:
+                    await close_quietly(task.result()[0])
+    if winner is None:
+        raise error
+    return winner
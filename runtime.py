@@ -0,0 +1,81 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+# -------------------- Asyncio-Laufzeit --------------------
+# Ersetzt safe_thread: Arbeit läuft als Task im Event-Loop des Hauptthreads. Blockierende
+# Aufrufe (GPIO, Dateien, Prozesse) gehen in einen begrenzten Thread-Pool, sodass die Zahl
+# der Threads auch bei vielen Tastendrücken konstant bleibt. Der Sensor (und damit der
+# Watchdog-Ping) hat einen eigenen Thread, damit ihn ein ausgelasteter Pool nicht aufhält.
+
+logger = logging.getLogger("ProbeLogger")
+
+
+class Runtime:
+    def __init__(self, max_workers=4):
+        self.loop = None
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="probe-io")
+        self.sensor_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="probe-sensor")
+        self.tasks = {}
+
+    def attach(self, loop):
+        self.loop = loop
+        loop.set_default_executor(self.executor)
+
+    # ---- Aus dem Event-Loop ----
+    def spawn(self, coro, name, timeout=None):
+        async def guarded():
+            try:
+                if timeout is None:
+                    return await coro
+                return await asyncio.wait_for(coro, timeout)
+            except asyncio.CancelledError:
+                logger.info("Task %s abgebrochen", name)
+                raise
+            except asyncio.TimeoutError:
+                logger.error("Task %s nach %ss abgebrochen (Timeout)", name, timeout)
+            except Exception:
+                logger.exception(f"Task {name} crashed")
+
+        task = self.loop.create_task(guarded(), name=name)
+        self.tasks.setdefault(name, set()).add(task)
+        task.add_done_callback(lambda t: self.tasks.get(name, set()).discard(t))
+        return task
+
+    def cancel(self, name):
+        for task in list(self.tasks.get(name, ())):
+            task.cancel()
+
+    def running(self, name):
+        return any(not t.done() for t in self.tasks.get(name, ()))
+
+    async def run_blocking(self, func, *args):
+        return await self.loop.run_in_executor(self.executor, func, *args)
+
+    async def run_sensor(self, func, *args):
+        return await self.loop.run_in_executor(self.sensor_executor, func, *args)
+
+    # ---- Aus fremden Threads (gpiozero-Callbacks, Reader-Threads) ----
+    def call_threadsafe(self, func, *args):
+        if self.loop is None:
+            logger.warning("Event-Loop läuft noch nicht, verwerfe %s", func.__name__)
+            return
+        self.loop.call_soon_threadsafe(func, *args)
+
+    def spawn_threadsafe(self, coro_func, *args, name, timeout=None):
+        if self.loop is None:
+            logger.warning("Event-Loop läuft noch nicht, verwerfe %s", name)
+            return
+        self.loop.call_soon_threadsafe(lambda: self.spawn(coro_func(*args), name, timeout=timeout))
+
+    def run_coroutine(self, coro, timeout=None):
+        # Blockiert den aufrufenden (Nicht-Loop-)Thread bis zum Ergebnis
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    async def shutdown(self):
+        # Alle Tasks abbrechen und die Pools freigeben, ohne auf laufende Aufrufe zu warten
+        for tasks in list(self.tasks.values()):
+            for task in list(tasks):
+                task.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.sensor_executor.shutdown(wait=False, cancel_futures=True)
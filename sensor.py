@@ -0,0 +1,252 @@
+import time
+import threading
+import logging
+
+# -------------------- Ultraschall-Entfernungsmessung --------------------
+# Statt ECHO in einer Schleife abzufragen, werden die Flanken per Callback gemeldet.
+# Der Messthread schläft bis zur fallenden Flanke (oder dem Timeout) auf einem Event.
+# Backends liefern Flanken als callback(level, tick) und rechnen Tick-Differenzen in ns um.
+
+SPEED_OF_SOUND_CM_S = 34300
+ECHO_TIMEOUT = 0.05
+SETTLE_SECONDS = 0.02
+
+logger = logging.getLogger("ProbeLogger")
+
+
+class RPiGPIOBackend:
+    # RPi.GPIO / rpi-lgpio: Edge-Events, Zeitstempel mit perf_counter_ns im Callback.
+    # Der Callback-Thread läuft verspätet; bei kurzen Echos (< 10 cm) ist ECHO beim Auslesen
+    # schon wieder low. Der Pegel ergibt sich deshalb aus der Reihenfolge seit trigger():
+    # erste Flanke steigend, zweite fallend.
+    def __init__(self, trig, echo):
+        import RPi.GPIO as GPIO
+        self.GPIO = GPIO
+        self.trig = trig
+        self.echo = echo
+        self.edges = 0
+        GPIO.setmode(GPIO.BCM)
+        GPIO.setup(trig, GPIO.OUT)
+        GPIO.setup(echo, GPIO.IN)
+        GPIO.output(trig, False)
+
+    def on_edge(self, callback):
+        def handler(channel):
+            tick = time.perf_counter_ns()
+            self.edges += 1
+            if self.edges <= 2:
+                callback(1 if self.edges == 1 else 0, tick)
+        self.GPIO.add_event_detect(self.echo, self.GPIO.BOTH, callback=handler)
+
+    def trigger(self):
+        self.edges = 0
+        self.GPIO.output(self.trig, True)
+        time.sleep(0.00001)
+        self.GPIO.output(self.trig, False)
+
+    def tick_diff(self, start, end):
+        return end - start
+
+    def cleanup(self):
+        self.GPIO.remove_event_detect(self.echo)
+
+
+class PigpioBackend:
+    # pigpio: Flanken werden vom pigpiod per DMA mit µs-Tick erfasst, unabhängig vom Scheduler
+    def __init__(self, trig, echo):
+        import pigpio
+        self.pigpio = pigpio
+        self.pi = pigpio.pi()
+        if not self.pi.connected:
+            raise RuntimeError("pigpiod läuft nicht")
+        self.trig = trig
+        self.echo = echo
+        self.pi.set_mode(trig, pigpio.OUTPUT)
+        self.pi.set_mode(echo, pigpio.INPUT)
+        self.pi.write(trig, 0)
+        self.callback = None
+
+    def on_edge(self, callback):
+        self.callback = self.pi.callback(
+            self.echo, self.pigpio.EITHER_EDGE,
+            lambda gpio, level, tick: callback(level, tick) if level in (0, 1) else None
+        )
+
+    def trigger(self):
+        self.pi.gpio_trigger(self.trig, 10, 1)
+
+    def tick_diff(self, start, end):
+        return self.pigpio.tickDiff(start, end) * 1000  # µs-Tick mit 32-bit-Überlauf
+
+    def cleanup(self):
+        if self.callback:
+            self.callback.cancel()
+        self.pi.stop()
+
+
+class FakeGPIOBackend:
+    # Für Tests ohne Raspberry Pi: jede Auslösung erzeugt die Flanken, die ein Objekt in der
+    # nächsten Entfernung der Liste liefern würde. None = kein Echo (Timeout).
+    def __init__(self, distances, echo_delay=0.0):
+        self.distances = iter(distances)
+        self.echo_delay = echo_delay
+        self.callback = None
+        self.triggers = 0
+
+    def on_edge(self, callback):
+        self.callback = callback
+
+    def trigger(self):
+        self.triggers += 1
+        distance = next(self.distances, None)
+        if distance is None or self.callback is None:
+            return
+        pulse_ns = int(distance * 2 / SPEED_OF_SOUND_CM_S * 1e9)
+
+        def emit():
+            start = time.perf_counter_ns()
+            self.callback(1, start)
+            self.callback(0, start + pulse_ns)
+
+        if self.echo_delay:
+            threading.Timer(self.echo_delay, emit).start()
+        else:
+            emit()
+
+    def tick_diff(self, start, end):
+        return end - start
+
+    def cleanup(self):
+        pass
+
+
+class UltrasonicRanger:
+    def __init__(self, backend, timeout=ECHO_TIMEOUT, settle=SETTLE_SECONDS):
+        self.backend = backend
+        self.timeout = timeout
+        self.settle = settle
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.rise_tick = None
+        self.pulse_ns = None
+        backend.on_edge(self._edge)
+
+    def _edge(self, level, tick):
+        if level == 1:
+            self.rise_tick = tick
+        elif self.rise_tick is not None and not self.done.is_set():
+            self.pulse_ns = self.backend.tick_diff(self.rise_tick, tick)
+            self.done.set()
+
+    def measure(self):
+        with self.lock:
+            if self.settle:
+                time.sleep(self.settle)
+            self.rise_tick = None
+            self.pulse_ns = None
+            self.done.clear()
+            self.backend.trigger()
+            if not self.done.wait(self.timeout * 2):
+                if self.rise_tick is None:
+                    raise TimeoutError("Timeout beim Warten auf Echo (start)")
+                raise TimeoutError("Timeout beim Warten auf Echo (stop)")
+            return (self.pulse_ns / 1e9 * SPEED_OF_SOUND_CM_S) / 2
+
+    def cleanup(self):
+        self.backend.cleanup()
+
+
+def create_backend(name, trig, echo):
+    if name == "pigpio":
+        try:
+            return PigpioBackend(trig, echo)
+        except Exception as e:
+            logger.warning("pigpio nicht verfügbar, nutze RPi.GPIO: %s", e)
+    return RPiGPIOBackend(trig, echo)
+
+# -------------------- Burst-Messung mit Filter --------------------
+class BurstSampler:
+    # Pro Aufruf eine Salve von N Pings. Der Median der gültigen Pings wird gegen den
+    # Ringpuffer der letzten Werte auf Ausreißer geprüft und durch einen 1D-Kalman-Filter
+    # geglättet. Timeouts zählen als NaN und verändern die Schätzung nicht.
+    def __init__(self, ranger, burst=5, window=15, process_noise=4.0,
+                 outlier_sigma=4.0, min_gate=5.0, max_rejects=2):
+        import numpy as np
+        self.np = np
+        self.ranger = ranger
+        self.burst = burst
+        self.history = np.full(window, np.nan)
+        self.index = 0
+        self.process_noise = process_noise
+        self.outlier_sigma = outlier_sigma
+        self.min_gate = min_gate
+        self.max_rejects = max_rejects
+        self.rejects = 0
+        self.rejected = None
+        self.estimate = None
+        self.variance = None
+
+    def ping_burst(self):
+        np = self.np
+        samples = np.full(self.burst, np.nan)
+        for i in range(self.burst):
+            try:
+                samples[i] = self.ranger.measure()
+            except TimeoutError:
+                pass
+        return samples
+
+    def _push(self, value):
+        self.history[self.index % len(self.history)] = value
+        self.index += 1
+
+    def _reset(self, value, noise):
+        self.estimate = value
+        self.variance = noise
+        self.rejects = 0
+        self.rejected = None
+
+    def update(self, samples):
+        np = self.np
+        valid = samples[np.isfinite(samples) & (samples > 0)]
+        if valid.size == 0:
+            return self.estimate
+        measurement = float(np.median(valid))
+        # Messrauschen aus der Streuung innerhalb der Salve (MAD → Varianz), mindestens 1 cm²
+        mad = float(np.median(np.abs(valid - measurement))) if valid.size > 1 else 1.0
+        noise = max((1.4826 * mad) ** 2, 1.0)
+
+        if self.estimate is None:
+            self._reset(measurement, noise)
+            self._push(measurement)
+            return self.estimate
+
+        recent = self.history[np.isfinite(self.history)]
+        spread = 1.4826 * float(np.median(np.abs(recent - np.median(recent)))) if recent.size else 0.0
+        gate = max(self.outlier_sigma * spread, self.min_gate)
+        if abs(measurement - self.estimate) > gate:
+            # Abweichende Salven zählen nur als Sprung, wenn sie untereinander übereinstimmen
+            if self.rejected is not None and abs(measurement - self.rejected) <= gate:
+                self.rejects += 1
+            else:
+                self.rejects = 1
+            self.rejected = measurement
+            if self.rejects < self.max_rejects:
+                return self.estimate
+            # Mehrere Salven in Folge weichen gleich ab → echter Sprung, Filter neu setzen
+            self.history[:] = np.nan
+            self._reset(measurement, noise)
+            self._push(measurement)
+            return self.estimate
+
+        self.rejects = 0
+        self.rejected = None
+        predicted_variance = self.variance + self.process_noise
+        gain = predicted_variance / (predicted_variance + noise)
+        self.estimate += gain * (measurement - self.estimate)
+        self.variance = (1 - gain) * predicted_variance
+        self._push(measurement)
+        return self.estimate
+
+    def sample(self):
+        return self.update(self.ping_burst())
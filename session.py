@@ -0,0 +1,111 @@
+import os
+import time
+import itertools
+import collections
+import logging
+from reminders import ReminderVariants
+
+# -------------------- Sitzungen und Vorhaben --------------------
+# Eine Sitzung ist eine Phase, in der das Handy aus der Box ist. Jede angenommene Aufnahme
+# wird zu einem Vorhaben mit eigener Aufnahme, eigener Antwortdatei und eigenen
+# Reminder-Puffern im Speicher, sodass sich parallele Verarbeitungen nichts überschreiben.
+# Offene Vorhaben stehen in einer begrenzten Warteschlange; bei Überlauf fällt das älteste
+# heraus. Fällige Erinnerungen wechseln reihum zwischen den Vorhaben, und bei jeder Wiederholung
+# eines Vorhabens kommt eine andere Variante an die Reihe.
+
+logger = logging.getLogger("ProbeLogger")
+
+
+class Intention:
+    def __init__(self, intention_id, directory):
+        self.id = intention_id
+        self.created = time.time()
+        self.recording_file = os.path.join(directory, f"{intention_id}.wav")
+        self.response_file = os.path.join(directory, f"{intention_id}.pcm")
+        self.transkription = None
+        self.text = None
+        self.variants = ReminderVariants()
+        self.played = []                 # (Zeit, Variante, Stufe)
+
+    def task_names(self):
+        return [f"processing-{self.id}", f"variants-{self.id}"]
+
+    def pick(self):
+        # Beim ersten Mal die beste Variante, bei jeder Wiederholung die nächste vollständige,
+        # damit eine wiederholte Erinnerung nicht wortgleich klingt
+        complete = [r for r in self.variants.reminders if r.kind != "fallback"]
+        if complete:
+            return complete[len(self.played) % len(complete)]
+        return self.variants.best()
+
+
+class SessionStore:
+    def __init__(self, directory, max_pending=3, history_size=20):
+        self.directory = directory
+        self.max_pending = max_pending
+        self.pending = collections.deque()
+        self.history = collections.deque()
+        self.history_size = history_size
+        self.last = None                 # zuletzt abgeschlossenes Vorhaben, bis ein neues kommt
+        self.turn = 0
+        self.session_started = None
+        self.counter = itertools.count(1)
+        os.makedirs(directory, exist_ok=True)
+
+    def new_intention(self):
+        # Liefert (neues Vorhaben, verdrängte Vorhaben); Aufrufer bricht deren Tasks ab
+        intention = Intention(f"{time.strftime('%Y%m%d-%H%M%S')}-{next(self.counter)}", self.directory)
+        if self.session_started is None:
+            self.session_started = intention.created
+        self.pending.append(intention)
+        dropped = []
+        while len(self.pending) > self.max_pending:
+            old = self.pending.popleft()
+            logger.info("Vorhaben %s verdrängt (max. %d offen)", old.id, self.max_pending)
+            self._archive(old)
+            dropped.append(old)
+        return intention, dropped
+
+    def ready(self):
+        return [i for i in self.pending if i.variants.reminders]
+
+    def pick(self):
+        # Reihum über die offenen Vorhaben mit fertiger Erinnerung; ohne offene Vorhaben
+        # wird das zuletzt abgeschlossene wiederholt
+        candidates = self.ready()
+        if not candidates:
+            if self.last is not None and self.last.variants.reminders:
+                return self.last, self.last.pick()
+            return None, None
+        intention = candidates[self.turn % len(candidates)]
+        self.turn += 1
+        return intention, intention.pick()
+
+    def newest(self):
+        return self.pending[-1] if self.pending else self.last
+
+    def close_session(self):
+        # Handy liegt wieder dauerhaft in der Box: offene Vorhaben wandern ins Archiv
+        closed = list(self.pending)
+        while self.pending:
+            self._archive(self.pending.popleft())
+        self.turn = 0
+        self.session_started = None
+        return closed
+
+    def _archive(self, intention):
+        # Nur das zuletzt abgeschlossene Vorhaben wird noch abgespielt; ältere behalten im
+        # Archiv ihre Texte, aber nicht die Reminder-Puffer (sonst einige MB je Eintrag)
+        if self.last is not None and self.last is not intention:
+            self.last.variants.release_audio()
+        self.last = intention
+        self.history.append(intention)
+        while len(self.history) > self.history_size:
+            old = self.history.popleft()
+            if old is self.last:
+                continue
+            for path in (old.recording_file, old.response_file):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
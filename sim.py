@@ -0,0 +1,189 @@
+import os
+import sys
+import time
+import types
+import random
+import threading
+import sensor
+import capture
+
+# -------------------- Simulierte Hardware --------------------
+# Ersatz für alles, was probe.py sonst nur auf dem Pi findet: RPi.GPIO, gpiozero (Taster),
+# sdnotify, der Ultraschallsensor (Entfernungen nach einem Drehbuch) und arecord (liefert eine
+# WAV-Datei in Echtzeit). Die Wiedergabe läuft über playback.NullSink (PROBE_AUDIO_SINK=null),
+# die APIs über stub_server.py. Genutzt von bench_e2e.py und bench_startup.py.
+
+
+class Button:
+    # Wie gpiozero.Button; press()/release() rufen die Callbacks wie die GPIO-Flanken auf
+    instances = {}
+
+    def __init__(self, pin, pull_up=True, bounce_time=None):
+        self.pin = pin
+        self.when_pressed = None
+        self.when_released = None
+        self.is_pressed = False
+        Button.instances[pin] = self
+
+    def press(self):
+        self.is_pressed = True
+        if self.when_pressed:
+            self.when_pressed()
+
+    def release(self):
+        self.is_pressed = False
+        if self.when_released:
+            self.when_released()
+
+
+class SystemdNotifier:
+    def __init__(self):
+        self.messages = []
+
+    def notify(self, message):
+        self.messages.append((time.time(), message))
+
+
+def _gpio_module():
+    gpio = types.ModuleType("RPi.GPIO")
+    gpio.BCM, gpio.OUT, gpio.IN, gpio.BOTH = "BCM", "OUT", "IN", "BOTH"
+    for name in ("setmode", "setup", "output", "add_event_detect", "remove_event_detect", "cleanup"):
+        setattr(gpio, name, lambda *args, **kwargs: None)
+    gpio.input = lambda channel: 0
+    return gpio
+
+
+def install():
+    # Vor "import probe" aufrufen
+    gpio = _gpio_module()
+    rpi = types.ModuleType("RPi")
+    rpi.GPIO = gpio
+    sys.modules["RPi"] = rpi
+    sys.modules["RPi.GPIO"] = gpio
+    gpiozero = types.ModuleType("gpiozero")
+    gpiozero.Button = Button
+    sys.modules["gpiozero"] = gpiozero
+    sdnotify = types.ModuleType("sdnotify")
+    sdnotify.SystemdNotifier = SystemdNotifier
+    sys.modules["sdnotify"] = sdnotify
+
+
+# -------------------- Sensor --------------------
+class DistanceTrace:
+    # Drehbuch aus (ab Sekunde, Entfernung in cm); None = kein Echo. Zeit ab begin()
+    def __init__(self, steps=(), noise=0.5, seed=1):
+        self.steps = sorted(steps)
+        self.noise = noise
+        self.random = random.Random(seed)
+        self.started = time.monotonic()
+
+    def begin(self, steps=None):
+        if steps is not None:
+            self.steps = sorted(steps)
+        self.started = time.monotonic()
+
+    def distance(self):
+        elapsed = time.monotonic() - self.started
+        current = None
+        for at, distance in self.steps:
+            if at > elapsed:
+                break
+            current = distance
+        if current is None:
+            return None
+        return max(1.0, current + self.random.gauss(0, self.noise))
+
+    def readings(self):
+        while True:
+            yield self.distance()
+
+
+class TraceBackend(sensor.FakeGPIOBackend):
+    # Echo-Flanken nach dem Drehbuch, mit derselben Pulsbreite wie der echte HC-SR04
+    def __init__(self, trace, echo_delay=0.0):
+        super().__init__(trace.readings(), echo_delay)
+        self.trace = trace
+
+
+# -------------------- Aufnahme --------------------
+class FakeCaptureProcess:
+    # Wie arecord -t raw: schreibt PCM im Echtzeit-Takt nach stdout, danach Stille, bis
+    # terminate() oder max_seconds. pcm darf auch ein Microphone sein (ohne max_seconds: endlos)
+    def __init__(self, pcm, max_seconds=None):
+        read_fd, write_fd = os.pipe()
+        self.stdout = os.fdopen(read_fd, "rb")
+        self.pipe = os.fdopen(write_fd, "wb", buffering=0)
+        self.pcm = pcm
+        self.max_bytes = (float("inf") if max_seconds is None
+                          else int(max_seconds * capture.SAMPLE_RATE) * capture.SAMPLE_WIDTH)
+        self.stopped = threading.Event()
+        self.returncode = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        chunk_seconds = capture.CHUNK_BYTES / (capture.SAMPLE_RATE * capture.SAMPLE_WIDTH)
+        started = time.monotonic()
+        offset = 0
+        try:
+            while offset < self.max_bytes and not self.stopped.is_set():
+                if isinstance(self.pcm, Microphone):
+                    chunk = self.pcm.read(capture.CHUNK_BYTES)
+                else:
+                    chunk = self.pcm[offset:offset + capture.CHUNK_BYTES]
+                chunk += bytes(capture.CHUNK_BYTES - len(chunk))
+                self.pipe.write(chunk)
+                offset += capture.CHUNK_BYTES
+                self.stopped.wait(max(0.0, started + offset // capture.CHUNK_BYTES * chunk_seconds
+                                      - time.monotonic()))
+        except BrokenPipeError:
+            pass
+        finally:
+            self.pipe.close()
+            self.returncode = 0 if self.returncode is None else self.returncode
+
+    def poll(self):
+        return self.returncode
+
+    def terminate(self):
+        self.returncode = -15
+        self.stopped.set()
+
+    def wait(self, timeout=None):
+        self.thread.join(timeout)
+        return self.returncode
+
+
+class SimRecorder(capture.StreamingRecorder):
+    # Ersetzt capture.StreamingRecorder; source ist das PCM, das "ins Mikrofon" gesprochen wird.
+    # Was vor dem Start gesprochen wurde und während arecord das Gerät öffnet, fehlt.
+    source = b""
+    skip_seconds = 0.0
+
+    def start(self):
+        skip = int(self.skip_seconds * capture.SAMPLE_RATE) * capture.SAMPLE_WIDTH
+        self.process = FakeCaptureProcess(self.source[skip:], self.max_seconds)
+        self.reader = threading.Thread(target=self._read_loop, daemon=True)
+        self.reader.start()
+        return self.process
+
+
+class Microphone:
+    # Für capture.CaptureService: ein dauerhaft offenes Mikrofon, das Stille liefert, bis speak()
+    # einen Clip einspielt. open() passt als process_factory.
+    def __init__(self):
+        self.pending = bytearray()
+        self.lock = threading.Lock()
+
+    def speak(self, pcm):
+        with self.lock:
+            self.pending = bytearray(pcm)
+
+    def read(self, size):
+        with self.lock:
+            chunk = bytes(self.pending[:size])
+            del self.pending[:size]
+        return chunk
+
+    def open(self, device):
+        return FakeCaptureProcess(self)
@@ -0,0 +1,126 @@
+import asyncio
+import threading
+import logging
+import audio
+
+# -------------------- Spracherkennung --------------------
+# Austauschbare Backends mit gleicher Schnittstelle: transcribe(wav_bytes, prompt) -> str.
+# "cloud" lädt zu OpenAI Whisper hoch, "local" rechnet mit faster-whisper (CTranslate2, int8)
+# auf der CPU des Pi, "auto" nimmt die Cloud und fällt ohne Verbindung auf lokal zurück.
+# Das lokale Modell wird einmal geladen und bleibt im Speicher.
+
+SAMPLE_RATE = 16000
+
+logger = logging.getLogger("ProbeLogger")
+
+
+def wav_to_float(wav_bytes):
+    # WAV (beliebige Rate, mono/stereo, 16 bit) -> float32 mono 16 kHz in [-1, 1]
+    return audio.to_float(audio.wav_to_pcm(wav_bytes))
+
+
+class SpeechBackend:
+    name = "base"
+
+    def load(self):
+        # Blockierend; vor der ersten Aufnahme im Executor aufrufen
+        pass
+
+    async def transcribe(self, wav_bytes, prompt=None):
+        raise NotImplementedError
+
+
+class CloudWhisperBackend(SpeechBackend):
+    name = "cloud"
+
+    def __init__(self, client_factory, resilience, model="whisper-1", encoder=None):
+        self.client_factory = client_factory
+        self.resilience = resilience
+        self.model = model
+        self.encoder = encoder   # codec.UploadEncoder; None lädt WAV hoch
+
+    async def transcribe(self, wav_bytes, prompt=None):
+        upload = ("aufnahme.wav", wav_bytes, "audio/wav")
+        if self.encoder:
+            # Einmal kodieren, nicht pro Versuch
+            upload = await asyncio.to_thread(self.encoder.encode, wav_bytes)
+
+        async def do_transcribe():
+            kwargs = {"prompt": prompt} if prompt else {}
+            return await self.client_factory().audio.transcriptions.create(
+                model=self.model, file=upload, **kwargs
+            )
+        return (await self.resilience.call("whisper", do_transcribe)).text
+
+
+class LocalWhisperBackend(SpeechBackend):
+    name = "local"
+
+    def __init__(self, model_size="base", compute_type="int8", threads=4, language=None, beam_size=1):
+        self.model_size = model_size
+        self.compute_type = compute_type
+        self.threads = threads
+        self.language = language
+        self.beam_size = beam_size
+        self.model = None
+        # Ein Modell, ein Aufruf zur Zeit: parallele Segmente würden sich nur die Kerne teilen
+        self.lock = threading.Lock()
+
+    def load(self):
+        with self.lock:
+            if self.model is not None:
+                return
+            try:
+                from faster_whisper import WhisperModel
+            except ImportError:
+                raise RuntimeError("Lokale Spracherkennung braucht faster-whisper (pip install faster-whisper)")
+            logger.info("Lade lokales STT-Modell %s (%s)...", self.model_size, self.compute_type)
+            self.model = WhisperModel(self.model_size, device="cpu", compute_type=self.compute_type,
+                                      cpu_threads=self.threads)
+
+    def transcribe_blocking(self, wav_bytes, prompt=None):
+        self.load()
+        samples = wav_to_float(wav_bytes)
+        with self.lock:
+            segments, _ = self.model.transcribe(samples, language=self.language, beam_size=self.beam_size,
+                                                initial_prompt=prompt or None, vad_filter=False)
+            # segments ist ein Generator; die eigentliche Dekodierung passiert beim Iterieren
+            return " ".join(segment.text.strip() for segment in segments).strip()
+
+    async def transcribe(self, wav_bytes, prompt=None):
+        return await asyncio.to_thread(self.transcribe_blocking, wav_bytes, prompt)
+
+
+class FallbackBackend(SpeechBackend):
+    name = "auto"
+
+    def __init__(self, primary, fallback):
+        self.primary = primary
+        self.fallback = fallback
+
+    def load(self):
+        try:
+            self.fallback.load()
+        except Exception as e:
+            logger.warning("STT-Fallback %s nicht verfügbar: %s", self.fallback.name, e)
+
+    async def transcribe(self, wav_bytes, prompt=None):
+        try:
+            return await self.primary.transcribe(wav_bytes, prompt)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if self.fallback.model is None:
+                raise
+            logger.warning("STT %s fehlgeschlagen (%r), nutze %s", self.primary.name, e, self.fallback.name)
+            return await self.fallback.transcribe(wav_bytes, prompt)
+
+
+def create_backend(spec, client_factory, resilience, model_size="base", language=None, encoder=None):
+    # spec: "cloud" (Standard), "local" oder "auto"
+    if spec == "local":
+        return LocalWhisperBackend(model_size, language=language)
+    cloud = CloudWhisperBackend(client_factory, resilience, encoder=encoder)
+    if spec == "auto":
+        return FallbackBackend(cloud, LocalWhisperBackend(model_size, language=language))
+    return cloud
@@ -0,0 +1,198 @@
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Lokaler Stand-in für OpenAI (Whisper + Chat) und ElevenLabs (TTS) mit einstellbaren Latenzen.
+# Nutzung: OPENAI_BASE_URL=http://127.0.0.1:8099/v1 ELEVENLABS_BASE_URL=http://127.0.0.1:8099
+
+DEFAULT_TRANSCRIPT = "I want to water the plants on the balcony."
+DEFAULT_REPLY = "Hey, I noticed you haven't put your phone back yet. Can you picture the fresh green leaves after watering the plants on your balcony, what would you need to do first?"
+
+
+class StubConfig:
+    def __init__(self, stt_latency=0.5, chat_first_token=0.8, chat_token_interval=0.03,
+                 tts_latency=0.4, tts_seconds_per_char=0.06, transcript=DEFAULT_TRANSCRIPT,
+                 reply=DEFAULT_REPLY, fail_rate=0.0, hang_rate=0.0, slow_rate=0.0,
+                 slow_extra=3.0, hang_seconds=120, seed=None, upload_kbps=None):
+        self.stt_latency = stt_latency
+        self.chat_first_token = chat_first_token
+        self.chat_token_interval = chat_token_interval
+        self.tts_latency = tts_latency
+        self.tts_seconds_per_char = tts_seconds_per_char
+        self.transcript = transcript
+        self.reply = reply
+        self.connections = 0   # Anzahl neu aufgebauter TCP-Verbindungen
+        self.upload_kbps = upload_kbps   # simulierte Upload-Bandbreite (z. B. schwaches WLAN)
+        self.upload_bytes = 0
+        # Fehlerinjektion: Anteil der Anfragen mit HTTP 500, ohne Antwort bzw. mit Zusatzlatenz
+        self.fail_rate = fail_rate
+        self.hang_rate = hang_rate
+        self.slow_rate = slow_rate
+        self.slow_extra = slow_extra
+        self.hang_seconds = hang_seconds
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.injected = {"fail": 0, "hang": 0, "slow": 0}
+
+    def pick_fault(self):
+        with self.lock:
+            roll = self.random.random()
+            for fault, rate in (("fail", self.fail_rate), ("hang", self.hang_rate), ("slow", self.slow_rate)):
+                if roll < rate:
+                    self.injected[fault] += 1
+                    return fault
+                roll -= rate
+        return None
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = StubConfig()
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        self.config.connections += 1
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        path = self.path.split("?")[0]
+        self.config.upload_bytes += length
+        if self.config.upload_kbps:
+            time.sleep(length * 8 / (self.config.upload_kbps * 1000))
+        fault = self.config.pick_fault()
+        if fault == "fail":
+            self.send_response(500)
+            data = b'{"error": {"message": "injected failure"}}'
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        if fault == "hang":
+            time.sleep(self.config.hang_seconds)
+            self.close_connection = True
+            return
+        if fault == "slow":
+            time.sleep(self.config.slow_extra)
+        try:
+            if path.endswith("/audio/transcriptions"):
+                self.handle_transcription()
+            elif path.endswith("/chat/completions"):
+                self.handle_chat(json.loads(body or b"{}"))
+            elif "/text-to-speech/" in path:
+                self.handle_tts(json.loads(body or b"{}"))
+            else:
+                self.send_error(404)
+        except (BrokenPipeError, ConnectionResetError):
+            # Client hat abgebrochen (Timeout oder verlorene Hedge-Anfrage)
+            self.close_connection = True
+
+    def send_json(self, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def start_chunked(self, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def end_chunked(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def handle_transcription(self):
+        time.sleep(self.config.stt_latency)
+        self.send_json({"text": self.config.transcript})
+
+    def handle_chat(self, request):
+        cfg = self.config
+        tokens = [word + " " for word in cfg.reply.split(" ")]
+        base = {"id": "chatcmpl-stub", "created": int(time.time()), "model": request.get("model", "gpt-4")}
+        if not request.get("stream"):
+            time.sleep(cfg.chat_first_token + cfg.chat_token_interval * len(tokens))
+            self.send_json(dict(base, object="chat.completion", choices=[{
+                "index": 0, "finish_reason": "stop",
+                "message": {"role": "assistant", "content": cfg.reply}
+            }]))
+            return
+        self.start_chunked("text/event-stream")
+        time.sleep(cfg.chat_first_token)
+        for token in tokens:
+            event = dict(base, object="chat.completion.chunk", choices=[{
+                "index": 0, "finish_reason": None, "delta": {"content": token}
+            }])
+            self.write_chunk(f"data: {json.dumps(event)}\n\n".encode())
+            time.sleep(cfg.chat_token_interval)
+        self.write_chunk(b"data: [DONE]\n\n")
+        self.end_chunked()
+
+    def handle_tts(self, request):
+        cfg = self.config
+        time.sleep(cfg.tts_latency)
+        # Stille als PCM 16 kHz mono, Länge proportional zur Textlänge
+        total = int(len(request.get("text", "")) * cfg.tts_seconds_per_char * 16000) * 2
+        self.start_chunked("audio/pcm")
+        chunk_size = 4096
+        for offset in range(0, total, chunk_size):
+            self.write_chunk(b"\x00" * min(chunk_size, total - offset))
+        self.end_chunked()
+
+
+def start_stub_server(config=None, host="127.0.0.1", port=0):
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"config": config or StubConfig()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lokaler OpenAI/ElevenLabs Stand-in")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--stt-latency", type=float, default=0.5)
+    parser.add_argument("--chat-first-token", type=float, default=0.8)
+    parser.add_argument("--chat-token-interval", type=float, default=0.03)
+    parser.add_argument("--tts-latency", type=float, default=0.4)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--hang-seconds", type=float, default=120)
+    parser.add_argument("--upload-kbps", type=float, default=None)
+    args = parser.parse_args()
+    server = start_stub_server(StubConfig(
+        stt_latency=args.stt_latency,
+        chat_first_token=args.chat_first_token,
+        chat_token_interval=args.chat_token_interval,
+        tts_latency=args.tts_latency,
+        fail_rate=args.fail_rate,
+        hang_rate=args.hang_rate,
+        slow_rate=args.slow_rate,
+        hang_seconds=args.hang_seconds,
+        upload_kbps=args.upload_kbps,
+    ), port=args.port)
+    print(f"Stub-Server läuft auf http://127.0.0.1:{server.server_address[1]}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
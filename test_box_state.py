@@ -0,0 +1,63 @@
+from box_state import BoxListener, BoxStateMachine, simulate
+
+# Zustandsautomat ohne Uhr und Threads: simulate() spielt Sensorspuren in Millisekunden ab.
+
+
+class RecordingListener(BoxListener):
+    def __init__(self):
+        self.changes = []
+        self.reminders = []
+
+    def on_state_changed(self, state, now, previous_since):
+        self.changes.append((now, state))
+
+    def on_reminder_due(self, now, level=0):
+        self.reminders.append((now, level))
+
+
+def run(readings, **kwargs):
+    listener = RecordingListener()
+    machine = BoxStateMachine(listener, delay_seconds=30, cancel_seconds=600, stability_seconds=1)
+    simulate(machine, readings, **kwargs)
+    return listener, machine
+
+
+def trace(states, start=0):
+    # Eine Messung pro Sekunde, wie sensor_loop mit SENSOR_INTERVAL = 1
+    return [(start + i, state) for i, state in enumerate(states)]
+
+
+def test_single_outlier_does_not_change_state():
+    readings = trace(["out"] * 10 + ["in"] + ["out"] * 10)
+    listener, machine = run(readings)
+    assert listener.changes == []
+    assert machine.box_state == "out"
+
+
+def test_flapping_does_not_change_state():
+    readings = trace(["out", "in"] * 20)
+    listener, machine = run(readings)
+    assert listener.changes == []
+    assert machine.box_state == "out"
+
+
+def test_stable_transition_is_committed():
+    readings = trace(["out"] * 5 + ["in"] * 5 + ["out"] * 5)
+    listener, machine = run(readings)
+    # Erste "in"-Messung bei t=5, bestätigt bei t=6; zurück nach "out" bei t=11
+    assert listener.changes == [(6, "in"), (11, "out")]
+    assert machine.box_state == "out"
+
+
+def test_transition_needs_confirming_reading():
+    # Ohne weitere Messung bleibt ein Wechsel auch nach Ablauf der Frist offen
+    listener, machine = run(trace(["out"] * 3 + ["in"]), until=100)
+    assert listener.changes == []
+    assert machine.pending_state == "in"
+
+
+def test_outlier_does_not_interrupt_reminders():
+    readings = trace(["out"] * 59 + ["in"] + ["out"] * 5)
+    listener, _ = run(readings, audio_ready_at=0)
+    assert listener.changes == []
+    assert listener.reminders == [(30, 0), (60, 1)]
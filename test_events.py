@@ -0,0 +1,28 @@
+import logging
+import events
+
+# Schema-Prüfung der Study-Events: Abweichungen werden gemeldet, aber nie geworfen
+
+
+def test_valid_event_has_no_problems():
+    assert events.validate("reminder", {"intention": "a", "kind": "primary", "level": 0, "text": "Hi"}) == []
+    # Ganze Zahlen sind als float erlaubt, verworfene Aufnahmen haben kein Vorhaben
+    assert events.validate("recording", {"duration": 1, "speech": 0.0}) == []
+
+
+def test_wrong_type_and_missing_field_are_reported():
+    problems = events.validate("reminder", {"intention": "a", "kind": "primary", "level": "0"})
+    assert problems == ["level: str statt int", "fehlende Felder ['text']"]
+    assert events.validate("box", {"state": "in", "since": None, "duration": True}) == [
+        "since: NoneType statt float", "duration: bool statt float"]
+
+
+def test_unknown_event_and_field_are_reported():
+    assert events.validate("nope", {}) == ["unbekannter Event-Typ 'nope'"]
+    assert "unbekanntes Feld extra" in events.validate("transcription", {"intention": "a", "text": "", "extra": 1})
+
+
+def test_record_warns_instead_of_raising(caplog):
+    with caplog.at_level(logging.WARNING, logger="ProbeLogger"):
+        events.record("reminder", intention="a", level="x")
+    assert "weicht vom Schema ab" in caplog.text
@@ -0,0 +1,56 @@
+import os
+import asyncio
+import tempfile
+import pytest
+
+os.environ.setdefault("PROBE_CACHE_DIR", tempfile.mkdtemp(prefix="probe-test-cache-"))
+import pipeline  # noqa: E402
+
+# Satzgrenzen für das Streaming: jeder Satz wird eine eigene TTS-Anfrage
+
+
+def split(tokens):
+    async def stream():
+        for token in tokens:
+            yield token
+
+    async def collect():
+        return [sentence async for sentence in pipeline.split_sentences(stream())]
+
+    return asyncio.run(collect())
+
+
+def words(text):
+    # GPT liefert Tokens mit führendem Leerzeichen
+    parts = text.split(" ")
+    return [parts[0]] + [" " + part for part in parts[1:]]
+
+
+def test_splits_on_sentence_end():
+    assert split(words("Hey there! Did you water the plants? Great.")) == [
+        "Hey there!", "Did you water the plants?", "Great."]
+
+
+@pytest.mark.parametrize("text", [
+    "Denk an deine Pflanzen, z. B. die Tomaten auf dem Balkon.",
+    "Dein Termin bei Dr. Meier ist bald.",
+    "Am 3. Mai beginnt die Saison.",
+    "Bring snacks, e.g. apples, for the walk.",
+    "Mr. Smith and J. Doe are waiting.",
+])
+def test_abbreviations_and_ordinals_do_not_split(text):
+    assert split(words(text)) == [text]
+
+
+def test_quote_and_bracket_endings_stay_with_sentence():
+    assert split(words('You said "I will go for a walk." Can you picture it? (Just a thought.) Enjoy!')) == [
+        'You said "I will go for a walk."', "Can you picture it?", "(Just a thought.)", "Enjoy!"]
+
+
+def test_sentence_after_abbreviation_is_split():
+    assert split(words("Kauf Obst, Gemüse usw. Danach geht es los.")) == [
+        "Kauf Obst, Gemüse usw.", "Danach geht es los."]
+
+
+def test_ellipsis_splits():
+    assert split(words("Hmm… What would you do first?")) == ["Hmm…", "What would you do first?"]
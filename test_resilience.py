@@ -0,0 +1,270 @@
+import json
+import time
+import asyncio
+import pytest
+from resilience import Resilience, Policy, CircuitOpenError, backoff_delay
+from stub_server import StubConfig, start_stub_server
+
+# Resilienz-Schicht gegen den lokalen Stub-Server mit Fehlerinjektion (HTTP 500, hängende
+# Anfragen). Die Zeiten sind kurz gehalten; der Circuit Breaker bekommt eine eigene Uhr.
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def stub():
+    config = StubConfig(stt_latency=0, hang_seconds=1, seed=1)
+    server = start_stub_server(config)
+    yield config, server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+async def post(port, path, payload=None):
+    # Minimaler HTTP-Client, damit ein Abbruch die Verbindung wirklich schließt
+    body = json.dumps(payload).encode() if payload is not None else b""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"POST {path} HTTP/1.1\r\nHost: stub\r\nContent-Length: {len(body)}\r\n"
+                 f"Connection: close\r\n\r\n".encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b""):
+        name, _, value = line.decode().partition(":")
+        headers[name.lower()] = value.strip()
+    return status, headers, reader, writer
+
+
+async def transcribe(port):
+    status, headers, reader, writer = await post(port, "/v1/audio/transcriptions")
+    try:
+        body = await reader.readexactly(int(headers.get("content-length", 0)))
+    finally:
+        writer.close()
+    if status != 200:
+        raise RuntimeError(f"HTTP {status}")
+    return json.loads(body)["text"]
+
+
+async def stream_chunks(port, path, payload, closed=None):
+    # Chunked-Antwort des Stubs als Async-Iterator; closed sammelt beendete Ströme
+    writer = None
+    try:
+        status, headers, reader, writer = await post(port, path, payload)
+        if status != 200:
+            raise RuntimeError(f"HTTP {status}")
+        while (size := int((await reader.readline()).strip(), 16)):
+            yield await reader.readexactly(size)
+            await reader.readline()
+    finally:
+        if writer is not None:
+            writer.close()
+        if closed is not None:
+            closed.append(path)
+
+
+def make_resilience(clock=None, stage="whisper", **kwargs):
+    policy = dict(attempt_timeout=0.5, deadline=5, attempts=1, backoff_base=0.01,
+                  failure_threshold=2, reset_timeout=30)
+    policy.update(kwargs)
+    resilience = Resilience({stage: Policy(**policy)})
+    if clock:
+        resilience.breakers[stage].clock = clock
+    return resilience
+
+
+def open_breaker(resilience, config, port):
+    config.fail_rate = 1.0
+    for _ in range(resilience.policies["whisper"].failure_threshold):
+        with pytest.raises(RuntimeError):
+            asyncio.run(resilience.call("whisper", lambda: transcribe(port)))
+    config.fail_rate = 0.0
+    assert resilience.breakers["whisper"].state == "open"
+
+
+def test_hanging_request_times_out(stub):
+    config, port = stub
+    config.hang_rate = 1.0
+    resilience = make_resilience(attempt_timeout=0.2)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(resilience.call("whisper", lambda: transcribe(port)))
+    assert config.injected["hang"] == 1
+
+
+def test_retries_after_failure(stub):
+    config, port = stub
+    config.fail_rate = 1.0
+    calls = []
+
+    async def flaky():
+        calls.append(1)
+        if len(calls) == 2:
+            config.fail_rate = 0.0
+        return await transcribe(port)
+
+    resilience = make_resilience(attempts=3, failure_threshold=5)
+    assert asyncio.run(resilience.call("whisper", flaky)) == config.transcript
+    assert len(calls) == 2
+    assert config.injected["fail"] == 1
+    assert resilience.breakers["whisper"].failures == 0
+
+
+def test_gives_up_after_attempts(stub):
+    config, port = stub
+    config.fail_rate = 1.0
+    resilience = make_resilience(attempts=3, failure_threshold=5)
+    with pytest.raises(RuntimeError):
+        asyncio.run(resilience.call("whisper", lambda: transcribe(port)))
+    assert config.injected["fail"] == 3
+
+
+def test_failed_call_counts_once_for_breaker(stub):
+    config, port = stub
+    config.fail_rate = 1.0
+    resilience = make_resilience(attempts=3, failure_threshold=3)
+    # Der eigentliche Fehler kommt durch, kein CircuitOpenError nach dem dritten Versuch
+    with pytest.raises(RuntimeError):
+        asyncio.run(resilience.call("whisper", lambda: transcribe(port)))
+    breaker = resilience.breakers["whisper"]
+    assert config.injected["fail"] == 3
+    assert breaker.failures == 1
+    assert breaker.state == "closed"
+
+
+def test_backoff_delay_is_jittered_and_capped():
+    policy = Policy(attempt_timeout=1, deadline=10, backoff_base=0.5, backoff_cap=4.0)
+    for attempt in range(8):
+        delays = [backoff_delay(policy, attempt) for _ in range(200)]
+        assert all(0 <= d <= min(4.0, 0.5 * 2 ** attempt) for d in delays)
+        assert len(set(delays)) > 1
+
+
+def test_breaker_open_half_open_closed(stub):
+    config, port = stub
+    clock = FakeClock()
+    resilience = make_resilience(clock)
+    breaker = resilience.breakers["whisper"]
+    open_breaker(resilience, config, port)
+
+    # Offen: Aufruf scheitert sofort, ohne den Server zu erreichen
+    connections = config.connections
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(resilience.call("whisper", lambda: transcribe(port)))
+    assert config.connections == connections
+
+    clock.now += 30
+    assert breaker.state == "half-open"
+    assert asyncio.run(resilience.call("whisper", lambda: transcribe(port))) == config.transcript
+    assert breaker.state == "closed"
+
+
+def test_failed_probe_reopens_breaker(stub):
+    config, port = stub
+    clock = FakeClock()
+    resilience = make_resilience(clock)
+    breaker = resilience.breakers["whisper"]
+    open_breaker(resilience, config, port)
+
+    clock.now += 30
+    config.fail_rate = 1.0
+    with pytest.raises(RuntimeError):
+        asyncio.run(resilience.call("whisper", lambda: transcribe(port)))
+    assert breaker.state == "open"
+
+
+def test_cancelled_probe_releases_breaker(stub):
+    config, port = stub
+    clock = FakeClock()
+    resilience = make_resilience(clock, attempt_timeout=5)
+    breaker = resilience.breakers["whisper"]
+    open_breaker(resilience, config, port)
+
+    clock.now += 30
+    config.hang_rate = 1.0
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(asyncio.wait_for(resilience.call("whisper", lambda: transcribe(port)), 0.2))
+    assert breaker.state == "half-open"
+    assert not breaker.probing
+
+    config.hang_rate = 0.0
+    assert asyncio.run(resilience.call("whisper", lambda: transcribe(port))) == config.transcript
+    assert breaker.state == "closed"
+
+
+def test_cancelled_stream_probe_releases_breaker(stub):
+    config, port = stub
+    clock = FakeClock()
+    resilience = make_resilience(clock, attempt_timeout=5)
+    breaker = resilience.breakers["whisper"]
+    open_breaker(resilience, config, port)
+
+    async def chunks():
+        yield await transcribe(port)
+
+    async def consume():
+        return [chunk async for chunk in resilience.stream("whisper", chunks)]
+
+    clock.now += 30
+    config.hang_rate = 1.0
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(asyncio.wait_for(consume(), 0.2))
+    assert not breaker.probing
+
+    config.hang_rate = 0.0
+    assert asyncio.run(consume()) == [config.transcript]
+    assert breaker.state == "closed"
+
+
+def test_slow_tts_is_hedged_and_loser_closed(stub):
+    config, port = stub
+    config.tts_latency = 0.0
+    config.slow_extra = 2.0
+    resilience = make_resilience(stage="tts", attempt_timeout=5, hedge=True)
+    resilience.latency["tts"].default = 0.2   # p95, solange es noch keine Messwerte gibt
+    closed = []
+    requests = []
+
+    def synthesize():
+        # Erste Anfrage hängt in der Zusatzlatenz, die Hedge-Anfrage kommt sofort
+        config.slow_rate = 0.0 if requests else 1.0
+        requests.append(1)
+        return stream_chunks(port, "/v1/text-to-speech/voice", {"text": "Hallo"}, closed)
+
+    async def consume():
+        started = time.monotonic()
+        chunks = [chunk async for chunk in resilience.stream("tts", synthesize)]
+        return chunks, time.monotonic() - started
+
+    chunks, elapsed = asyncio.run(consume())
+    assert len(requests) == 2
+    assert config.injected["slow"] == 1
+    assert b"".join(chunks)
+    assert 0.2 <= elapsed < config.slow_extra
+    # Gewinner am Ende des Stroms, Verlierer beim Abbruch geschlossen
+    assert len(closed) == 2
+
+
+def test_stalled_stream_hits_idle_timeout(stub):
+    config, port = stub
+    config.chat_first_token = 0.0
+    config.chat_token_interval = 5.0   # nach dem ersten Token kommt lange nichts
+    resilience = make_resilience(stage="gpt_stream", attempt_timeout=2, deadline=30, idle_timeout=0.3)
+    received = []
+
+    async def consume():
+        stream = resilience.stream("gpt_stream", lambda: stream_chunks(
+            port, "/v1/chat/completions", {"stream": True}))
+        async for chunk in stream:
+            received.append(chunk)
+
+    started = time.monotonic()
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(consume())
+    assert len(received) == 1
+    assert time.monotonic() - started < 2
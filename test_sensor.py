@@ -0,0 +1,158 @@
+import sys
+import types
+import pytest
+import sensor
+from sensor import FakeGPIOBackend, UltrasonicRanger
+
+# Entfernungsmessung ohne Raspberry Pi: FakeGPIOBackend erzeugt die Echo-Flanken, die ein
+# Objekt in der jeweiligen Entfernung liefern würde.
+
+
+def make_ranger(backend):
+    return UltrasonicRanger(backend, timeout=0.01, settle=0)
+
+
+class RiseOnlyBackend(FakeGPIOBackend):
+    # Steigende Flanke kommt, die fallende geht verloren
+    def trigger(self):
+        self.triggers += 1
+        self.callback(1, 0)
+
+
+@pytest.mark.parametrize("distance", [3.0, 10.0, 57.5, 200.0])
+def test_pulse_width_converts_to_centimetres(distance):
+    ranger = make_ranger(FakeGPIOBackend([distance]))
+    assert ranger.measure() == pytest.approx(distance, abs=1e-3)
+
+
+def test_delayed_echo_is_measured():
+    # Flanken aus einem fremden Thread, wie bei RPi.GPIO und pigpio
+    ranger = make_ranger(FakeGPIOBackend([25.0], echo_delay=0.002))
+    assert ranger.measure() == pytest.approx(25.0, abs=1e-3)
+
+
+def test_missing_start_edge_times_out():
+    ranger = make_ranger(FakeGPIOBackend([None]))
+    with pytest.raises(TimeoutError, match="start"):
+        ranger.measure()
+
+
+def test_missing_stop_edge_times_out():
+    ranger = make_ranger(RiseOnlyBackend([]))
+    with pytest.raises(TimeoutError, match="stop"):
+        ranger.measure()
+
+
+def test_timeouts_become_nan_in_burst():
+    np = pytest.importorskip("numpy")
+    sampler = sensor.BurstSampler(make_ranger(FakeGPIOBackend([40.0, None, 41.0, None, 40.5])), burst=5)
+    samples = sampler.ping_burst()
+    assert np.isnan(samples).tolist() == [False, True, False, True, False]
+    assert sampler.update(samples) == pytest.approx(40.5)
+
+
+class FakeGPIO(types.ModuleType):
+    # RPi.GPIO, bei dem der Pegel im Callback schon wieder low ist (verspäteter Callback-Thread)
+    BCM, OUT, IN, BOTH = "BCM", "OUT", "IN", "BOTH"
+
+    def __init__(self):
+        super().__init__("RPi.GPIO")
+        self.handler = None
+
+    def setmode(self, mode):
+        pass
+
+    def setup(self, channel, direction):
+        pass
+
+    def output(self, channel, value):
+        pass
+
+    def input(self, channel):
+        return 0
+
+    def add_event_detect(self, channel, edge, callback):
+        self.handler = callback
+
+    def remove_event_detect(self, channel):
+        self.handler = None
+
+
+@pytest.fixture
+def fake_gpio(monkeypatch):
+    gpio = FakeGPIO()
+    rpi = types.ModuleType("RPi")
+    rpi.GPIO = gpio
+    monkeypatch.setitem(sys.modules, "RPi", rpi)
+    monkeypatch.setitem(sys.modules, "RPi.GPIO", gpio)
+    return gpio
+
+
+def test_rpi_backend_takes_edge_direction_from_order(fake_gpio):
+    backend = sensor.RPiGPIOBackend(trig=23, echo=24)
+    edges = []
+    backend.on_edge(lambda level, tick: edges.append(level))
+    backend.trigger()
+    for _ in range(3):
+        fake_gpio.handler(24)
+    # Obwohl input() schon 0 liefert: erste Flanke steigend, zweite fallend, der Rest ignoriert
+    assert edges == [1, 0]
+    backend.trigger()
+    fake_gpio.handler(24)
+    assert edges == [1, 0, 1]
+
+
+def test_rpi_backend_measures_short_echo(fake_gpio, monkeypatch):
+    backend = sensor.RPiGPIOBackend(trig=23, echo=24)
+    ranger = make_ranger(backend)
+    pulse_ns = int(5.0 * 2 / sensor.SPEED_OF_SOUND_CM_S * 1e9)
+    ticks = iter([1_000_000, 1_000_000 + pulse_ns])
+    monkeypatch.setattr(sensor.time, "perf_counter_ns", lambda: next(ticks))
+
+    def trigger():
+        sensor.RPiGPIOBackend.trigger(backend)
+        fake_gpio.handler(24)
+        fake_gpio.handler(24)
+
+    monkeypatch.setattr(backend, "trigger", trigger)
+    assert ranger.measure() == pytest.approx(5.0, abs=1e-3)
+
+
+# -------------------- BurstSampler --------------------
+def steady_sampler(np):
+    sampler = sensor.BurstSampler(ranger=None, burst=5)
+    for _ in range(5):
+        sampler.update(np.array([50.2, 49.8, np.nan, 50.0, 50.1]))
+    return sampler
+
+
+def test_burst_median_ignores_timeouts_and_single_ping_spike():
+    np = pytest.importorskip("numpy")
+    sampler = steady_sampler(np)
+    assert sampler.estimate == pytest.approx(50.05, abs=0.01)
+    assert sampler.update(np.array([50.0, 50.1, 300.0, np.nan, 49.9])) == pytest.approx(50.05, abs=0.05)
+    assert sampler.update(np.full(5, np.nan)) == pytest.approx(50.05, abs=0.05)
+
+
+def test_spike_burst_is_rejected():
+    np = pytest.importorskip("numpy")
+    sampler = steady_sampler(np)
+    assert sampler.update(np.array([90.0, 91.0, 90.0, np.nan, 89.0])) == pytest.approx(50.05, abs=0.01)
+    # Die nächste normale Salve setzt den Ausreißer-Zähler zurück
+    assert sampler.update(np.array([50.0, 50.1, 49.9, 50.0, np.nan])) == pytest.approx(50.0, abs=0.1)
+    assert sampler.rejects == 0
+
+
+def test_sustained_jump_is_accepted_on_second_burst():
+    np = pytest.importorskip("numpy")
+    sampler = steady_sampler(np)
+    jump = np.array([20.0, 20.2, np.nan, 19.8, 20.1])
+    assert sampler.update(jump) == pytest.approx(50.05, abs=0.01)
+    assert sampler.update(jump) == pytest.approx(20.05, abs=0.01)
+
+
+def test_small_change_is_smoothed():
+    np = pytest.importorskip("numpy")
+    sampler = steady_sampler(np)
+    estimate = sampler.update(np.array([53.0, 53.2, 52.8, 53.1, np.nan]))
+    assert 50.05 < estimate < 53.05
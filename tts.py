@@ -0,0 +1,155 @@
+import os
+import re
+import time
+import shutil
+import asyncio
+import logging
+from cache import cache_key
+from audio import wav_to_pcm
+from resilience import next_chunk, close_quietly
+
+# -------------------- Sprachsynthese --------------------
+# Austauschbare TTS-Backends, alle liefern einen Async-Iterator über PCM (16 kHz, mono, S16_LE).
+# Kommt der erste Chunk von ElevenLabs nicht innerhalb des Zeitbudgets, übernimmt die lokale
+# Engine (espeak-ng auf der CPU). Häufige Satzanfänge liegen als fertig synthetisierte
+# Fragmente auf der Platte und werden ohne Netz sofort ausgeliefert.
+
+logger = logging.getLogger("ProbeLogger")
+
+
+class ElevenLabsBackend:
+    name = "elevenlabs"
+
+    def __init__(self, client_factory, resilience, voice_id, model_id, output_format):
+        self.client_factory = client_factory
+        self.resilience = resilience
+        self.voice_id = voice_id
+        self.model_id = model_id
+        self.output_format = output_format
+
+    def key(self):
+        return (self.voice_id, self.model_id, self.output_format)
+
+    def synthesize(self, text, previous_text=None):
+        def do_tts():
+            kwargs = {}
+            if previous_text:
+                # Kontext für eine durchgehende Betonung über Satzgrenzen hinweg
+                kwargs["previous_text"] = previous_text
+            return self.client_factory().text_to_speech.convert(
+                text=text,
+                voice_id=self.voice_id,
+                model_id=self.model_id,
+                output_format=self.output_format,
+                **kwargs
+            )
+        return self.resilience.stream("tts", do_tts)
+
+
+class EspeakBackend:
+    name = "espeak"
+
+    def __init__(self, voice="en-us", speed=160, binary=None):
+        self.voice = voice
+        self.speed = speed
+        self.binary = binary or shutil.which("espeak-ng") or shutil.which("espeak")
+
+    def available(self):
+        return self.binary is not None
+
+    async def synthesize(self, text, previous_text=None):
+        if not self.available():
+            raise RuntimeError("Lokale Sprachausgabe braucht espeak-ng (apt install espeak-ng)")
+        process = await asyncio.create_subprocess_exec(
+            self.binary, "-v", self.voice, "-s", str(self.speed), "--stdout", text,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+        )
+        wav, _ = await process.communicate()
+        if process.returncode != 0:
+            raise RuntimeError(f"{self.binary} beendet mit Code {process.returncode}")
+        # espeak liefert 22,05 kHz WAV; auf das Wiedergabeformat umrechnen
+        yield await asyncio.to_thread(wav_to_pcm, wav)
+
+
+def normalize(text):
+    # Vergleich von Satzanfängen unabhängig von Groß-/Kleinschreibung, Apostrophen und Strichen
+    text = text.lower().replace("’", "'").replace("—", " ").replace("–", " ")
+    return re.sub(r"[^\w' ]+", "", re.sub(r"\s+", " ", text)).strip()
+
+
+class FragmentLibrary:
+    # Fertig synthetisierte Sätze in der Stimme des Hauptbackends, dauerhaft auf der Platte.
+    # Anders als der TTS-Cache werden sie nicht verdrängt.
+    def __init__(self, directory, texts):
+        self.directory = directory
+        self.texts = list(texts)
+        self.pcm = {}
+
+    def path(self, text, voice_key):
+        return os.path.join(self.directory, cache_key("fragment", text, voice_key) + ".pcm")
+
+    def load(self, voice_key):
+        for text in self.texts:
+            try:
+                with open(self.path(text, voice_key), "rb") as f:
+                    self.pcm[normalize(text)] = f.read()
+            except FileNotFoundError:
+                pass
+        return len(self.pcm)
+
+    async def prepare(self, synthesize, voice_key):
+        # Fehlende Fragmente einmalig erzeugen, z. B. nach einem Stimmenwechsel
+        os.makedirs(self.directory, exist_ok=True)
+        for text in self.texts:
+            if normalize(text) in self.pcm:
+                continue
+            try:
+                pcm = b"".join([chunk async for chunk in synthesize(text)])
+            except Exception as e:
+                logger.warning("Fragment »%s« nicht erzeugt: %s", text, e)
+                continue
+            path = self.path(text, voice_key)
+            with open(path + ".tmp", "wb") as f:
+                f.write(pcm)
+            os.replace(path + ".tmp", path)
+            self.pcm[normalize(text)] = pcm
+            logger.info("Fragment erzeugt: %s", text)
+
+    def get(self, text):
+        return self.pcm.get(normalize(text))
+
+    def any(self):
+        # Irgendein vorhandener Einstieg, für die Notfall-Erinnerung
+        for text in self.texts:
+            pcm = self.get(text)
+            if pcm is not None:
+                return text, pcm
+        return None, None
+
+
+async def with_fallback(primary, fallback, budget, stage="tts"):
+    # primary/fallback: Funktionen ohne Argumente, die einen Async-Iterator liefern.
+    # Das Budget gilt nur bis zum ersten Chunk; ein einmal begonnener Strom wird nicht gewechselt.
+    started = time.monotonic()
+    agen = primary().__aiter__()
+    try:
+        first = await asyncio.wait_for(next_chunk(agen), budget)
+    except asyncio.CancelledError:
+        await close_quietly(agen)
+        raise
+    except Exception as e:
+        await close_quietly(agen)
+        reason = "Zeitbudget überschritten" if isinstance(e, asyncio.TimeoutError) else repr(e)
+        logger.warning("%s: %s nach %.1fs, nutze lokale Sprachausgabe", stage, reason,
+                       time.monotonic() - started)
+        async for chunk in fallback():
+            yield chunk
+        return
+    if first is None:
+        return
+    try:
+        yield first
+        async for chunk in agen:
+            yield chunk
+    finally:
+        await close_quietly(agen)
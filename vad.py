@@ -0,0 +1,107 @@
+import numpy as np
+
+# -------------------- Sprachaktivität --------------------
+# Energie-basierte VAD über 20-ms-Frames, vollständig mit NumPy vektorisiert. Ein Frame gilt
+# als Sprache, wenn seine Energie deutlich über dem Grundrauschen und über einer absoluten
+# Untergrenze liegt. Kurze Lücken zwischen Wörtern werden über eine Nachlaufzeit überbrückt.
+
+SAMPLE_RATE = 16000
+FRAME_MS = 20
+FRAME_SAMPLES = SAMPLE_RATE * FRAME_MS // 1000
+MARGIN_DB = 12          # Abstand zum Grundrauschen
+MIN_SPEECH_DB = -50     # absolute Untergrenze in dBFS
+MAX_FLOOR_DB = -50      # Obergrenze fürs Grundrauschen, falls ein Ausschnitt fast nur Sprache enthält
+HANGOVER_FRAMES = 10    # 200 ms Lücke zählen noch als Sprache
+MIN_SPEECH_FRAMES = 10  # mindestens 200 ms Sprache insgesamt
+PAD_FRAMES = 10         # 200 ms Rand vor und nach der Sprache behalten
+
+
+def frame_energy(pcm):
+    # S16_LE mono -> Energie je Frame in dBFS; ein angebrochener letzter Frame fällt weg
+    samples = np.frombuffer(pcm, dtype="<i2")
+    count = len(samples) // FRAME_SAMPLES
+    frames = samples[:count * FRAME_SAMPLES].reshape(count, FRAME_SAMPLES).astype(np.float32) / 32768.0
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-6))
+
+
+def noise_floor(energy):
+    # Leiseste 10 % der Frames als Schätzung des Raumrauschens
+    return min(float(np.percentile(energy, 10)), MAX_FLOOR_DB) if len(energy) else MAX_FLOOR_DB
+
+
+def smooth(speech, hangover=HANGOVER_FRAMES):
+    # Lücken bis zu hangover Frames nach einem Sprach-Frame füllen
+    if not speech.any() or hangover <= 0:
+        return speech
+    index = np.where(speech, np.arange(len(speech)), -hangover - 1)
+    last_speech = np.maximum.accumulate(index)
+    return (np.arange(len(speech)) - last_speech) <= hangover
+
+
+def speech_frames(pcm, floor=None):
+    energy = frame_energy(pcm)
+    if floor is None:
+        floor = noise_floor(energy)
+    return smooth((energy > floor + MARGIN_DB) & (energy > MIN_SPEECH_DB))
+
+
+def speech_bounds(pcm, floor=None):
+    # (start, ende) der Sprache in Bytes inkl. Rand, oder None ohne erkennbare Sprache
+    speech = speech_frames(pcm, floor)
+    if speech.sum() < MIN_SPEECH_FRAMES:
+        return None
+    indices = np.flatnonzero(speech)
+    first = max(0, int(indices[0]) - PAD_FRAMES)
+    last = min(len(speech), int(indices[-1]) + 1 + PAD_FRAMES)
+    frame_bytes = FRAME_SAMPLES * 2
+    end = len(pcm) if last == len(speech) else last * frame_bytes
+    return first * frame_bytes, end
+
+
+def trim(pcm, floor=None):
+    bounds = speech_bounds(pcm, floor)
+    if bounds is None:
+        return None
+    return pcm[bounds[0]:bounds[1]]
+
+
+def has_speech(pcm, floor=None):
+    return speech_bounds(pcm, floor) is not None
+
+
+class SilenceDetector:
+    # Für den laufenden Strom: meldet, sobald nach erkannter Sprache silence_seconds lang
+    # nichts mehr kam. Das Grundrauschen folgt den leisen Frames langsam nach.
+    def __init__(self, silence_seconds, on_silence, calibration_frames=5):
+        self.silence_frames = int(silence_seconds * 1000 / FRAME_MS)
+        self.on_silence = on_silence
+        self.calibration_frames = calibration_frames
+        self.floor = None
+        self.seen = 0
+        self.speech_frames = 0
+        self.quiet_run = 0
+        self.fired = False
+        self.rest = b""
+
+    def feed(self, pcm):
+        data = self.rest + pcm
+        usable = len(data) - len(data) % (FRAME_SAMPLES * 2)
+        self.rest = data[usable:]
+        if not usable or self.fired:
+            return
+        energy = frame_energy(data[:usable])
+        if self.floor is None:
+            self.floor = float(np.min(energy))
+        for value in energy:
+            self.seen += 1
+            if self.seen > self.calibration_frames and value > max(self.floor + MARGIN_DB, MIN_SPEECH_DB):
+                self.speech_frames += 1
+                self.quiet_run = 0
+                continue
+            self.floor = 0.95 * self.floor + 0.05 * float(value) if value < self.floor + MARGIN_DB else self.floor
+            self.quiet_run += 1
+            if self.speech_frames >= MIN_SPEECH_FRAMES and self.quiet_run >= self.silence_frames:
+                self.fired = True
+                self.on_silence()
+                return